@@ -1,7 +1,57 @@
-from .static_funcs import *  # noqa
-from .trainer import DICE_Trainer  # noqa
-from .knowledge_graph_embeddings import KGE  # noqa
-from .executer import Execute # noqa
-from .dataset_classes import * # noqa
-from .query_generator import QueryGenerator # noqa
+import importlib as _importlib
+
 __version__ = '0.1.5'
+
+# Exports are imported on their first access, e.g., dicee.KGE imports dicee.knowledge_graph_embeddings only.
+_lazy_exports = {"DICE_Trainer": ".trainer",
+                 "KGE": ".knowledge_graph_embeddings",
+                 "Execute": ".executer",
+                 "QueryGenerator": ".query_generator"}
+# Public names of these modules were exported via wildcard imports.
+_lazy_wildcard_modules = (".static_funcs", ".dataset_classes")
+# Names of from dicee import *, i.e., the lazy exports and the public names defined or imported by dicee in the
+# wildcard modules. Each name is resolved via __getattr__.
+__all__ = ["DICE_Trainer", "KGE", "Execute", "QueryGenerator", "Pyke", "DistMult", "CKeci", "Keci", "TransE", "DeCaL",
+           "DualE", "ComplEx", "AConEx", "AConvO", "AConvQ", "ConvQ", "ConvO", "ConEx", "QMult", "OMult",
+           "Shallom", "LFMult", "PykeenKGE", "BytE", "BaseKGE", "EnsembleKGE", "create_recipriocal_triples",
+           "get_er_vocab", "get_re_vocab", "get_ee_vocab", "timeit", "save_pickle", "load_pickle",
+           "load_term_mapping", "StringIndex", "IndexToString", "load_string_index", "select_model",
+           "load_model", "load_model_ensemble", "save_numpy_ndarray", "get_numpy_data_type",
+           "numpy_data_type_changer", "get_mmap_checkpoint_path", "save_mmap_checkpoint",
+           "load_mmap_checkpoint", "load_checkpoint", "save_checkpoint_model", "store", "add_noisy_triples",
+           "exists_memory_map_train_set", "load_memory_map_train_set", "read_or_load_kg", "intialize_model",
+           "load_json", "save_embeddings", "random_prediction", "deploy_triple_prediction",
+           "deploy_tail_entity_prediction", "deploy_head_entity_prediction", "deploy_relation_prediction",
+           "vocab_to_parquet", "create_experiment_folder", "continual_training_setup_executor",
+           "exponential_function", "load_numpy", "evaluate", "download_file", "download_files_from_url",
+           "download_pretrained_model", "write_csv_from_model_parallel",
+           "from_pretrained_model_write_embeddings_into_csv", "group_by_key_columns", "reload_dataset",
+           "construct_dataset", "BPE_NegativeSamplingDataset", "MultiLabelDataset",
+           "MultiClassClassificationDataset", "OnevsAllDataset", "KvsAll", "AllvsAll", "OnevsSample",
+           "KvsSampleDataset", "NegSampleDataset", "TriplePredictionDataset", "CVDataModule"]
+
+
+def __getattr__(name: str):
+    if name in _lazy_exports:
+        value = getattr(_importlib.import_module(_lazy_exports[name], __name__), name)
+    elif name.startswith("_"):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    else:
+        for module_name in _lazy_wildcard_modules:
+            module = _importlib.import_module(module_name, __name__)
+            if hasattr(module, name):
+                value = getattr(module, name)
+                break
+        else:
+            try:
+                value = _importlib.import_module("." + name, __name__)
+            except ModuleNotFoundError as e:
+                if e.name != f"{__name__}.{name}":
+                    raise
+                raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
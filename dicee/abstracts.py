@@ -1,6 +1,6 @@
 import os
 import datetime
-from .static_funcs import load_model_ensemble, load_model, save_checkpoint_model, load_json, download_pretrained_model
+from .static_funcs import load_model_ensemble, load_model, save_checkpoint_model, load_json, download_pretrained_model, StringIndex
 import torch
 from typing import List, Tuple, Union
 import random
@@ -178,14 +178,19 @@ class BaseInteractiveKGE:
             self.entity_to_idx, self.relation_to_idx = tuple_of_entity_relation_idx
             self.num_entities = len(self.entity_to_idx)
             self.num_relations = len(self.relation_to_idx)
-            self.entity_to_idx: dict
-            self.relation_to_idx: dict
-            # 0, ....,
-            assert sorted(list(self.entity_to_idx.values())) == list(range(0, len(self.entity_to_idx)))
-            assert sorted(list(self.relation_to_idx.values())) == list(range(0, len(self.relation_to_idx)))
+            self.entity_to_idx: Union[dict, StringIndex]
+            self.relation_to_idx: Union[dict, StringIndex]
+            if isinstance(self.entity_to_idx, StringIndex) and isinstance(self.relation_to_idx, StringIndex):
+                # Memory mapped indexes are resolved lazily, i.e., no dictionaries are materialized.
+                self.idx_to_entity = self.entity_to_idx.inverse
+                self.idx_to_relations = self.relation_to_idx.inverse
+            else:
+                # 0, ....,
+                assert sorted(list(self.entity_to_idx.values())) == list(range(0, len(self.entity_to_idx)))
+                assert sorted(list(self.relation_to_idx.values())) == list(range(0, len(self.relation_to_idx)))
 
-            self.idx_to_entity = {v: k for k, v in self.entity_to_idx.items()}
-            self.idx_to_relations = {v: k for k, v in self.relation_to_idx.items()}
+                self.idx_to_entity = {v: k for k, v in self.entity_to_idx.items()}
+                self.idx_to_relations = {v: k for k, v in self.relation_to_idx.items()}
 
     def get_eval_report(self) -> dict:
         return load_json(self.path + "/eval_report.json")
@@ -349,6 +354,10 @@ class BaseInteractiveKGE:
         if entity_name in self.entity_to_idx:
             print(f'Entity ({entity_name}) exists..')
         else:
+            if isinstance(self.entity_to_idx, StringIndex):
+                # A memory mapped index is read-only.
+                self.entity_to_idx = dict(self.entity_to_idx.items())
+                self.idx_to_entity = {v: k for k, v in self.entity_to_idx.items()}
             self.entity_to_idx[entity_name] = len(self.entity_to_idx)
             self.idx_to_entity[self.entity_to_idx[entity_name]] = entity_name
             self.num_entities += 1
@@ -1,4 +1,5 @@
 import argparse
+import os
 class Namespace(argparse.Namespace):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -48,11 +49,14 @@ class Namespace(argparse.Namespace):
         """Callbacks, e.g., {"PPE":{ "last_percent_to_consider": 10}}"""
 
         self.backend: str = "pandas"
-        """Backend to read, process, and index input knowledge graph. pandas, polars and rdflib available"""
+        """Backend to read, process, and index input knowledge graph. pandas, polars, polars_streaming and rdflib available"""
 
         self.separator: str = "\s+"
         """separator for extracting head, relation and tail from a triple"""
 
+        self.preprocessing_cache_dir: str = os.path.join("~", ".cache", "dicee")
+        """A folder of preprocessed knowledge graphs keyed on input files and preprocessing arguments. None disables caching"""
+
         self.trainer: str = 'torchCPUTrainer'
         """Trainer for knowledge graph embedding model"""
 
@@ -83,11 +87,35 @@ class Namespace(argparse.Namespace):
         self.save_model_at_every_epoch: int = None
         """ Not tested """
 
+        self.checkpoint_format: str = "pt"
+        """Format of the trained model: pt (torch.save) or mmap (a raw file per tensor and header.json under model_mmap)"""
+
+        self.checkpoint_shard_size: int = None
+        """Number of rows of a tensor copied to CPU and written at once in the mmap checkpoint format. None implies all rows"""
+
         self.label_smoothing_rate: float = 0.0
 
+        self.sparse_targets: bool = False
+        """Keep KvsAll multi-label vectors sparse up to the loss computation"""
+
+        self.sparse_embeddings: bool = False
+        """Sparse entity and relation embeddings updated via SparseAdam or RowWiseAdagrad (NegSample and 1vsSample)"""
+
+        self.ddp_backend: str = None
+        """Backend of torchDDP trainer: nccl (GPUs) or gloo (CPUs). None implies nccl if GPUs are available"""
+
+        self.autocast_dtype: str = None
+        """Autocast dtype of torchDDP trainer: float32, bfloat16, or float16. None implies float16 on GPUs, float32 on CPUs"""
+
         self.num_core: int = 0
         """Number of CPUs to be used in the mini-batch loading process"""
 
+        self.num_prefetch_batches: int = 0
+        """Number of mini-batches constructed in advance on a background thread (torchCPUTrainer). 0 implies no prefetching"""
+
+        self.pin_memory: bool = False
+        """Page-lock prefetched mini-batches to copy them into GPU memory asynchronously"""
+
         self.random_seed: int = 0
         "Random Seed"
 
@@ -135,6 +163,12 @@ class Namespace(argparse.Namespace):
         self.block_size: int = None
         "block size of LLM"
 
+        self.snapshot_every_n_batches: int = None
+        """Write a snapshot.pt into the experiment folder at every N mini-batches (torchCPUTrainer and torchDDP)"""
+
+        self.resume_from: str = None
+        """Path of a snapshot.pt or a folder containing it to resume the training from (torchCPUTrainer and torchDDP)"""
+
         self.continual_learning=None
         "Path of a pretrained model size of LLM"
 
@@ -3,7 +3,7 @@ import numpy as np
 import torch
 import pytorch_lightning as pl
 from typing import List, Tuple, Union
-from .static_preprocess_funcs import mapping_from_first_two_cols_to_third
+from .static_preprocess_funcs import group_by_key_columns
 from .static_funcs import timeit, load_term_mapping
 
 
@@ -35,7 +35,8 @@ def construct_dataset(*,
                       neg_ratio: int,
                       label_smoothing_rate: float,
                       byte_pair_encoding=None,
-                      block_size: int = None
+                      block_size: int = None,
+                      sparse_targets: bool = False
                       ) -> torch.utils.data.Dataset:
     if ordered_bpe_entities and byte_pair_encoding and scoring_technique == 'NegSample':
         train_set = BPE_NegativeSamplingDataset(
@@ -76,7 +77,8 @@ def construct_dataset(*,
                                entity_idxs=entity_to_idx,
                                relation_idxs=relation_to_idx,
                                form=form_of_labelling,
-                               label_smoothing_rate=label_smoothing_rate)
+                               label_smoothing_rate=label_smoothing_rate,
+                               sparse_targets=sparse_targets)
         elif scoring_technique == 'AllvsAll':
             # Multi-label imbalanced.
             train_set = AllvsAll(train_set,
@@ -96,7 +98,8 @@ def construct_dataset(*,
     elif form_of_labelling == 'RelationPrediction':
         # Multi-label.
         train_set = KvsAll(train_set, entity_idxs=entity_to_idx, relation_idxs=relation_to_idx,
-                           form=form_of_labelling, label_smoothing_rate=label_smoothing_rate)
+                           form=form_of_labelling, label_smoothing_rate=label_smoothing_rate,
+                           sparse_targets=sparse_targets)
     else:
         raise KeyError('Illegal input.')
     print(f"Number of datapoints: {len(train_set)}")
@@ -113,6 +116,8 @@ class BPE_NegativeSamplingDataset(torch.utils.data.Dataset):
         self.num_bpe_entities = len(self.ordered_bpe_entities)
         self.neg_ratio = neg_ratio
         self.num_datapoints = len(self.train_set)
+        # Random numbers are drawn from the global generator if None.
+        self.generator = None
 
     def __len__(self):
         return self.num_datapoints
@@ -132,9 +137,9 @@ class BPE_NegativeSamplingDataset(torch.utils.data.Dataset):
         num_of_corruption = size_of_batch * self.neg_ratio
         # Select bpe entities
         corr_bpe_entities = self.ordered_bpe_entities[
-            torch.randint(0, high=self.num_bpe_entities, size=(num_of_corruption,))]
+            torch.randint(0, high=self.num_bpe_entities, size=(num_of_corruption,), generator=self.generator)]
 
-        if torch.rand(1) >= 0.5:
+        if torch.rand(1, generator=self.generator) >= 0.5:
             bpe_h = torch.cat((bpe_h, corr_bpe_entities), 0)
             bpe_r = torch.cat((bpe_r, torch.repeat_interleave(input=bpe_r, repeats=self.neg_ratio, dim=0)), 0)
             bpe_t = torch.cat((bpe_t, torch.repeat_interleave(input=bpe_t, repeats=self.neg_ratio, dim=0)), 0)
@@ -277,6 +282,10 @@ class KvsAll(torch.utils.data.Dataset):
     relation_idxs : dictonary
         string representation of a relation to its integer id
 
+    sparse_targets : bool
+        If True, collate_fn returns multi-label vectors as a sparse COO tensor of shape (batch size, |E|)
+        to be consumed by the sparse binary cross entropy in BaseKGELightning.loss_function.
+
     Returns
     -------
     self : torch.utils.data.Dataset
@@ -286,6 +295,8 @@ class KvsAll(torch.utils.data.Dataset):
 
     Notes
     -----
+    __getitem__ returns the indices of the labelled entities. Multi-label vectors are constructed in collate_fn
+    once per batch.
 
     Examples
     --------
@@ -295,61 +306,70 @@ class KvsAll(torch.utils.data.Dataset):
     """
 
     def __init__(self, train_set_idx: np.ndarray, entity_idxs, relation_idxs, form, store=None,
-                 label_smoothing_rate: float = 0.0):
+                 label_smoothing_rate: float = 0.0, sparse_targets: bool = False):
         super().__init__()
         assert len(train_set_idx) > 0
         assert isinstance(train_set_idx, np.memmap) or isinstance(train_set_idx, np.ndarray)
         self.train_data = None
-        self.train_target = None
+        self.targets, self.target_offsets = None, None
         self.label_smoothing_rate = torch.tensor(label_smoothing_rate)
-        self.collate_fn = None
+        self.sparse_targets = sparse_targets
 
-        # (1) Create a dictionary of training data pints
+        # (1) Group training data points by unique tuples.
         # Either from tuple of entities or tuple of an entity and a relation
         if store is None:
-            store = dict()
             if form == 'RelationPrediction':
                 self.target_dim = len(relation_idxs)
-                for s_idx, p_idx, o_idx in train_set_idx:
-                    store.setdefault((s_idx, o_idx), list()).append(p_idx)
+                keys, self.target_offsets, self.targets = group_by_key_columns(train_set_idx, key_columns=(0, 2),
+                                                                               value_column=1)
             elif form == 'EntityPrediction':
                 self.target_dim = len(entity_idxs)
-                store = mapping_from_first_two_cols_to_third(train_set_idx)
+                keys, self.target_offsets, self.targets = group_by_key_columns(train_set_idx, key_columns=(0, 1),
+                                                                               value_column=2)
             else:
                 raise NotImplementedError
         else:
             raise ValueError()
-        assert len(store) > 0
-        # Keys in store correspond to integer representation (index) of subject and predicate
-        # Values correspond to a list of integer representations of entities.
-        self.train_data = torch.LongTensor(list(store.keys()))
-
-        if sum([len(i) for i in store.values()]) == len(store):
-            # if each s,p pair contains at most 1 entity
-            self.train_target = np.array(list(store.values()))
-            try:
-                assert isinstance(self.train_target[0], np.ndarray)
-            except IndexError or AssertionError:
-                print(self.train_target)
-                # TODO: Add info
-                exit(1)
-        else:
-            self.train_target = list(store.values())
-            assert isinstance(self.train_target[0], list)
-        del store
+        assert len(keys) > 0
+        # Keys correspond to integer representation (index) of subject and predicate
+        # targets[target_offsets[i]:target_offsets[i+1]] correspond to integer representations of entities.
+        # Flat numpy arrays avoid copy-on-write of Python objects in DataLoader workers.
+        self.train_data = torch.from_numpy(keys)
 
     def __len__(self):
-        assert len(self.train_data) == len(self.train_target)
+        assert len(self.train_data) + 1 == len(self.target_offsets)
         return len(self.train_data)
 
     def __getitem__(self, idx):
-        # 1. Initialize a vector of output.
-        y_vec = torch.zeros(self.target_dim)
-        y_vec[self.train_target[idx]] = 1.0
+        return self.train_data[idx], torch.from_numpy(self.targets[self.target_offsets[idx]:self.target_offsets[idx + 1]])
 
+    def collate_fn(self, batch: List[Tuple[torch.LongTensor, torch.LongTensor]]):
+        """
+        Construct multi-label vectors of a batch with a single scatter.
+
+        Returns
+        -------
+        x: torch.LongTensor of shape (batch size, 2)
+        y: torch.FloatTensor of shape (batch size, target_dim), sparse if self.sparse_targets
+        """
+        x = torch.stack([i[0] for i in batch], dim=0)
+        targets = [i[1] for i in batch]
+        # (1) Flat indices of labelled items.
+        rows = torch.repeat_interleave(torch.arange(len(targets)), torch.tensor([len(i) for i in targets]))
+        flat_idx = rows * self.target_dim + torch.cat(targets)
+        if self.sparse_targets:
+            # (2) Remove duplicates, as a dense vector would hold a single 1.0 for them.
+            flat_idx = torch.unique(flat_idx)
+            indices = torch.stack((flat_idx // self.target_dim, flat_idx % self.target_dim), dim=0)
+            values = torch.ones(len(flat_idx)) - self.label_smoothing_rate
+            return x, torch.sparse_coo_tensor(indices, values, size=(len(targets), self.target_dim),
+                                              is_coalesced=True)
+        # (2) Initialize multi-label vectors.
+        y_vec = torch.zeros(len(targets), self.target_dim)
+        y_vec.view(-1).scatter_(0, flat_idx, 1.0)
         if self.label_smoothing_rate:
-            y_vec = y_vec * (1 - self.label_smoothing_rate) + (1 / y_vec.size(0))
-        return self.train_data[idx], y_vec
+            y_vec = y_vec * (1 - self.label_smoothing_rate) + (1 / self.target_dim)
+        return x, y_vec
 
 
 class AllvsAll(torch.utils.data.Dataset):
@@ -396,41 +416,35 @@ class AllvsAll(torch.utils.data.Dataset):
         assert len(train_set_idx) > 0
         assert isinstance(train_set_idx, np.memmap) or isinstance(train_set_idx, np.ndarray)
         self.train_data = None
-        self.train_target = None
+        self.targets, self.target_offsets = None, None
         self.label_smoothing_rate = torch.tensor(label_smoothing_rate)
         self.collate_fn = None
-        # (1) Create a dictionary of training data pints
-        # Either from tuple of entities or tuple of an entity and a relation
+        # (1) Group training data points by unique tuples of an entity and a relation
         self.target_dim = len(entity_idxs)
         # (h,r) => [t]
-        store = mapping_from_first_two_cols_to_third(train_set_idx)
-        print("Number of unique pairs:", len(store))
-        for i in range(len(entity_idxs)):
-            for j in range(len(relation_idxs)):
-                if store.get((i, j), None) is None:
-                    store[(i, j)] = list()
-        print("Number of unique augmented pairs:", len(store))
-        assert len(store) > 0
-        self.train_data = torch.LongTensor(list(store.keys()))
-
-        if sum([len(i) for i in store.values()]) == len(store):
-            self.train_target = np.array(list(store.values()))
-            assert isinstance(self.train_target[0], np.ndarray)
-        else:
-            self.train_target = list(store.values())
-            assert isinstance(self.train_target[0], list)
-        del store
+        keys, offsets, self.targets = group_by_key_columns(train_set_idx, key_columns=(0, 1), value_column=2)
+        print("Number of unique pairs:", len(keys))
+        num_relations = len(relation_idxs)
+        # (2) Augment with all (h,r) pairs. Pairs are ordered as (h,r) => h * |R| + r, as keys are sorted.
+        counts = np.zeros(len(entity_idxs) * num_relations, dtype=np.int64)
+        counts[keys[:, 0] * num_relations + keys[:, 1]] = np.diff(offsets)
+        self.target_offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.target_offsets[1:])
+        print("Number of unique augmented pairs:", len(counts))
+        assert len(counts) > 0
+        self.train_data = torch.stack(torch.meshgrid(torch.arange(len(entity_idxs)),
+                                                     torch.arange(num_relations), indexing="ij"), dim=-1).reshape(-1, 2)
 
     def __len__(self):
-        assert len(self.train_data) == len(self.train_target)
+        assert len(self.train_data) + 1 == len(self.target_offsets)
         return len(self.train_data)
 
     def __getitem__(self, idx):
         # 1. Initialize a vector of output.
         y_vec = torch.zeros(self.target_dim)
-        existing_indices = self.train_target[idx]
+        existing_indices = torch.from_numpy(self.targets[self.target_offsets[idx]:self.target_offsets[idx + 1]])
         if len(existing_indices) > 0:
-            y_vec[self.train_target[idx]] = 1.0
+            y_vec[existing_indices] = 1.0
 
         if self.label_smoothing_rate:
             y_vec = y_vec * (1 - self.label_smoothing_rate) + (1 / y_vec.size(0))
@@ -458,8 +472,7 @@ class OnevsSample(torch.utils.data.Dataset):
         num_relations (int): Number of relations in the dataset.
         neg_sample_ratio (int): Ratio of negative samples to be drawn for each positive sample.
         label_smoothing_rate (torch.Tensor): The smoothing factor applied to the labels.
-        collate_fn (function, optional): A function that can be used to collate data samples into
-            batches (set to None by default).
+        collate_fn (function): Draws negative examples for a whole batch of triples at once.
     """
     def __init__(self, train_set: np.ndarray, num_entities, num_relations, neg_sample_ratio: int = None,
                  label_smoothing_rate: float = 0.0):
@@ -480,7 +493,8 @@ class OnevsSample(torch.utils.data.Dataset):
         self.num_relations = num_relations
         self.neg_sample_ratio = neg_sample_ratio
         self.label_smoothing_rate = torch.tensor(label_smoothing_rate)
-        self.collate_fn = None
+        # Random numbers are drawn from the global generator if None.
+        self.generator = None
 
     def __len__(self):
         """Returns the number of samples in the dataset."""
@@ -488,40 +502,73 @@ class OnevsSample(torch.utils.data.Dataset):
 
     def __getitem__(self, idx):
         """
-         Retrieves a single data sample from the dataset at the given index.
+         Retrieves a single triple from the dataset at the given index.
+         Negative examples are drawn in collate_fn for a batch of triples.
 
          Args:
              idx (int): The index of the sample to retrieve.
 
          Returns:
-             tuple: A tuple consisting of:
-                 - x (torch.Tensor): The head and relation part of the triple.
-                 - y_idx (torch.Tensor): The concatenated indices of the true object (tail entity)
-                   and the indices of the negative samples.
-                 - y_vec (torch.Tensor): A vector containing the labels for the positive and
-                   negative samples, with label smoothing applied.
+             torch.Tensor: (head entity, relation, tail entity)
          """
-        # Retrieve the triple (head, relation, tail) from the training data
-        triple = self.train_data[idx]
-        # Separate the head and relation (x) and the tail entity (y)
-        x = triple[:2]
-        y = triple[-1].unsqueeze(0)  # Tail entity
+        return self.train_data[idx]
 
-        # Initialize weights for negative sampling
-        weights = torch.ones(self.num_entities)
-        # Set the weight of the true tail entity to zero
-        weights[y] = 0.0
+    def sample_negatives(self, y: torch.LongTensor) -> torch.LongTensor:
+        """
+        Draw neg_sample_ratio distinct negative entities for each true tail entity without replacement.
 
-        # Sample negative examples from the entity set
-        negative_idx = torch.multinomial(weights, num_samples=self.neg_sample_ratio, replacement=False)
-        # Concatenate the true tail entity with the negative samples
-        y_idx = torch.cat((y, negative_idx), 0).long()
+        (1) Draw candidates uniformly at random for the whole batch.
+        (2) Reject candidates being the true tail entity or a duplicate in its row and redraw only them.
+
+        Args:
+            y (torch.LongTensor): True tail entities of shape (batch_size,)
+
+        Returns:
+            torch.LongTensor: Negative entities of shape (batch_size, neg_sample_ratio)
+        """
+        size_of_batch = len(y)
+        if 2 * self.neg_sample_ratio > self.num_entities:
+            # Rejection is inefficient if most of the entities are sampled
+            weights = torch.ones(size_of_batch, self.num_entities)
+            weights[torch.arange(size_of_batch), y] = 0.0
+            return torch.multinomial(weights, num_samples=self.neg_sample_ratio, replacement=False,
+                                     generator=self.generator)
+        # (1) Draw candidates.
+        negative_idx = torch.randint(0, self.num_entities, (size_of_batch, self.neg_sample_ratio),
+                                     generator=self.generator)
+        y = y.unsqueeze(1)
+        while True:
+            # (2) Reject the true tail and duplicates. The first occurrence of a duplicate is kept.
+            sorted_idx, order = torch.sort(negative_idx, dim=1, stable=True)
+            duplicate = torch.zeros_like(negative_idx, dtype=torch.bool)
+            duplicate.scatter_(1, order[:, 1:], sorted_idx[:, 1:] == sorted_idx[:, :-1])
+            rejected = duplicate | (negative_idx == y)
+            num_rejected = int(rejected.sum())
+            if num_rejected == 0:
+                return negative_idx
+            negative_idx[rejected] = torch.randint(0, self.num_entities, (num_rejected,), generator=self.generator)
 
+    def collate_fn(self, batch: List[torch.Tensor]):
+        """
+        Construct a batch of inputs and outputs for forward_k_vs_sample.
+
+        Returns:
+            tuple: A tuple consisting of:
+                - x (torch.Tensor): The head and relation parts of triples of shape (batch_size, 2).
+                - y_idx (torch.Tensor): The indices of the true tail entities followed by the indices of the negative
+                  samples of shape (batch_size, 1 + neg_sample_ratio).
+                - y_vec (torch.Tensor): Labels for the positive and negative samples with label smoothing applied
+                  of shape (batch_size, 1 + neg_sample_ratio).
+        """
+        batch = torch.stack(batch, dim=0)
+        x, y = batch[:, :2], batch[:, 2]
+        # Concatenate the true tail entity with the negative samples
+        y_idx = torch.cat((y.unsqueeze(1), self.sample_negatives(y)), 1).long()
         # Create a label vector with smoothing for the true and negative examples
         y_vec = torch.cat(
-            (torch.ones(1) - self.label_smoothing_rate,  # Positive label with smoothing
-             torch.zeros(self.neg_sample_ratio) + self.label_smoothing_rate),  # Negative labels with smoothing
-            0)
+            (torch.ones(len(batch), 1) - self.label_smoothing_rate,  # Positive label with smoothing
+             torch.zeros(len(batch), self.neg_sample_ratio) + self.label_smoothing_rate),  # Negative labels with smoothing
+            1)
         return x, y_idx, y_vec
 
 
@@ -562,20 +609,21 @@ class KvsSampleDataset(torch.utils.data.Dataset):
         assert isinstance(train_set_idx, np.ndarray)
         assert neg_ratio is not None
         self.train_data = None
-        self.train_target = None
+        self.targets, self.target_offsets = None, None
         self.neg_ratio = neg_ratio
         self.num_entities = len(entity_idxs)
         self.label_smoothing_rate = torch.tensor(label_smoothing_rate)
         self.collate_fn = None
-        store = mapping_from_first_two_cols_to_third(train_set_idx)
-        assert len(store) > 0
-        # Keys in store correspond to integer representation (index) of subject and predicate
-        # Values correspond to a list of integer representations of entities.
-        self.train_data = torch.LongTensor(list(store.keys()))
-        self.train_target = list(store.values())
-        self.max_num_of_classes = max([ len(i) for i in self.train_target]) + self.neg_ratio
-
-        del store
+        keys, self.target_offsets, self.targets = group_by_key_columns(train_set_idx, key_columns=(0, 1),
+                                                                       value_column=2)
+        assert len(keys) > 0
+        # Keys correspond to integer representation (index) of subject and predicate
+        # targets[target_offsets[i]:target_offsets[i+1]] correspond to integer representations of entities.
+        self.train_data = torch.from_numpy(keys)
+        self.max_num_of_classes = int(np.diff(self.target_offsets).max()) + self.neg_ratio
+        # Random numbers are drawn from the global generator if None.
+        self.generator = None
+
     def __len__(self):
         return len(self.train_data)
 
@@ -583,15 +631,16 @@ class KvsSampleDataset(torch.utils.data.Dataset):
         # (1) Get i.th unique (head,relation) pair.
         x = self.train_data[idx]
         # (2) Get tail entities given (1).
-        y = self.train_target[idx]
+        y = torch.from_numpy(self.targets[self.target_offsets[idx]:self.target_offsets[idx + 1]])
         num_positive_class =len(y)
         num_negative_class = self.max_num_of_classes - num_positive_class
         # Sample negatives
         weights = torch.ones(self.num_entities)
         weights[y] = 0.0
-        negative_idx = torch.multinomial(weights, num_samples=num_negative_class, replacement=True)
+        negative_idx = torch.multinomial(weights, num_samples=num_negative_class, replacement=True,
+                                         generator=self.generator)
 
-        y_idx = torch.cat((torch.LongTensor(y), negative_idx), 0)
+        y_idx = torch.cat((y, negative_idx), 0)
         y_vec = torch.cat((torch.ones(num_positive_class), torch.zeros(num_negative_class)),0)
         return x, y_idx, y_vec
 
@@ -610,6 +659,8 @@ class NegSampleDataset(torch.utils.data.Dataset):
         self.length = len(self.train_set)
         self.num_entities = torch.tensor(num_entities)
         self.num_relations = torch.tensor(num_relations)
+        # Random numbers are drawn from the global generator if None.
+        self.generator = None
 
     def __len__(self):
         return self.length
@@ -618,9 +669,9 @@ class NegSampleDataset(torch.utils.data.Dataset):
         # (1) Get a triple.
         triple = self.train_set[idx]
         # (2) Sample an entity.
-        corr_entities = torch.randint(0, high=self.num_entities, size=(1,))
+        corr_entities = torch.randint(0, high=self.num_entities, size=(1,), generator=self.generator)
         # (3) Flip a coin
-        if torch.rand(1) >= 0.5:
+        if torch.rand(1, generator=self.generator) >= 0.5:
             # (3.1) Corrupt (1) via tai.
             negative_triple = torch.cat((triple[:, 0], triple[:, 1], corr_entities), dim=0).unsqueeze(0)
         else:
@@ -680,6 +731,8 @@ class TriplePredictionDataset(torch.utils.data.Dataset):
         self.length = len(self.train_set)
         self.num_entities = torch.tensor(num_entities)
         self.num_relations = torch.tensor(num_relations)
+        # Random numbers are drawn from the global generator if None.
+        self.generator = None
 
     def __len__(self):
         return self.length
@@ -693,8 +746,9 @@ class TriplePredictionDataset(torch.utils.data.Dataset):
         size_of_batch, _ = batch.shape
         assert size_of_batch > 0
         label = torch.ones((size_of_batch,)) - self.label_smoothing_rate
-        corr_entities = torch.randint(0, high=self.num_entities, size=(size_of_batch * self.neg_sample_ratio,),dtype=torch.long)
-        if torch.rand(1) >= 0.5:
+        corr_entities = torch.randint(0, high=self.num_entities, size=(size_of_batch * self.neg_sample_ratio,),
+                                      dtype=torch.long, generator=self.generator)
+        if torch.rand(1, generator=self.generator) >= 0.5:
             # corrupt head
             r_head_corr = r.repeat(self.neg_sample_ratio, )
             t_head_corr = t.repeat(self.neg_sample_ratio, )
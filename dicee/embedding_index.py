@@ -0,0 +1,219 @@
+import os
+import json
+import numpy as np
+from typing import Tuple
+
+
+def topk_desc(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """ Indices and values of the k highest scores per row in descending order """
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return np.zeros((len(scores), 0), dtype=np.int64), np.zeros((len(scores), 0), dtype=scores.dtype)
+    idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    values = np.take_along_axis(scores, idx, axis=1)
+    order = np.argsort(-values, axis=1, kind="stable")
+    return np.take_along_axis(idx, order, axis=1), np.take_along_axis(values, order, axis=1)
+
+
+class EmbeddingIndex:
+    """
+    In-process nearest neighbour index over a (memory mapped) embedding matrix.
+
+    The exact search computes scores of queries against blocks of rows via matrix multiplication and merges top k
+    results of blocks. With an inverted file (IVF), rows are partitioned by k-means and only rows of the num_probes
+    closest partitions of a query are scored.
+
+    Arguments
+   ----------
+   embeddings: np.ndarray
+       float32 or float16 matrix of shape (num_items, dim)
+   metric: str
+       cosine or dot
+   inverse_norms: np.ndarray
+       1 / ||embeddings[i]|| of shape (num_items,), used for the cosine metric
+   centroids: np.ndarray
+       IVF centroids of shape (num_lists, dim)
+   list_offsets: np.ndarray
+       Rows of the i.th list are list_indices[list_offsets[i]:list_offsets[i+1]]
+   list_indices: np.ndarray
+       Rows sorted by their lists
+   """
+
+    def __init__(self, embeddings: np.ndarray, metric: str = "cosine", inverse_norms: np.ndarray = None,
+                 centroids: np.ndarray = None, list_offsets: np.ndarray = None, list_indices: np.ndarray = None):
+        assert metric in ["cosine", "dot"], f"Unexpected metric:{metric}"
+        assert embeddings.ndim == 2
+        self.embeddings = embeddings
+        self.metric = metric
+        if metric == "cosine" and inverse_norms is None:
+            inverse_norms = self.compute_inverse_norms(embeddings)
+        self.inverse_norms = inverse_norms
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_indices = list_indices
+
+    def __len__(self):
+        return len(self.embeddings)
+
+    @property
+    def is_ivf(self) -> bool:
+        return self.centroids is not None
+
+    @staticmethod
+    def compute_inverse_norms(embeddings: np.ndarray, block_size: int = 65536) -> np.ndarray:
+        inverse_norms = np.empty(len(embeddings), dtype=np.float32)
+        for start in range(0, len(embeddings), block_size):
+            norms = np.linalg.norm(np.asarray(embeddings[start:start + block_size], dtype=np.float32), axis=1)
+            inverse_norms[start:start + block_size] = 1.0 / np.maximum(norms, 1e-12)
+        return inverse_norms
+
+    @classmethod
+    def build(cls, embeddings: np.ndarray, metric: str = "cosine", dtype: str = "float32", num_lists: int = 0,
+              num_iterations: int = 10, random_seed: int = 1):
+        """
+        Construct an index.
+
+        Parameters
+        ----------
+        embeddings: matrix of shape (num_items, dim)
+        metric: cosine or dot
+        dtype: float32 or float16 storage of embeddings
+        num_lists: number of k-means partitions. 0 implies the exact search only
+        num_iterations: number of k-means iterations
+        random_seed: seed of k-means initialization
+
+        Returns
+        -------
+        EmbeddingIndex
+        """
+        assert dtype in ["float32", "float16"]
+        index = cls(np.ascontiguousarray(embeddings, dtype=dtype), metric=metric)
+        if num_lists > 0:
+            index.train_ivf(num_lists, num_iterations, random_seed)
+        return index
+
+    def normalized_rows(self, rows) -> np.ndarray:
+        """ Rows (a slice or an index array) as float32, divided by their norms for the cosine metric """
+        block = np.asarray(self.embeddings[rows], dtype=np.float32)
+        if self.metric == "cosine":
+            # Out of place: float32 rows are a view of the stored (possibly read-only) embeddings.
+            block = block * self.inverse_norms[rows][:, None]
+        return block
+
+    def train_ivf(self, num_lists: int, num_iterations: int = 10, random_seed: int = 1,
+                  block_size: int = 65536) -> None:
+        """ Partition rows into num_lists lists via (spherical for cosine) k-means over inner products """
+        num_lists = min(num_lists, len(self))
+        rng = np.random.default_rng(random_seed)
+        # (1) Train centroids on a sample.
+        sample = np.sort(rng.choice(len(self), size=min(len(self), 256 * num_lists), replace=False))
+        x = self.normalized_rows(sample)
+        centroids = x[rng.choice(len(x), size=num_lists, replace=False)].copy()
+        for _ in range(num_iterations):
+            assignment = np.argmax(x @ centroids.T, axis=1)
+            counts = np.bincount(assignment, minlength=num_lists)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, x)
+            non_empty = counts > 0
+            centroids[non_empty] = sums[non_empty] / counts[non_empty][:, None]
+            if self.metric == "cosine":
+                centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+        # (2) Assign all rows block by block.
+        assignment = np.empty(len(self), dtype=np.int64)
+        for start in range(0, len(self), block_size):
+            rows = slice(start, start + block_size)
+            assignment[rows] = np.argmax(self.normalized_rows(rows) @ centroids.T, axis=1)
+        self.list_indices = np.argsort(assignment, kind="stable").astype(np.int64)
+        self.list_offsets = np.zeros(num_lists + 1, dtype=np.int64)
+        self.list_offsets[1:] = np.cumsum(np.bincount(assignment, minlength=num_lists))
+        self.centroids = centroids.astype(np.float32)
+
+    def prepare_queries(self, queries: np.ndarray) -> np.ndarray:
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        assert queries.shape[1] == self.embeddings.shape[1], "Dimensions of queries and embeddings differ"
+        if self.metric == "cosine":
+            queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        return queries
+
+    def search(self, queries: np.ndarray, topk: int = 10, block_size: int = 65536,
+               num_probes: int = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find topk rows with the highest cosine similarities or dot products for a batch of queries.
+
+        Parameters
+        ----------
+        queries: matrix of shape (num_queries, dim)
+        topk: number of neighbours per query
+        block_size: number of rows scored at once in the exact search
+        num_probes: number of IVF lists scored per query. None implies the exact search
+
+        Returns
+        -------
+        indices and scores of shape (num_queries, topk)
+        """
+        queries = self.prepare_queries(queries)
+        if num_probes is not None:
+            assert self.is_ivf, "num_probes requires an IVF index"
+            return self.search_ivf(queries, topk, num_probes)
+        topk = min(topk, len(self))
+        best_idx = np.zeros((len(queries), 0), dtype=np.int64)
+        best_scores = np.zeros((len(queries), 0), dtype=np.float32)
+        for start in range(0, len(self), block_size):
+            rows = slice(start, start + block_size)
+            # (1) Score a block and (2) merge its top k into the current top k.
+            block_idx, block_scores = topk_desc(queries @ self.normalized_rows(rows).T, topk)
+            merged_idx = np.concatenate((best_idx, block_idx + start), axis=1)
+            merged_scores = np.concatenate((best_scores, block_scores), axis=1)
+            position, best_scores = topk_desc(merged_scores, topk)
+            best_idx = np.take_along_axis(merged_idx, position, axis=1)
+        return best_idx, best_scores
+
+    def search_ivf(self, queries: np.ndarray, topk: int, num_probes: int) -> Tuple[np.ndarray, np.ndarray]:
+        topk = min(topk, len(self))
+        num_probes = min(num_probes, len(self.centroids))
+        probes, _ = topk_desc(queries @ self.centroids.T, num_probes)
+        indices = np.full((len(queries), topk), -1, dtype=np.int64)
+        scores = np.full((len(queries), topk), -np.inf, dtype=np.float32)
+        for i, (query, lists) in enumerate(zip(queries, probes)):
+            candidates = np.sort(np.concatenate([self.list_indices[self.list_offsets[j]:self.list_offsets[j + 1]]
+                                                 for j in lists]))
+            if len(candidates) == 0:
+                continue
+            position, candidate_scores = topk_desc((self.normalized_rows(candidates) @ query)[None, :], topk)
+            n = position.shape[1]
+            indices[i, :n] = candidates[position[0]]
+            scores[i, :n] = candidate_scores[0]
+        return indices, scores
+
+    def save(self, path: str) -> None:
+        """ Save the index into a folder, e.g., {path of a pretrained model}/embedding_index """
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "embeddings.npy"), self.embeddings)
+        if self.inverse_norms is not None:
+            np.save(os.path.join(path, "inverse_norms.npy"), self.inverse_norms)
+        if self.is_ivf:
+            np.save(os.path.join(path, "centroids.npy"), self.centroids)
+            np.save(os.path.join(path, "list_offsets.npy"), self.list_offsets)
+            np.save(os.path.join(path, "list_indices.npy"), self.list_indices)
+        with open(os.path.join(path, "header.json"), "w") as file_descriptor:
+            json.dump({"metric": self.metric, "dtype": self.embeddings.dtype.name,
+                       "num_items": len(self), "dim": self.embeddings.shape[1],
+                       "num_lists": len(self.centroids) if self.is_ivf else 0}, file_descriptor, indent=4)
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.isfile(os.path.join(path, "header.json"))
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: str = "r"):
+        """ Load the index via memory mapping, i.e., without reading the embedding matrix into memory """
+        with open(os.path.join(path, "header.json"), "r") as file_descriptor:
+            header = json.load(file_descriptor)
+
+        def load_array(name: str):
+            file_path = os.path.join(path, f"{name}.npy")
+            return np.load(file_path, mmap_mode=mmap_mode) if os.path.isfile(file_path) else None
+
+        return cls(load_array("embeddings"), metric=header["metric"], inverse_norms=load_array("inverse_norms"),
+                   centroids=load_array("centroids"), list_offsets=load_array("list_offsets"),
+                   list_indices=load_array("list_indices"))
@@ -5,7 +5,7 @@ import json
 
 from . import load_json
 from .static_funcs import pickle
-from .static_funcs_training import evaluate_lp, evaluate_bpe_lp
+from .static_funcs_training import evaluate_lp, evaluate_bpe_lp, FilterIndex, filtered_ranks, load_filter_index
 from typing import Tuple, List
 from .knowledge_graph import KG
 
@@ -23,6 +23,9 @@ class Evaluator:
         self.re_vocab = None
         self.er_vocab = None
         self.ee_vocab = None
+        # CSR filter indexes constructed from er_vocab, re_vocab and ee_vocab
+        self.er_filter, self.re_filter, self.ee_filter = None, None, None
+        self.range_constraints_filter = None
         self.func_triple_to_bpe_representation = None
         self.is_continual_training = is_continual_training
         self.num_entities = None
@@ -44,28 +47,21 @@ class Evaluator:
         None
         """
         # print("** VOCAB Prep **")
-        if isinstance(dataset.er_vocab, dict):
-            self.er_vocab = dataset.er_vocab
-        else:
-            self.er_vocab = dataset.er_vocab.result()
-
-        if isinstance(dataset.re_vocab, dict):
-            self.re_vocab = dataset.re_vocab
-        else:
-            self.re_vocab = dataset.re_vocab.result()
-
-        if isinstance(dataset.ee_vocab, dict):
-            self.ee_vocab = dataset.ee_vocab.result()
-        else:
-            self.ee_vocab = dataset.ee_vocab.result()
-
+        self.er_vocab = dataset.er_vocab if isinstance(dataset.er_vocab, (dict, FilterIndex)) else dataset.er_vocab.result()
+        self.re_vocab = dataset.re_vocab if isinstance(dataset.re_vocab, (dict, FilterIndex)) else dataset.re_vocab.result()
+        self.ee_vocab = dataset.ee_vocab if isinstance(dataset.ee_vocab, (dict, FilterIndex)) else dataset.ee_vocab.result()
+        self.er_filter, self.re_filter, self.ee_filter = None, None, None
         self.num_entities = dataset.num_entities
         self.num_relations = dataset.num_relations
         self.func_triple_to_bpe_representation = dataset.func_triple_to_bpe_representation
 
-        pickle.dump(self.er_vocab, open(self.args.full_storage_path + "/er_vocab.p", "wb"))
-        pickle.dump(self.re_vocab, open(self.args.full_storage_path + "/re_vocab.p", "wb"))
-        pickle.dump(self.ee_vocab, open(self.args.full_storage_path + "/ee_vocab.p", "wb"))
+        for name, vocab in [("er_vocab", self.er_vocab), ("re_vocab", self.re_vocab), ("ee_vocab", self.ee_vocab)]:
+            if isinstance(vocab, FilterIndex):
+                # Filter indexes are often saved during the preprocessing and might be memory mapped from there.
+                if not FilterIndex.exists(self.args.full_storage_path, name):
+                    vocab.save(self.args.full_storage_path, name)
+            else:
+                pickle.dump(vocab, open(self.args.full_storage_path + f"/{name}.p", "wb"))
 
     # @timeit
     def eval(self, dataset: KG, trained_model, form_of_labelling, during_training=False) -> None:
@@ -140,9 +136,10 @@ class Evaluator:
         return train_set, valid_set, test_set
 
     def __load_and_set_mappings(self):
-        self.er_vocab = pickle.load(open(self.args.full_storage_path + "/er_vocab.p", "rb"))
-        self.re_vocab = pickle.load(open(self.args.full_storage_path + "/re_vocab.p", "rb"))
-        self.ee_vocab = pickle.load(open(self.args.full_storage_path + "/ee_vocab.p", "rb"))
+        self.er_vocab = load_filter_index(self.args.full_storage_path, "er_vocab")
+        self.re_vocab = load_filter_index(self.args.full_storage_path, "re_vocab")
+        self.ee_vocab = load_filter_index(self.args.full_storage_path, "ee_vocab")
+        self.er_filter, self.re_filter, self.ee_filter = None, None, None
         report = load_json(self.args.full_storage_path + "/report.json")
         self.num_entities = report["num_entities"]
         self.num_relations = report["num_relations"]
@@ -245,6 +242,24 @@ class Evaluator:
                                             form_of_labelling=form_of_labelling)
             self.report['Test'] = res
 
+    def get_filter_indexes(self) -> Tuple[FilterIndex, FilterIndex, FilterIndex]:
+        """ Construct CSR filter indexes from er_vocab, re_vocab and ee_vocab once and reuse them afterwards """
+        if self.er_filter is None and self.er_vocab is not None:
+            self.er_filter = FilterIndex.from_vocab(self.er_vocab)
+        if self.re_filter is None and self.re_vocab is not None:
+            self.re_filter = FilterIndex.from_vocab(self.re_vocab)
+        if self.ee_filter is None and self.ee_vocab is not None:
+            self.ee_filter = FilterIndex.from_vocab(self.ee_vocab)
+        return self.er_filter, self.re_filter, self.ee_filter
+
+    def get_range_constraints_filter(self) -> FilterIndex:
+        """ Construct a CSR filter index mapping (relation, 0) to entities being outside of the range of relation """
+        if self.range_constraints_filter is None:
+            self.range_constraints_filter = FilterIndex.from_vocab(
+                {(rel, 0): entities for rel, entities in self.range_constraints_per_rel.items()})
+        return self.range_constraints_filter
+
+    @torch.no_grad()
     def evaluate_lp_k_vs_all(self, model, triple_idx, info=None, form_of_labelling=None):
         """
         Filtered link prediction evaluation.
@@ -258,9 +273,7 @@ class Evaluator:
         model.eval()
         num_triples = len(triple_idx)
         ranks = []
-        # Hit range
-        hits_range = [i for i in range(1, 11)]
-        hits = {i: [] for i in hits_range}
+        er_filter, _, ee_filter = self.get_filter_indexes()
         if info and self.during_training is False:
             print(info + ':', end=' ')
         if form_of_labelling == 'RelationPrediction':
@@ -270,21 +283,9 @@ class Evaluator:
                 e1_idx_e2_idx, r_idx = torch.LongTensor(data_batch[:, [0, 2]]), torch.LongTensor(data_batch[:, 1])
                 # Generate predictions
                 predictions = model.forward_k_vs_all(x=e1_idx_e2_idx)
-                # Filter entities except the target entity
-                for j in range(data_batch.shape[0]):
-                    filt = self.ee_vocab[(data_batch[j][0], data_batch[j][2])]
-                    target_value = predictions[j, r_idx[j]].item()
-                    predictions[j, filt] = -np.Inf
-                    predictions[j, r_idx[j]] = target_value
-                # Sort predictions.
-                sort_values, sort_idxs = torch.sort(predictions, dim=1, descending=True)
-                # This can be also done in parallel
-                for j in range(data_batch.shape[0]):
-                    rank = torch.where(sort_idxs[j] == r_idx[j])[0].item() + 1
-                    ranks.append(rank)
-                    for hits_level in hits_range:
-                        if rank <= hits_level:
-                            hits[hits_level].append(1.0)
+                # Filter relations except the target relation and compute the filtered ranks.
+                ranks.extend(filtered_ranks(predictions, r_idx, ee_filter,
+                                            first=data_batch[:, 0], second=data_batch[:, 2]).tolist())
         else:
             # Iterate over integer indexed triples in mini batch fashion
             for i in range(0, num_triples, self.args.batch_size):
@@ -293,39 +294,23 @@ class Evaluator:
                 # (2) Extract entities and relations.
                 e1_idx_r_idx, e2_idx = torch.LongTensor(data_batch[:, [0, 1]]), torch.tensor(data_batch[:, 2])
                 # (3) Predict missing entities, i.e., assign probs to all entities.
-                with torch.no_grad():
-                    predictions = model(e1_idx_r_idx)
-                # (4) Filter entities except the target entity
-                for j in range(data_batch.shape[0]):
-                    # (4.1) Get the ids of the head entity, the relation and the target tail entity in the j.th triple.
-                    id_e, id_r, id_e_target = data_batch[j]
-                    # (4.2) Get all ids of all entities occurring with the head entity and relation extracted in 4.1.
-                    filt = self.er_vocab[(id_e, id_r)]
-                    # (4.3) Store the assigned score of the target tail entity extracted in 4.1.
-                    target_value = predictions[j, id_e_target].item()
-                    # (4.4.1) Filter all assigned scores for entities.
-                    predictions[j, filt] = -np.Inf
-                    # (4.4.2) Filter entities based on the range of a relation as well.
-                    if 'constraint' in self.args.eval_model:
-                        predictions[j, self.range_constraints_per_rel[data_batch[j, 1]]] = -np.Inf
-                    # (4.5) Insert 4.3. after filtering.
-                    predictions[j, id_e_target] = target_value
-                # (5) Sort predictions.
-                sort_values, sort_idxs = torch.sort(predictions, dim=1, descending=True)
-                # (6) Compute the filtered ranks.
-                for j in range(data_batch.shape[0]):
-                    # index between 0 and \inf
-                    rank = torch.where(sort_idxs[j] == e2_idx[j])[0].item() + 1
-                    ranks.append(rank)
-                    for hits_level in hits_range:
-                        if rank <= hits_level:
-                            hits[hits_level].append(1.0)
-        # (7) Sanity checking: a rank for a triple
+                predictions = model(e1_idx_r_idx)
+                # (4) Filter entities based on the range of a relation as well.
+                extra_filter = None
+                if 'constraint' in self.args.eval_model:
+                    extra_filter = self.get_range_constraints_filter().lookup(data_batch[:, 1],
+                                                                              np.zeros(len(data_batch)))
+                # (5) Filter all entities except the target entity and compute the filtered ranks.
+                ranks.extend(filtered_ranks(predictions, e2_idx, er_filter,
+                                            first=data_batch[:, 0], second=data_batch[:, 1],
+                                            extra_filter=extra_filter).tolist())
+        ranks = np.array(ranks)
+        # (6) Sanity checking: a rank for a triple
         assert len(triple_idx) == len(ranks) == num_triples
-        hit_1 = sum(hits[1]) / num_triples
-        hit_3 = sum(hits[3]) / num_triples
-        hit_10 = sum(hits[10]) / num_triples
-        mean_reciprocal_rank = np.mean(1. / np.array(ranks))
+        hit_1 = float((ranks <= 1).sum()) / num_triples
+        hit_3 = float((ranks <= 3).sum()) / num_triples
+        hit_10 = float((ranks <= 10).sum()) / num_triples
+        mean_reciprocal_rank = np.mean(1. / ranks)
 
         results = {'H@1': hit_1, 'H@3': hit_3, 'H@10': hit_10, 'MRR': mean_reciprocal_rank}
         if info and self.during_training is False:
@@ -418,7 +403,7 @@ class Evaluator:
                 for hits_level in hits_range:
                     if rank <= hits_level:
                         hits[hits_level].append(1.0)
-        # (7) Sanity checking: a rank for a triple
+        # (6) Sanity checking: a rank for a triple
         assert len(triples) == len(ranks) == num_triples
         hit_1 = sum(hits[1]) / num_triples
         hit_3 = sum(hits[3]) / num_triples
@@ -435,10 +420,11 @@ class Evaluator:
         assert self.num_entities is not None, "self.num_entities cannot be None"
         assert self.er_vocab is not None, "self.er_vocab cannot be None"
         assert self.re_vocab is not None, "self.re_vocab cannot be None"
+        er_filter, re_filter, _ = self.get_filter_indexes()
         return evaluate_lp(model, triple_idx,
                            num_entities=self.num_entities,
-                           er_vocab=self.er_vocab,
-                           re_vocab=self.re_vocab, info=info)
+                           er_vocab=er_filter,
+                           re_vocab=re_filter, info=info)
 
     def dummy_eval(self, trained_model, form_of_labelling: str):
         assert trained_model is not None
@@ -10,7 +10,8 @@ from .knowledge_graph import KG
 from .evaluator import Evaluator
 from .static_preprocess_funcs import preprocesses_input_args
 from .trainer import DICE_Trainer
-from .static_funcs import timeit, read_or_load_kg, load_json, store, create_experiment_folder
+from .static_funcs import timeit, read_or_load_kg, load_json, store, create_experiment_folder, \
+    exists_memory_map_train_set, load_memory_map_train_set
 import numpy as np
 
 logging.getLogger('pytorch_lightning').setLevel(0)
@@ -90,12 +91,16 @@ class Execute:
             store(trained_model=self.trained_model,
                   model_name='model',
                   full_storage_path=self.args.full_storage_path,
-                  save_embeddings_as_csv=self.args.save_embeddings_as_csv)
+                  save_embeddings_as_csv=self.args.save_embeddings_as_csv,
+                  checkpoint_format=getattr(self.args, "checkpoint_format", "pt"),
+                  shard_size=getattr(self.args, "checkpoint_shard_size", None))
         else:
             store(trained_model=self.trained_model,
                   model_name='model', # + str(datetime.datetime.now()),
                   full_storage_path=self.args.full_storage_path,
-                  save_embeddings_as_csv=self.args.save_embeddings_as_csv)
+                  save_embeddings_as_csv=self.args.save_embeddings_as_csv,
+                  checkpoint_format=getattr(self.args, "checkpoint_format", "pt"),
+                  shard_size=getattr(self.args, "checkpoint_shard_size", None))
 
         self.report['path_experiment_folder'] = self.args.full_storage_path
         self.report['num_entities'] = self.args.num_entities
@@ -161,14 +166,9 @@ class Execute:
         self.start_time = time.time()
         print(f"Start time:{datetime.datetime.now()}")
         # (1) Reload the memory-map of index knowledge graph stored as a numpy ndarray.
-        if self.args.path_to_store_single_run and os.path.exists(self.args.path_to_store_single_run+"/memory_map_train_set.npy"):
+        if self.args.path_to_store_single_run and exists_memory_map_train_set(self.args.path_to_store_single_run):
             # (1.1) Read information about memory-map of KG.
-            with open(self.args.path_to_store_single_run+'/memory_map_details.json', 'r') as file_descriptor:
-                memory_map_details = json.load(file_descriptor)
-            self.knowledge_graph = np.memmap(self.args.path_to_store_single_run + '/memory_map_train_set.npy',
-                                             mode='r',
-                                             dtype=memory_map_details["dtype"],
-                                             shape=tuple(memory_map_details["shape"]))
+            self.knowledge_graph, memory_map_details = load_memory_map_train_set(self.args.path_to_store_single_run)
             self.args.num_entities = memory_map_details["num_entities"]
             self.args.num_relations = memory_map_details["num_relations"]
             self.args.num_tokens = None
@@ -190,6 +190,10 @@ class Execute:
                   "dtype":self.knowledge_graph.train_set.dtype.str,
                   "num_entities":self.knowledge_graph.num_entities,
                   "num_relations":self.knowledge_graph.num_relations}
+            if isinstance(self.knowledge_graph.train_set, np.memmap):
+                # --backend polars_streaming: Training triples are memory mapped from train_set.npy.
+                data["file"] = os.path.basename(self.knowledge_graph.train_set.filename)
+                data["offset"] = self.knowledge_graph.train_set.offset
             with open(self.args.full_storage_path + '/memory_map_details.json', 'w') as file_descriptor:
                 json.dump(data, file_descriptor, indent=4)
 
@@ -202,6 +206,8 @@ class Execute:
                                     evaluator=self.evaluator)
         # (4) Start the training
         self.trained_model, form_of_labelling = self.trainer.start(knowledge_graph=self.knowledge_graph)
+        if "epoch_timings" in self.trainer.report:
+            self.report["epoch_timings"] = self.trainer.report["epoch_timings"]
         return self.end(form_of_labelling)
 
 
@@ -261,14 +267,9 @@ class ContinuousExecute(Execute):
                                     storage_path=self.args.continual_learning)
         # (2)
 
-        assert os.path.exists(f"{self.args.continual_learning}/memory_map_train_set.npy")
+        assert exists_memory_map_train_set(self.args.continual_learning)
         # (1) Reload the memory-map of index knowledge graph stored as a numpy ndarray.
-        with open(f"{self.args.continual_learning}/memory_map_details.json", 'r') as file_descriptor:
-            memory_map_details = json.load(file_descriptor)
-        knowledge_graph = np.memmap(f"{self.args.continual_learning}/memory_map_train_set.npy",
-                                         mode='r',
-                                         dtype=memory_map_details["dtype"],
-                                         shape=tuple(memory_map_details["shape"]))
+        knowledge_graph, memory_map_details = load_memory_map_train_set(self.args.continual_learning)
         self.args.num_entities = memory_map_details["num_entities"]
         self.args.num_relations = memory_map_details["num_relations"]
         self.args.num_tokens = None
@@ -1,5 +1,5 @@
 from typing import List
-from .read_preprocess_save_load_kg import ReadFromDisk, PreprocessKG, LoadSaveToDisk
+from .read_preprocess_save_load_kg import ReadFromDisk, PreprocessKG, LoadSaveToDisk, PreprocessingCache
 import sys
 import pandas as pd
 import polars as pl
@@ -16,7 +16,8 @@ class KG:
                  add_reciprocal: bool = None, eval_model: str = None,
                  read_only_few: int = None, sample_triples_ratio: float = None,
                  path_for_serialization: str = None,
-                 entity_to_idx=None, relation_to_idx=None, backend=None, training_technique: str = None, separator:str=None):
+                 entity_to_idx=None, relation_to_idx=None, backend=None, training_technique: str = None, separator:str=None,
+                 preprocessing_cache_dir: str = None):
         """
         :param dataset_dir: A path of a folder containing train.txt, valid.txt, test.text
         :param byte_pair_encoding: Apply Byte pair encoding.
@@ -32,6 +33,8 @@ class KG:
         :param add_noise_rate: Add say 10% noise in the input data
         sample_triples_ratio
         :param training_technique
+        :param preprocessing_cache_dir: A folder of preprocessed knowledge graphs reused by runs on the same input.
+        If None, no cache is used.
         """
         self.dataset_dir = dataset_dir
         self.sparql_endpoint = sparql_endpoint
@@ -59,27 +62,41 @@ class KG:
         self.idx_entity_to_bpe_shaped = dict()
 
         # WIP:
-        import tiktoken
-        self.enc = tiktoken.get_encoding("gpt2")
-        self.num_tokens = self.enc.n_vocab  # ~ 50
+        if self.byte_pair_encoding:
+            # tiktoken is imported only for byte pair encoding.
+            import tiktoken
+            self.enc = tiktoken.get_encoding("gpt2")
+            self.num_tokens = self.enc.n_vocab  # ~ 50
+            # TODO: Find a unique token later
+            self.dummy_id = self.enc.encode(" ")[0]
+        else:
+            self.enc, self.num_tokens, self.dummy_id = None, None, None
         self.num_bpe_entities = None
         self.padding = padding
-        # TODO: Find a unique token later
-        self.dummy_id = self.enc.encode(" ")[0]
         self.max_length_subword_tokens = None
         self.train_set_target = None
         self.target_dim = None
         self.train_target_indices = None
         self.ordered_bpe_entities = None
         self.separator=separator
+        self.preprocessing_cache_dir = preprocessing_cache_dir
 
         if self.path_for_deserialization is None:
-            # Read a knowledge graph into memory
-            ReadFromDisk(kg=self).start()
-            # Map a knowledge graph into integer indexed.
-            PreprocessKG(kg=self).start()
-            # Saving.
-            LoadSaveToDisk(kg=self).save()
+            cache = PreprocessingCache(kg=self, cache_dir=preprocessing_cache_dir) if (
+                    preprocessing_cache_dir and PreprocessingCache.is_cacheable(self)) else None
+            if cache is not None and cache.exists():
+                # Reuse the knowledge graph preprocessed by a former run.
+                cache.restore()
+                LoadSaveToDisk(kg=self).load(self.path_for_serialization)
+            else:
+                # Read a knowledge graph into memory
+                ReadFromDisk(kg=self).start()
+                # Map a knowledge graph into integer indexed.
+                PreprocessKG(kg=self).start()
+                # Saving.
+                LoadSaveToDisk(kg=self).save()
+                if cache is not None:
+                    cache.store()
         else:
             LoadSaveToDisk(kg=self).load()
         assert len(self.train_set) > 0, "Training set is empty"
@@ -1,27 +1,156 @@
-from typing import List, Tuple, Set, Iterable, Dict, Union
+from typing import List, Tuple, Set, Iterable, Union
 import torch
 from torch import optim
 from torch.utils.data import DataLoader
 from .abstracts import BaseInteractiveKGE
-from .dataset_classes import TriplePredictionDataset
 from .static_funcs import random_prediction, deploy_triple_prediction, deploy_tail_entity_prediction, \
-    deploy_relation_prediction, deploy_head_entity_prediction, load_pickle
-from .static_funcs_training import evaluate_lp
+    deploy_relation_prediction, deploy_head_entity_prediction
+from .static_funcs_training import evaluate_lp, load_filter_index, FilterIndex
+from .embedding_index import EmbeddingIndex
 import numpy as np
+import os
 import sys
+import functools
+import inspect
+from collections import OrderedDict
+import torch.multiprocessing as mp
 import traceback
 
 
+def write_triples_to_parquet(blocks: Iterable[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]], path: str,
+                             at_most: int = sys.maxsize) -> int:
+    """ Stream blocks of (heads, relations, tails, scores) into a Parquet file and return the number of triples """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = pa.schema([("head", pa.int64()), ("relation", pa.int64()), ("tail", pa.int64()), ("score", pa.float32())])
+    num_triples = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for h, r, t, scores in blocks:
+            n = min(len(h), at_most - num_triples)
+            writer.write_table(pa.table([h[:n], r[:n], t[:n], scores[:n]], schema=schema))
+            num_triples += n
+            if num_triples >= at_most:
+                break
+    return num_triples
+
+
+def find_missing_triples_worker(kge, heads: np.ndarray, relations: np.ndarray, confidence: float, topk: int,
+                                batch_size: int, start: int, end: int, path: str, num_threads: int) -> None:
+    """ Write missing triples of the start.th to end.th (h,r) pairs into a Parquet file """
+    torch.set_num_threads(num_threads)
+    write_triples_to_parquet(kge.iter_missing_triples(heads, relations, confidence, topk, batch_size, start, end), path)
+
+
+class ResultCache:
+    """
+    Size bounded mapping from queries to results with least recently used eviction.
+
+    Results are associated with a fingerprint of model weights. A different fingerprint clears the cache.
+    """
+
+    def __init__(self, max_size: int):
+        assert max_size > 0
+        self.max_size = max_size
+        self.results = OrderedDict()
+        self.fingerprint = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def clear(self) -> None:
+        self.results.clear()
+
+    def get_or_compute(self, key, fingerprint, compute):
+        if fingerprint != self.fingerprint:
+            if self.results:
+                self.invalidations += 1
+            self.clear()
+            self.fingerprint = fingerprint
+        if key in self.results:
+            self.hits += 1
+            self.results.move_to_end(key)
+            return self.results[key]
+        self.misses += 1
+        value = compute()
+        self.results[key] = value
+        if len(self.results) > self.max_size:
+            self.results.popitem(last=False)
+        return value
+
+    def info(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "invalidations": self.invalidations,
+                "size": len(self.results), "max_size": self.max_size}
+
+
+def freeze(x):
+    """ Hashable representation of an argument. Lists become tuples """
+    if isinstance(x, (list, tuple)):
+        return tuple(freeze(i) for i in x)
+    return x
+
+
+def cached_result(func):
+    """ Look up results of a KGE method in KGE.result_cache if the cache is enabled and arguments are hashable """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        if self.result_cache is None:
+            return func(self, *args, **kwargs)
+        arguments = signature.bind(self, *args, **kwargs)
+        arguments.apply_defaults()
+        key = (func.__name__,) + tuple(freeze(v) for k, v in arguments.arguments.items() if k != "self")
+        try:
+            hash(key)
+        except TypeError:
+            # e.g. tensors as arguments
+            return func(self, *args, **kwargs)
+        result = self.result_cache.get_or_compute(key, self.weights_fingerprint(), lambda: func(self, *args, **kwargs))
+        # Callers may modify returned results in place.
+        return result.clone() if isinstance(result, torch.Tensor) else list(result)
+
+    return wrapper
+
+
 class KGE(BaseInteractiveKGE):
     """ Knowledge Graph Embedding Class for interactive usage of pre-trained models"""
 
     def __init__(self, path=None, url=None, construct_ensemble=False,
-                 model_name=None):
+                 model_name=None, cache_size: int = 0):
         super().__init__(path=path, url=url, construct_ensemble=construct_ensemble, model_name=model_name)
+        # Results of predict, predict_topk and triple_score, if cache_size > 0.
+        self.result_cache = ResultCache(cache_size) if cache_size > 0 else None
+        # (head entity, relation) => tail entities of training triples, constructed on demand.
+        self.train_filter_index = None
+        # Nearest neighbour index over entity embeddings, constructed or loaded on demand.
+        self.embedding_index = None
 
     def __str__(self):
         return "KGE | " + str(self.model)
 
+    def enable_cache(self, cache_size: int = 10_000) -> None:
+        """ Cache results of up to cache_size queries of predict, predict_topk and triple_score """
+        self.result_cache = ResultCache(cache_size)
+
+    def disable_cache(self) -> None:
+        self.result_cache = None
+
+    def clear_cache(self) -> None:
+        if self.result_cache is not None:
+            self.result_cache.clear()
+
+    def cache_info(self) -> dict:
+        """ Number of hits, misses and invalidations of the result cache """
+        return self.result_cache.info() if self.result_cache is not None else {}
+
+    def weights_fingerprint(self) -> Tuple:
+        """
+        Storages and in-place modification counters of parameters.
+        Optimizer steps and replacing parameters, e.g., in add_new_entity_embeddings, change the fingerprint.
+        """
+        return (self.num_entities, self.num_relations) + tuple(
+            (p.data_ptr(), p._version) for p in self.model.parameters())
+
     def to(self, device: str) -> None:
         assert "cpu" in device or "cuda" in device, "Device must be either cpu or cuda"
         self.model.to(device)
@@ -47,6 +176,42 @@ class KGE(BaseInteractiveKGE):
         else:
             raise RuntimeError("Something went wrong with the types")
 
+    def create_embedding_index(self, metric: str = "cosine", dtype: str = "float32", num_lists: int = 0,
+                               path: str = None) -> EmbeddingIndex:
+        """
+        Construct an in-process nearest neighbour index over entity embeddings and save it next to the model.
+
+        Parameter
+        ---------
+        metric: cosine or dot
+        dtype: float32 or float16 storage of embeddings
+        num_lists: number of k-means partitions for the approximate search. 0 implies the exact search only
+        path: folder of the index. None implies {path of the model}/embedding_index
+
+        Returns
+        -------
+        EmbeddingIndex
+        """
+        embeddings = self.model.entity_embeddings.weight.detach().cpu().float().numpy()
+        self.embedding_index = EmbeddingIndex.build(embeddings, metric=metric, dtype=dtype, num_lists=num_lists)
+        self.embedding_index.save(path if path else self.path + "/embedding_index")
+        return self.embedding_index
+
+    def search_similar_entities(self, entities: Union[str, List[str]], topk: int = 10,
+                                num_probes: int = None) -> List[List[Tuple[str, float]]]:
+        """ Most similar entities of given entities via the embedding index (entities themselves are excluded) """
+        if self.embedding_index is None:
+            if EmbeddingIndex.exists(self.path + "/embedding_index"):
+                self.embedding_index = EmbeddingIndex.load(self.path + "/embedding_index")
+            else:
+                self.create_embedding_index()
+        entities = [entities] if isinstance(entities, str) else entities
+        idx = self.index_items(entities, self.entity_to_idx)
+        indices, scores = self.embedding_index.search(self.embedding_index.embeddings[idx], topk=topk + 1,
+                                                      num_probes=num_probes)
+        return [[(self.idx_to_entity[j], s) for j, s in zip(row_idx, row_scores) if j != i and j >= 0][:topk]
+                for i, row_idx, row_scores in zip(idx.tolist(), indices.tolist(), scores.tolist())]
+
     def create_vector_database(self, collection_name: str, distance: str,
                                location: str = "localhost",
                                port: int = 6333):
@@ -129,8 +294,8 @@ class KGE(BaseInteractiveKGE):
             [(self.entity_to_idx[s], self.relation_to_idx[p], self.entity_to_idx[o]) for s, p, o in dataset])
         if filtered:
             return evaluate_lp(model=self.model, triple_idx=idx_dataset, num_entities=len(self.entity_to_idx),
-                               er_vocab=load_pickle(self.path + '/er_vocab.p'),
-                               re_vocab=load_pickle(self.path + '/re_vocab.p'))
+                               er_vocab=load_filter_index(self.path, 'er_vocab'),
+                               re_vocab=load_filter_index(self.path, 're_vocab'))
         else:
             return evaluate_lp(model=self.model, triple_idx=idx_dataset, num_entities=len(self.entity_to_idx),
                                er_vocab=None, re_vocab=None)
@@ -288,6 +453,7 @@ class KGE(BaseInteractiveKGE):
         x = x.to(self.model.device)
         return self.model(x)
 
+    @cached_result
     def predict(self, *, h: Union[List[str], str] = None, r: Union[List[str], str] = None,
                 t: Union[List[str], str] = None, within=None, logits=True) -> torch.FloatTensor:
         """
@@ -341,6 +507,7 @@ class KGE(BaseInteractiveKGE):
         else:
             return torch.sigmoid(scores)
 
+    @cached_result
     def predict_topk(self, *, h: Union[str, List[str]] = None,
                      r: Union[str, List[str]] = None,
                      t: Union[str, List[str]] = None,
@@ -414,6 +581,86 @@ class KGE(BaseInteractiveKGE):
         else:
             raise AttributeError('Use triple_score method')
 
+    def get_train_filter_index(self) -> FilterIndex:
+        """ Construct (head entity, relation) => tail entities of training triples from train_set.npy once """
+        if self.train_filter_index is None:
+            self.train_filter_index = FilterIndex.from_triples(np.load(self.path + "/train_set.npy", mmap_mode="r"))
+        return self.train_filter_index
+
+    @staticmethod
+    def index_items(items: Union[List[str], np.ndarray, torch.Tensor], item_mapping) -> np.ndarray:
+        """ Map strings to their indices. Integer indices are returned as they are """
+        if isinstance(items, torch.Tensor):
+            return items.cpu().numpy().astype(np.int64)
+        elif isinstance(items, np.ndarray) and np.issubdtype(items.dtype, np.integer):
+            return items.astype(np.int64)
+        return np.fromiter((item_mapping[i] for i in items), dtype=np.int64, count=len(items))
+
+    def score_all_tails(self, x: torch.LongTensor) -> torch.FloatTensor:
+        """ Scores of all entities as tails of a batch of (head entity, relation) pairs of shape (batch_size, |E|) """
+        try:
+            return self.model.forward_k_vs_all(x)
+        except ValueError:
+            # Models without forward_k_vs_all score |E| triples per pair.
+            all_entities = torch.arange(self.num_entities, device=x.device)
+            return torch.stack([self.model.forward_triples(
+                torch.stack((hr[0].repeat(self.num_entities), hr[1].repeat(self.num_entities), all_entities), dim=1))
+                for hr in x])
+
+    @torch.no_grad()
+    def predict_topk_batch(self, *, h: Union[List[str], np.ndarray, torch.Tensor],
+                           r: Union[List[str], np.ndarray, torch.Tensor], topk: int = 10, batch_size: int = 1024,
+                           exclude_train: bool = False, logits: bool = False,
+                           decode: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Predict top k tail entities for many (head entity, relation) queries.
+
+        Queries are scored in chunks of batch_size via forward_k_vs_all, and torch.topk is applied per chunk.
+
+        Parameter
+        ---------
+        h: strings or integer indices of head entities
+        r: strings or integer indices of relations
+        topk: number of tail entities per query
+        batch_size: number of queries scored at once, i.e., batch_size x |E| scores are kept in memory
+        exclude_train: tail entities of training triples (h,r,t) are not predicted
+        logits: return logits instead of sigmoid scores
+        decode: return strings of the predicted tail entities instead of their indices
+
+        Returns: Tuple
+        ---------
+        indices (or strings) of shape (num_queries, topk) and scores of shape (num_queries, topk) as numpy arrays
+        """
+        assert not self.configs.get("byte_pair_encoding", None), "predict_topk_batch is not available for BPE models"
+        assert batch_size > 0 and topk > 0
+        # (1) Index queries.
+        h = self.index_items(h, self.entity_to_idx)
+        r = self.index_items(r, self.relation_to_idx)
+        assert len(h) == len(r), "h and r must have the same number of items"
+        topk = min(topk, self.num_entities)
+        filter_index = self.get_train_filter_index() if exclude_train else None
+        indices = np.empty((len(h), topk), dtype=np.int64)
+        scores = np.empty((len(h), topk), dtype=np.float32)
+        for start in range(0, len(h), batch_size):
+            end = start + batch_size
+            # (2) Score all tail entities for a chunk of queries.
+            x = torch.from_numpy(np.stack((h[start:end], r[start:end]), axis=1)).to(self.model.device)
+            batch_scores = self.score_all_tails(x)
+            # (3) Exclude known tail entities.
+            if filter_index is not None:
+                row, col = filter_index.lookup(h[start:end], r[start:end])
+                batch_scores[torch.from_numpy(row), torch.from_numpy(col)] = -torch.inf
+            # (4) Top k per query.
+            top_scores, top_indices = torch.topk(batch_scores, topk, dim=1)
+            if not logits:
+                top_scores = torch.sigmoid(top_scores)
+            indices[start:end] = top_indices.cpu().numpy()
+            scores[start:end] = top_scores.float().cpu().numpy()
+        if decode:
+            indices = np.array([[self.idx_to_entity[i] for i in row] for row in indices.tolist()], dtype=object)
+        return indices, scores
+
+    @cached_result
     def triple_score(self, h: Union[List[str], str] = None, r: Union[List[str], str] = None,
                      t: Union[List[str], str] = None, logits=False) -> torch.FloatTensor:
         """
@@ -733,9 +980,8 @@ class KGE(BaseInteractiveKGE):
             # sort atom1_scores in descending order and get the top k entities indices
             top_k_scores1, top_k_indices = torch.topk(atom1_scores, k)
 
-            # using model.entity_to_idx.keys() take the name of entities from topk heads 2
-            entity_to_idx_keys = list(self.entity_to_idx.keys())
-            top_k_heads = [entity_to_idx_keys[idx.item()] for idx in top_k_indices]
+            # using model.idx_to_entity take the name of entities from topk heads 2
+            top_k_heads = [self.idx_to_entity[idx.item()] for idx in top_k_indices]
 
             # Get scores for the second atom
             # Initialize an empty tensor
@@ -775,9 +1021,8 @@ class KGE(BaseInteractiveKGE):
             # sort atom1_scores in descending order and get the top k entities indices
             top_k_scores1, top_k_indices = torch.topk(atom1_scores, k)
 
-            # using model.entity_to_idx.keys() take the name of entities from topk heads 2
-            entity_to_idx_keys = list(self.entity_to_idx.keys())
-            top_k_heads = [entity_to_idx_keys[idx.item()] for idx in top_k_indices]
+            # using model.idx_to_entity take the name of entities from topk heads 2
+            top_k_heads = [self.idx_to_entity[idx.item()] for idx in top_k_indices]
 
             # Initialize an empty tensor
             atom2_scores = torch.empty(0, len(self.entity_to_idx)).to(atom1_scores.device)
@@ -825,9 +1070,8 @@ class KGE(BaseInteractiveKGE):
             # sort atom1_scores in descending order and get the top k entities indices
             top_k_scores1, top_k_indices = torch.topk(scores_2in_query, k)
 
-            # using model.entity_to_idx.keys() take the name of entities from topk heads 2
-            entity_to_idx_keys = list(self.entity_to_idx.keys())
-            top_k_heads = [entity_to_idx_keys[idx.item()] for idx in top_k_indices]
+            # using model.idx_to_entity take the name of entities from topk heads 2
+            top_k_heads = [self.idx_to_entity[idx.item()] for idx in top_k_indices]
 
             # Get scores for the second atom
             # Initialize an empty tensor
@@ -903,9 +1147,8 @@ class KGE(BaseInteractiveKGE):
             # sort atom1_scores in descending order and get the top k entities indices
             top_k_scores1, top_k_indices = torch.topk(atom1_scores, k)
 
-            # using model.entity_to_idx.keys() take the name of entities from topk heads 2
-            entity_to_idx_keys = list(self.entity_to_idx.keys())
-            top_k_heads = [entity_to_idx_keys[idx.item()] for idx in top_k_indices]
+            # using model.idx_to_entity take the name of entities from topk heads 2
+            top_k_heads = [self.idx_to_entity[idx.item()] for idx in top_k_indices]
 
             # Initialize an empty tensor
             atom2_scores = torch.empty(0, len(self.entity_to_idx)).to(atom1_scores.device)
@@ -950,9 +1193,8 @@ class KGE(BaseInteractiveKGE):
             # sort atom1_scores in descending order and get the top k entities indices
             top_k_scores1, top_k_indices = torch.topk(scores_2i_query, k)
 
-            # using model.entity_to_idx.keys() take the name of entities from topk heads
-            entity_to_idx_keys = list(self.entity_to_idx.keys())
-            top_k_heads = [entity_to_idx_keys[idx.item()] for idx in top_k_indices]
+            # using model.idx_to_entity take the name of entities from topk heads
+            top_k_heads = [self.idx_to_entity[idx.item()] for idx in top_k_indices]
 
             # Get scores for the second atom
             # Initialize an empty tensor
@@ -1018,8 +1260,7 @@ class KGE(BaseInteractiveKGE):
             top_k_scores1, top_k_indices = torch.topk(scores_2u_query, k)
 
             # Using model.entity_to_idx.keys() take the name of entities from topk heads
-            entity_to_idx_keys = list(self.entity_to_idx.keys())
-            top_k_heads = [entity_to_idx_keys[idx.item()] for idx in top_k_indices]
+            top_k_heads = [self.idx_to_entity[idx.item()] for idx in top_k_indices]
 
             # Initialize an empty tensor
             atom3_scores = torch.empty(0, len(self.entity_to_idx)).to(scores_2u_query.device)
@@ -1041,9 +1282,56 @@ class KGE(BaseInteractiveKGE):
         else:
             raise RuntimeError(f"Incorrect query_structure {query_structure}")
 
+    @torch.no_grad()
+    def iter_missing_triples(self, heads: np.ndarray, relations: np.ndarray, confidence: float, topk: int = 10,
+                             batch_size: int = 1024, start: int = 0,
+                             end: int = None) -> Iterable[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Iterate over blocks of missing triples (h,r,t) with sigmoid(f(h,r,t)) >= confidence and (h,r,t) not in G.
+
+        The Cartesian product of heads and relations is enumerated in blocks of batch_size pairs without being
+        materialized. A block is scored via forward_k_vs_all, training triples are masked via a sorted FilterIndex,
+        and top k tail entities per pair are thresholded.
+
+        Parameter
+        ---------
+        heads: integer indices of head entities
+        relations: integer indices of relations
+        confidence: threshold for sigmoid scores
+        topk: at most topk tail entities per (h,r) pair
+        batch_size: number of (h,r) pairs scored at once
+        start: first pair of the Cartesian product
+        end: last pair (exclusive) of the Cartesian product
+
+        Returns: Iterable
+        ---------
+        Tuples of numpy arrays of heads, relations, tails and scores
+        """
+        filter_index = self.get_train_filter_index()
+        topk = min(topk, self.num_entities)
+        end = len(heads) * len(relations) if end is None else end
+        for block_start in range(start, end, batch_size):
+            # (1) (h,r) pairs of the block.
+            pairs = np.arange(block_start, min(block_start + batch_size, end))
+            h, r = heads[pairs // len(relations)], relations[pairs % len(relations)]
+            # (2) Score all tail entities and mask training triples.
+            scores = self.score_all_tails(torch.from_numpy(np.stack((h, r), axis=1)).to(self.model.device))
+            row, col = filter_index.lookup(h, r)
+            scores[torch.from_numpy(row), torch.from_numpy(col)] = -torch.inf
+            # (3) Threshold top k tail entities.
+            top_scores, top_indices = torch.topk(scores, topk, dim=1)
+            top_scores = torch.sigmoid(top_scores)
+            selected_row, selected_col = torch.nonzero(top_scores >= confidence, as_tuple=True)
+            if len(selected_row) == 0:
+                continue
+            selected_row = selected_row.cpu().numpy()
+            yield (h[selected_row], r[selected_row], top_indices[selected_row, selected_col].cpu().numpy(),
+                   top_scores[selected_row, selected_col].float().cpu().numpy())
+
     def find_missing_triples(self, confidence: float, entities: List[str] = None, relations: List[str] = None,
                              topk: int = 10,
-                             at_most: int = sys.maxsize) -> Set:
+                             at_most: int = sys.maxsize, batch_size: int = 1024, path: str = None,
+                             num_workers: int = 0) -> Union[Set, str]:
         """
          Find missing triples
 
@@ -1064,74 +1352,69 @@ class KGE(BaseInteractiveKGE):
 
         Stop after finding at_most missing triples
 
-        Returns: Set
-        ---------
-
-        {(e,r,x) | f(e,r,x) > confidence \land (e,r,x) \not\in G
-        """
-
-        assert 1.0 >= confidence >= 0.0
-        assert topk >= 1
-
-        def select(items: List[str], item_mapping: Dict[str, int]) -> Iterable[Tuple[str, int]]:
-            """
-             Get selected entities and their indexes
+        batch_size: int
 
-            Parameter
-            ---------
-            items: list
+        Number of (e,r) pairs scored at once
 
-            item_mapping: dict
+        path: str
 
+        If given, missing triples are streamed into a Parquet file with head, relation, tail and score columns
+        of integer indices, instead of being returned as a set of strings.
 
-            Returns: Iterable
-            ---------
+        num_workers: int
 
-            """
+        If > 1, the Cartesian product is partitioned over num_workers processes, each writing {path}/part-{rank}.parquet
 
-            if items is None:
-                return item_mapping.items()
-            else:
-                return ((i, item_mapping[i]) for i in items)
+        Returns: Set or str
+        ---------
 
-        extended_triples = set()
-        print(f'Number of entities:{len(self.entity_to_idx)} \t Number of relations:{len(self.relation_to_idx)}')
+        {(e,r,x) | f(e,r,x) > confidence \land (e,r,x) \not\in G or path
+        """
 
-        # (5) Cartesian Product over entities and relations
-        # (5.1) Iterate over entities
+        assert 1.0 >= confidence >= 0.0
+        assert topk >= 1
+        assert not self.configs.get("byte_pair_encoding", None), "find_missing_triples is not available for BPE models"
+        heads = self.index_items(entities, self.entity_to_idx) if entities is not None else np.arange(
+            self.num_entities, dtype=np.int64)
+        relations = self.index_items(relations, self.relation_to_idx) if relations is not None else np.arange(
+            self.num_relations, dtype=np.int64)
+        print(f'Number of entities:{len(heads)} \t Number of relations:{len(relations)}')
         print('Finding missing triples..')
-        for str_head_entity, idx_entity in select(entities, self.entity_to_idx):
-            # (5.1) Iterate over relations
-            for str_relation, idx_relation in select(relations, self.relation_to_idx):
-                # (5.2) \forall e \in Entities store a tuple of scoring_func(head,relation,e) and e
-                # (5.3.) Sort (5.2) and return top  tuples
-                predictions = self.predict_topk(h=[str_head_entity], r=[str_relation], topk=topk)
-                # (5.4) Iterate over 5.3
-                for str_entity, predicted_score in predictions:
-                    # (5.5) If score is less than 99% ignore it
-                    if predicted_score < confidence:
-                        break
-                    else:
-                        # (5.8) Remember it
-                        extended_triples.add((str_head_entity, str_relation, str_entity))
-                        print(f'Number of found missing triples: {len(extended_triples)}')
-                        if len(extended_triples) == at_most:
-                            return extended_triples
-                        # No need to store a large KG into memory
-                        # /5.6) False if 0, otherwise 1
-                        is_in = np.any(
-                            np.all(self.train_set == [idx_entity, idx_relation, self.entity_to_idx[str_entity]],
-                                   axis=1))
-                        # (5.7) If (5.6) is true, ignore it
-                        if is_in:
-                            continue
-                        else:
-                            # (5.8) Remember it
-                            extended_triples.add((str_head_entity, str_relation, str_entity))
-                            print(f'Number of found missing triples: {len(extended_triples)}')
-                            if len(extended_triples) == at_most:
-                                return extended_triples
-        return extended_triples
+        # (1) Sorted keys of training triples are constructed before workers are forked.
+        self.get_train_filter_index()
+        if path is None:
+            # (2) Return missing triples as strings.
+            extended_triples = set()
+            for h, r, t, _ in self.iter_missing_triples(heads, relations, confidence, topk, batch_size):
+                for i, j, k in zip(h.tolist(), r.tolist(), t.tolist()):
+                    extended_triples.add((self.idx_to_entity[i], self.idx_to_relations[j], self.idx_to_entity[k]))
+                    if len(extended_triples) == at_most:
+                        return extended_triples
+            print(f'Number of found missing triples: {len(extended_triples)}')
+            return extended_triples
+        elif num_workers <= 1:
+            # (3) Stream missing triples into a Parquet file.
+            num_triples = write_triples_to_parquet(
+                self.iter_missing_triples(heads, relations, confidence, topk, batch_size), path, at_most)
+            print(f'Number of found missing triples: {num_triples}')
+            return path
+        else:
+            # (4) Partition the Cartesian product over processes.
+            assert at_most == sys.maxsize, "at_most is not supported with num_workers > 1"
+            os.makedirs(path, exist_ok=True)
+            ctx = mp.get_context("fork")
+            bounds = np.linspace(0, len(heads) * len(relations), num_workers + 1).astype(np.int64)
+            num_threads = max(1, torch.get_num_threads() // num_workers)
+            workers = [ctx.Process(target=find_missing_triples_worker,
+                                   args=(self, heads, relations, confidence, topk, batch_size, int(bounds[rank]),
+                                         int(bounds[rank + 1]), f"{path}/part-{rank}.parquet", num_threads))
+                       for rank in range(num_workers)]
+            for p in workers:
+                p.start()
+            for p in workers:
+                p.join()
+                assert p.exitcode == 0, f"A worker exited with {p.exitcode}"
+            return path
 
     def deploy(self, share: bool = False, top_k: int = 10):
         # Lazy import
@@ -1255,6 +1538,7 @@ class KGE(BaseInteractiveKGE):
 
     def train(self, kg, lr=.1, epoch=10, batch_size=32, neg_sample_ratio=10, num_workers=1) -> None:
         """ Retrained a pretrain model on an input KG via negative sampling."""
+        from .dataset_classes import TriplePredictionDataset
         # (1) Create Negative Sampling Setting for training
         print('Creating Dataset...')
         train_set = TriplePredictionDataset(kg.train_set,
@@ -5,6 +5,7 @@ import torch
 from torch import nn
 from torch.nn import functional as F
 from .adopt import ADOPT
+from .sparse_optim import RowWiseAdagrad, MultipleOptimizers
 
 class BaseKGELightning(pl.LightningModule):
     def __init__(self, *args, **kwargs):
@@ -57,8 +58,32 @@ class BaseKGELightning(pl.LightningModule):
         -------
 
         """
+        if y_batch.is_sparse:
+            return self.sparse_bce_with_logits(yhat_batch, y_batch)
         return self.loss(yhat_batch, y_batch)
 
+    def sparse_bce_with_logits(self, yhat_batch: torch.FloatTensor, y_batch: torch.Tensor):
+        """
+        Binary cross entropy with logits for sparse multi-label vectors without constructing dense labels.
+
+        BCE(x,y) = softplus(x) - x * y. Hence, the mean loss only requires the scores of labelled items.
+        If label smoothing is used, y = y_sparse + 1/|E| as in KvsAll.
+
+        Parameters
+        ----------
+        yhat_batch: torch.FloatTensor of shape (batch size, |E|)
+        y_batch: coalesced sparse COO tensor of shape (batch size, |E|)
+
+        Returns
+        -------
+        mean loss
+        """
+        rows, cols = y_batch.indices()
+        loss = F.softplus(yhat_batch).sum() - (yhat_batch[rows, cols] * y_batch.values()).sum()
+        if self.args.get("label_smoothing_rate"):
+            loss = loss - yhat_batch.sum() / yhat_batch.size(1)
+        return loss / yhat_batch.numel()
+
     def on_train_epoch_end(self, *args, **kwargs):
         if len(args) >= 1:
             raise RuntimeError(f"Arguments must not be empty:{args}")
@@ -84,6 +109,8 @@ class BaseKGELightning(pl.LightningModule):
         pass
 
     def configure_optimizers(self, parameters=None):
+        if parameters is None and getattr(self, "sparse_embeddings", False):
+            return self.configure_sparse_optimizers()
         if parameters is None:
             parameters = self.parameters()
 
@@ -117,6 +144,27 @@ class BaseKGELightning(pl.LightningModule):
         print(self.selected_optimizer)
         return self.selected_optimizer
 
+    def configure_sparse_optimizers(self):
+        """
+        Update sparse embeddings with SparseAdam, or with RowWiseAdagrad if Adagrad is selected.
+        Optimizers of both keep states of rows of an embedding matrix being untouched in a mini-batch as they are.
+        Remaining parameters (e.g. normalization layers) are updated with the selected dense optimizer.
+        """
+        sparse_parameters = [m.weight for m in self.modules() if isinstance(m, nn.Embedding) and m.sparse]
+        sparse_ids = {id(p) for p in sparse_parameters}
+        dense_parameters = [p for p in self.parameters() if id(p) not in sparse_ids]
+        assert len(sparse_parameters) > 0, "No sparse embeddings found"
+        if self.optimizer_name == 'Adagrad':
+            sparse_optimizer = RowWiseAdagrad(sparse_parameters, lr=self.learning_rate)
+        else:
+            sparse_optimizer = torch.optim.SparseAdam(sparse_parameters, lr=self.learning_rate)
+        optimizers = [sparse_optimizer]
+        if len(dense_parameters) > 0:
+            optimizers.append(self.configure_optimizers(parameters=dense_parameters))
+        self.selected_optimizer = MultipleOptimizers(optimizers)
+        print(self.selected_optimizer)
+        return self.selected_optimizer
+
 
 class BaseKGE(BaseKGELightning):
     def __init__(self, args: dict):
@@ -154,6 +202,8 @@ class BaseKGE(BaseKGELightning):
         self.byte_pair_encoding = self.args.get("byte_pair_encoding", False)
         self.max_length_subword_tokens = self.args.get("max_length_subword_tokens", None)
         self.block_size=self.args.get("block_size", None)
+        # Sparse gradients of embeddings are updated via configure_sparse_optimizers
+        self.sparse_embeddings = self.args.get("sparse_embeddings", False)
         if self.byte_pair_encoding and self.args['model'] != "BytE":
             self.token_embeddings = torch.nn.Embedding(self.num_tokens, self.embedding_dim)
             self.param_init(self.token_embeddings.weight.data)
@@ -171,8 +221,10 @@ class BaseKGE(BaseKGELightning):
             """ Transformer implements token embeddings"""
         else:
 
-            self.entity_embeddings = torch.nn.Embedding(self.num_entities, self.embedding_dim)
-            self.relation_embeddings = torch.nn.Embedding(self.num_relations, self.embedding_dim)
+            self.entity_embeddings = torch.nn.Embedding(self.num_entities, self.embedding_dim,
+                                                        sparse=self.sparse_embeddings)
+            self.relation_embeddings = torch.nn.Embedding(self.num_relations, self.embedding_dim,
+                                                          sparse=self.sparse_embeddings)
             self.param_init(self.entity_embeddings.weight.data), self.param_init(self.relation_embeddings.weight.data)
 
     def forward_byte_pair_encoded_k_vs_all(self, x: torch.LongTensor):
@@ -0,0 +1,71 @@
+from typing import List
+import torch
+from torch.optim import Optimizer
+
+
+class RowWiseAdagrad(Optimizer):
+    """
+    Adagrad keeping a single accumulator per embedding row instead of per parameter.
+
+    Only rows occurring in a sparse gradient are updated, i.e.,
+    s_i <- s_i + mean(g_i^2) and w_i <- w_i - lr * g_i / (sqrt(s_i) + eps) for every touched row i.
+    """
+
+    def __init__(self, params, lr: float = 1e-2, eps: float = 1e-10):
+        assert lr > 0.0, f"Invalid learning rate: {lr}"
+        super().__init__(params, dict(lr=lr, eps=eps))
+
+    @torch.no_grad()
+    def step(self, closure=None):
+        loss = None
+        if closure is not None:
+            with torch.enable_grad():
+                loss = closure()
+        for group in self.param_groups:
+            for p in group["params"]:
+                if p.grad is None:
+                    continue
+                state = self.state[p]
+                if len(state) == 0:
+                    state["sum"] = torch.zeros(p.shape[0], dtype=p.dtype, device=p.device)
+                grad = p.grad
+                if grad.is_sparse:
+                    grad = grad.coalesce()
+                    rows, values = grad.indices()[0], grad.values()
+                else:
+                    rows, values = torch.arange(p.shape[0], device=p.device), grad
+                state["sum"].index_add_(0, rows, values.pow(2).mean(dim=1))
+                std = state["sum"][rows].sqrt_().add_(group["eps"])
+                p.index_add_(0, rows, values / std.unsqueeze(1), alpha=-group["lr"])
+        return loss
+
+
+class MultipleOptimizers:
+    """ Step and zero the gradients of several optimizers as if they were a single optimizer """
+
+    def __init__(self, optimizers: List[Optimizer]):
+        self.optimizers = optimizers
+
+    def __repr__(self):
+        return "MultipleOptimizers(\n" + "\n".join(repr(i) for i in self.optimizers) + "\n)"
+
+    @property
+    def param_groups(self):
+        return [group for optimizer in self.optimizers for group in optimizer.param_groups]
+
+    def step(self, closure=None):
+        loss = closure() if closure is not None else None
+        for optimizer in self.optimizers:
+            optimizer.step()
+        return loss
+
+    def zero_grad(self, set_to_none: bool = True):
+        for optimizer in self.optimizers:
+            optimizer.zero_grad(set_to_none=set_to_none)
+
+    def state_dict(self):
+        return {"optimizers": [optimizer.state_dict() for optimizer in self.optimizers]}
+
+    def load_state_dict(self, state_dict):
+        for optimizer, state in zip(self.optimizers, state_dict["optimizers"]):
+            optimizer.load_state_dict(state)
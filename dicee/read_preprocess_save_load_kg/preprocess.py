@@ -1,10 +1,14 @@
 import pandas as pd
 import polars as pl
 from .util import timeit, pandas_dataframe_indexer, dataset_sanity_checking
-from dicee.static_funcs import numpy_data_type_changer
-from .util import get_er_vocab, get_re_vocab, get_ee_vocab, apply_reciprical_or_noise, polars_dataframe_indexer
+from dicee.static_funcs import numpy_data_type_changer, get_numpy_data_type
+from .util import get_er_vocab, get_re_vocab, get_ee_vocab, apply_reciprical_or_noise, polars_dataframe_indexer, \
+    create_filter_indexes, streaming_vocabulary, index_into_memmap, add_reciprocal_triples, add_inverse_relations
 import numpy as np
 import concurrent
+import glob
+import math
+import os
 from typing import List, Tuple
 from typing import Union
 
@@ -15,6 +19,17 @@ class PreprocessKG:
     def __init__(self, kg):
         self.kg = kg
 
+    @property
+    def add_reciprocal(self) -> bool:
+        return bool(self.kg.add_reciprocal and self.kg.eval_model)
+
+    def add_reciprocal_triples(self, x: np.ndarray, num_relations: int, info: str = None) -> np.ndarray:
+        """ Add reciprocal triples (o, p + num_relations, s) into integer indexed triples if required """
+        if not self.add_reciprocal:
+            return x
+        print(f'Adding reciprocal triples to {info}, e.g. KG:= (s, p, o) union (o, p_inverse, s)')
+        return add_reciprocal_triples(x, num_relations)
+
     def start(self) -> None:
         """
         Preprocess train, valid and test datasets stored in knowledge graph instance
@@ -33,6 +48,8 @@ class PreprocessKG:
             self.preprocess_with_byte_pair_encoding()
         elif self.kg.backend == "polars":
             self.preprocess_with_polars()
+        elif self.kg.backend == "polars_streaming":
+            self.preprocess_with_polars_streaming()
         elif self.kg.backend in ["pandas", "rdflib"]:
             self.preprocess_with_pandas()
         else:
@@ -49,20 +66,24 @@ class PreprocessKG:
                     data.extend(self.kg.raw_valid_set.values.tolist())
                 if self.kg.raw_test_set is not None:
                     data.extend(self.kg.raw_test_set.values.tolist())
+                print('Submit er-vocab, re-vocab, and ee-vocab via  ProcessPoolExecutor...')
+                # We need to benchmark the benefits of using futures  ?
+                executor = concurrent.futures.ProcessPoolExecutor()
+                self.kg.er_vocab = executor.submit(get_er_vocab, data, self.kg.path_for_serialization + '/er_vocab.p')
+                self.kg.re_vocab = executor.submit(get_re_vocab, data, self.kg.path_for_serialization + '/re_vocab.p')
+                self.kg.ee_vocab = executor.submit(get_ee_vocab, data, self.kg.path_for_serialization + '/ee_vocab.p')
             else:
                 if isinstance(self.kg.valid_set, np.ndarray) and isinstance(self.kg.test_set, np.ndarray):
                     data = np.concatenate([self.kg.train_set, self.kg.valid_set, self.kg.test_set])
                 else:
                     data = self.kg.train_set
-            print('Submit er-vocab, re-vocab, and ee-vocab via  ProcessPoolExecutor...')
-            # We need to benchmark the benefits of using futures  ?
-            executor = concurrent.futures.ProcessPoolExecutor()
-            self.kg.er_vocab = executor.submit(get_er_vocab, data, self.kg.path_for_serialization + '/er_vocab.p')
-            self.kg.re_vocab = executor.submit(get_re_vocab, data, self.kg.path_for_serialization + '/re_vocab.p')
-            self.kg.ee_vocab = executor.submit(get_ee_vocab, data, self.kg.path_for_serialization + '/ee_vocab.p')
+                print('Constructing er-vocab, re-vocab, and ee-vocab filter indexes...')
+                # Sorting integer indexed triples is faster than constructing dictionaries in subprocesses.
+                self.kg.er_vocab, self.kg.re_vocab, self.kg.ee_vocab = create_filter_indexes(
+                    data, self.kg.path_for_serialization)
 
         # string containing
-        assert isinstance(self.kg.raw_train_set, pd.DataFrame) or isinstance(self.kg.raw_train_set, pl.DataFrame)
+        assert isinstance(self.kg.raw_train_set, (pd.DataFrame, pl.DataFrame, pl.LazyFrame))
 
         # print("Creating dataset...")
         if self.kg.byte_pair_encoding and self.kg.padding:
@@ -283,9 +304,9 @@ class PreprocessKG:
         """
         Preprocess train, valid and test datasets stored in knowledge graph instance with pandas
 
-        (1) Add recipriocal or noisy triples
-        (2) Construct vocabulary
-        (3) Index datasets
+        (1) Construct vocabulary
+        (2) Index datasets
+        (3) Add reciprocal triples into indexed datasets
 
         Parameter
         ---------
@@ -294,27 +315,20 @@ class PreprocessKG:
         -------
         None
         """
-        # (1)  Add recipriocal or noisy triples.
-        self.kg.raw_train_set = apply_reciprical_or_noise(add_reciprical=self.kg.add_reciprocal,
-                                                          eval_model=self.kg.eval_model,
-                                                          df=self.kg.raw_train_set, info="Train")
-        self.kg.raw_valid_set = apply_reciprical_or_noise(add_reciprical=self.kg.add_reciprocal,
-                                                          eval_model=self.kg.eval_model,
-                                                          df=self.kg.raw_valid_set, info="Validation")
-        self.kg.raw_test_set = apply_reciprical_or_noise(add_reciprical=self.kg.add_reciprocal,
-                                                         eval_model=self.kg.eval_model,
-                                                         df=self.kg.raw_test_set, info="Test")
-
-        # (2) Construct integer indexing for entities and relations.
+        # (1) Construct integer indexing for entities and relations.
         self.sequential_vocabulary_construction()
+        num_relations = len(self.kg.relation_to_idx)
+        if self.add_reciprocal:
+            # Relation p_inverse is indexed by p + num_relations.
+            self.kg.relation_to_idx = add_inverse_relations(self.kg.relation_to_idx)
         self.kg.num_entities, self.kg.num_relations = len(self.kg.entity_to_idx), len(self.kg.relation_to_idx)
 
-        # (3) Index datasets
+        # (2) Index datasets
         self.kg.train_set = pandas_dataframe_indexer(self.kg.raw_train_set,
                                                       self.kg.entity_to_idx,
                                                       self.kg.relation_to_idx)
         assert isinstance(self.kg.train_set, pd.core.frame.DataFrame)
-        self.kg.train_set = self.kg.train_set.values
+        self.kg.train_set = self.add_reciprocal_triples(self.kg.train_set.values, num_relations, info="Train")
         self.kg.train_set = numpy_data_type_changer(self.kg.train_set,
                                                     num=max(self.kg.num_entities, self.kg.num_relations))
 
@@ -322,7 +336,8 @@ class PreprocessKG:
         if self.kg.raw_valid_set is not None:
             self.kg.valid_set = pandas_dataframe_indexer(self.kg.raw_valid_set, self.kg.entity_to_idx,
                                                           self.kg.relation_to_idx)
-            self.kg.valid_set = self.kg.valid_set.values
+            self.kg.valid_set = self.add_reciprocal_triples(self.kg.valid_set.values, num_relations,
+                                                            info="Validation")
             dataset_sanity_checking(self.kg.valid_set, self.kg.num_entities, self.kg.num_relations)
             self.kg.valid_set = numpy_data_type_changer(self.kg.valid_set,
                                                         num=max(self.kg.num_entities, self.kg.num_relations))
@@ -331,7 +346,7 @@ class PreprocessKG:
             self.kg.test_set = pandas_dataframe_indexer(self.kg.raw_test_set, self.kg.entity_to_idx,
                                                          self.kg.relation_to_idx)
             # To numpy
-            self.kg.test_set = self.kg.test_set.values
+            self.kg.test_set = self.add_reciprocal_triples(self.kg.test_set.values, num_relations, info="Test")
             dataset_sanity_checking(self.kg.test_set, self.kg.num_entities, self.kg.num_relations)
             self.kg.test_set = numpy_data_type_changer(self.kg.test_set,
                                                        num=max(self.kg.num_entities, self.kg.num_relations))
@@ -346,35 +361,7 @@ class PreprocessKG:
         """
         print(f'*** Preprocessing Train Data:{self.kg.raw_train_set.shape} with Polars ***')
 
-        # (1) Add reciprocal triples, e.g. KG:= {(s,p,o)} union {(o,p_inverse,s)}
-        if self.kg.add_reciprocal and self.kg.eval_model:
-            def adding_reciprocal_triples():
-                """ Add reciprocal triples """
-                # (1.1) Add reciprocal triples into training set
-                self.kg.raw_train_set.extend(self.kg.raw_train_set.select([
-                    pl.col("object").alias('subject'),
-                    pl.col("relation")+'_inverse',
-                    pl.col("subject").alias('object')
-                ]))
-                if self.kg.raw_valid_set is not None:
-                    # (1.2) Add reciprocal triples into valid_set set.
-                    self.kg.raw_valid_set.extend(self.kg.raw_valid_set.select([
-                        pl.col("object").alias('subject'),
-                        pl.col("relation")+'_inverse',
-                        pl.col("subject").alias('object')
-                    ]))
-                if self.kg.raw_test_set is not None:
-                    # (1.2) Add reciprocal triples into test set.
-                    self.kg.raw_test_set.extend(self.kg.raw_test_set.select([
-                        pl.col("object").alias('subject'),
-                        pl.col("relation")+'_inverse',
-                        pl.col("subject").alias('object')
-                    ]))
-
-            print('Adding Reciprocal Triples...')
-            adding_reciprocal_triples()
-
-        # (2) Type checking
+        # (1) Type checking
         try:
             assert isinstance(self.kg.raw_train_set, pl.DataFrame)
         except TypeError:
@@ -404,17 +391,27 @@ class PreprocessKG:
         print('Relation Indexing...')
         self.kg.relation_to_idx = df_str_kg.select(pl.col("relation").unique(maintain_order=True)).with_row_index(
             "index").select(["index", "relation"])
+        num_relations = len(self.kg.relation_to_idx)
+        if self.add_reciprocal:
+            # Reciprocal triples, e.g. KG:= {(s,p,o)} union {(o,p_inverse,s)}, are added after indexing.
+            self.kg.relation_to_idx = add_inverse_relations(self.kg.relation_to_idx)
         del df_str_kg
         print(f'Indexing Training Data {self.kg.raw_train_set.shape}...')
-        self.kg.train_set=polars_dataframe_indexer(self.kg.raw_train_set, self.kg.entity_to_idx, self.kg.relation_to_idx).to_numpy()
+        self.kg.train_set = self.add_reciprocal_triples(polars_dataframe_indexer(
+            self.kg.raw_train_set, self.kg.entity_to_idx, self.kg.relation_to_idx).to_numpy(), num_relations,
+            info="Train")
 
         if self.kg.raw_valid_set is not None:
             print(f'Indexing Val Data {self.kg.raw_valid_set.shape}...')
-            self.kg.valid_set = polars_dataframe_indexer(self.kg.raw_valid_set, self.kg.entity_to_idx, self.kg.relation_to_idx).to_numpy()
+            self.kg.valid_set = self.add_reciprocal_triples(polars_dataframe_indexer(
+                self.kg.raw_valid_set, self.kg.entity_to_idx, self.kg.relation_to_idx).to_numpy(), num_relations,
+                info="Validation")
 
         if self.kg.raw_test_set is not None:
             print(f'Indexing Test Data {self.kg.raw_test_set.shape}...')
-            self.kg.test_set = polars_dataframe_indexer(self.kg.raw_test_set, self.kg.entity_to_idx, self.kg.relation_to_idx).to_numpy()
+            self.kg.test_set = self.add_reciprocal_triples(polars_dataframe_indexer(
+                self.kg.raw_test_set, self.kg.entity_to_idx, self.kg.relation_to_idx).to_numpy(), num_relations,
+                info="Test")
 
         self.kg.num_entities, self.kg.num_relations = len(self.kg.entity_to_idx), len(self.kg.relation_to_idx)
         """
@@ -423,6 +420,43 @@ class PreprocessKG:
         """
         print(f'*** Preprocessing Train Data:{self.kg.train_set.shape} with Polars DONE ***')
 
+    @timeit
+    def preprocess_with_polars_streaming(self) -> None:
+        """
+        Preprocess train, valid and test datasets scanned lazily by Polars without loading them into memory
+
+        (1) Construct vocabularies from hash partitions of unique entities and relations
+        (2) Index datasets into memory mapped {train,valid,test}_set.npy files with their reciprocal triples
+        """
+        assert self.kg.path_for_serialization is not None, "Indexed triples are written into a folder"
+        assert isinstance(self.kg.raw_train_set, pl.LazyFrame)
+        assert isinstance(self.kg.raw_valid_set, pl.LazyFrame) or self.kg.raw_valid_set is None
+        assert isinstance(self.kg.raw_test_set, pl.LazyFrame) or self.kg.raw_test_set is None
+        splits = {name: lf for name, lf in [("train", self.kg.raw_train_set), ("valid", self.kg.raw_valid_set),
+                                            ("test", self.kg.raw_test_set)] if lf is not None}
+        # (1) Vocabularies. Input files are read once per partition, i.e., a partition per GB of input.
+        paths = [self.kg.path_single_kg] if self.kg.path_single_kg else glob.glob(self.kg.dataset_dir + '/*')
+        num_partitions = max(1, math.ceil(sum(os.path.getsize(p) for p in paths if os.path.isfile(p)) / 2 ** 30))
+        print('Entity Indexing...')
+        self.kg.entity_to_idx = streaming_vocabulary(list(splits.values()), ["subject", "object"], "entity",
+                                                     num_partitions)
+        print('Relation Indexing...')
+        self.kg.relation_to_idx = streaming_vocabulary(list(splits.values()), ["relation"], "relation")
+        num_relations = len(self.kg.relation_to_idx)
+        if self.add_reciprocal:
+            self.kg.relation_to_idx = add_inverse_relations(self.kg.relation_to_idx)
+        self.kg.num_entities, self.kg.num_relations = len(self.kg.entity_to_idx), len(self.kg.relation_to_idx)
+        # (2) Index datasets chunk-wise into memory maps.
+        # Reciprocal triples, e.g. KG:= {(s,p,o)} union {(o,p_inverse,s)}, are written next to the indexed triples.
+        dtype = get_numpy_data_type(max(self.kg.num_entities, self.kg.num_relations))
+        for name, lf in splits.items():
+            print(f'Indexing {name} data...')
+            setattr(self.kg, f"{name}_set", index_into_memmap(lf, self.kg.entity_to_idx, self.kg.relation_to_idx,
+                                                              f"{self.kg.path_for_serialization}/{name}_set.npy", dtype,
+                                                              reciprocal_offset=num_relations if self.add_reciprocal
+                                                              else None))
+        print(f'*** Preprocessing Train Data:{self.kg.train_set.shape} with Polars Streaming DONE ***')
+
     def sequential_vocabulary_construction(self) -> None:
         """
         (1) Read input data into memory
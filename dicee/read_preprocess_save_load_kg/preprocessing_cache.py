@@ -0,0 +1,108 @@
+import glob
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from typing import List
+
+# Increase the version if the preprocessing changes the content of cached files.
+CACHE_FORMAT_VERSION = 1
+# Files written by LoadSaveToDisk.save and PreprocessKG into the experiment folder.
+CACHED_FILES = ["entity_to_idx*", "relation_to_idx*", "train_set.npy", "valid_set.npy", "test_set.npy",
+                "er_vocab*", "re_vocab*", "ee_vocab*"]
+
+
+def file_fingerprint(path: str, num_bytes: int = 2 ** 20) -> list:
+    """ Path, size, modification time and the sha256 of the first and the last num_bytes of a file """
+    stat = os.stat(path)
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as file_descriptor:
+        sha256.update(file_descriptor.read(num_bytes))
+        if stat.st_size > num_bytes:
+            file_descriptor.seek(max(stat.st_size - num_bytes, num_bytes))
+            sha256.update(file_descriptor.read())
+    return [os.path.abspath(path), stat.st_size, stat.st_mtime_ns, sha256.hexdigest()]
+
+
+def link_or_copy(source: str, target: str) -> None:
+    """ Hard link a file, or copy it if hard links are not possible, e.g., across file systems """
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+class PreprocessingCache:
+    """
+    Content-addressed cache of preprocessed knowledge graphs.
+
+    Vocabularies, indexed datasets and filter indexes of a knowledge graph are stored in {cache_dir}/{key}, where
+    key is the sha256 of the fingerprints of the input files and the arguments affecting the preprocessing.
+    Hence, runs on the same knowledge graph with different hyperparameters skip reading and indexing the input.
+    Files are hard linked between the cache and experiment folders.
+    """
+
+    def __init__(self, kg, cache_dir: str = os.path.join("~", ".cache", "dicee")):
+        self.kg = kg
+        self.cache_dir = os.path.abspath(os.path.expanduser(cache_dir))
+        self.description = self.describe()
+        self.key = hashlib.sha256(json.dumps(self.description, sort_keys=True).encode("utf-8")).hexdigest()
+        self.path = os.path.join(self.cache_dir, self.key)
+
+    @staticmethod
+    def is_cacheable(kg) -> bool:
+        # Byte pair encoded knowledge graphs, triple stores and noisy triples are not cached.
+        return (kg.path_for_serialization is not None and not kg.byte_pair_encoding and kg.sparql_endpoint is None
+                and not kg.add_noise_rate and (kg.path_single_kg is not None or kg.dataset_dir is not None))
+
+    def input_files(self) -> List[str]:
+        if self.kg.path_single_kg is not None:
+            return [self.kg.path_single_kg]
+        return sorted(i for i in glob.glob(self.kg.dataset_dir + '/*') if os.path.isfile(i))
+
+    def describe(self) -> dict:
+        from dicee import __version__
+        return {"format": CACHE_FORMAT_VERSION,
+                "dicee": __version__,
+                "inputs": [file_fingerprint(i) for i in self.input_files()],
+                "backend": self.kg.backend,
+                "separator": self.kg.separator,
+                "add_reciprocal": bool(self.kg.add_reciprocal and self.kg.eval_model),
+                "eval_model": self.kg.eval_model is not None,
+                "read_only_few": self.kg.read_only_few,
+                "sample_triples_ratio": self.kg.sample_triples_ratio}
+
+    def exists(self) -> bool:
+        return os.path.isfile(os.path.join(self.path, "cache_info.json"))
+
+    @staticmethod
+    def files(path: str) -> List[str]:
+        return sorted({os.path.basename(i) for pattern in CACHED_FILES for i in glob.glob(os.path.join(path, pattern))})
+
+    def store(self) -> None:
+        """ Store the preprocessed files of the experiment folder """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # (1) Files are linked into a temporary folder that is renamed at once.
+        path_tmp = f"{self.path}.tmp-{uuid.uuid4().hex}"
+        os.makedirs(path_tmp)
+        for name in self.files(self.kg.path_for_serialization):
+            link_or_copy(os.path.join(self.kg.path_for_serialization, name), os.path.join(path_tmp, name))
+        with open(os.path.join(path_tmp, "cache_info.json"), "w") as file_descriptor:
+            json.dump(self.description, file_descriptor, indent=4)
+        # (2) Another process may have cached the same knowledge graph in the meantime.
+        try:
+            os.rename(path_tmp, self.path)
+            print(f"Preprocessed knowledge graph is cached at {self.path}")
+        except OSError:
+            shutil.rmtree(path_tmp, ignore_errors=True)
+
+    def restore(self) -> None:
+        """ Link the cached files into the experiment folder """
+        print(f"Loading the preprocessed knowledge graph from the cache {self.path}")
+        os.makedirs(self.kg.path_for_serialization, exist_ok=True)
+        for name in self.files(self.path):
+            target = os.path.join(self.kg.path_for_serialization, name)
+            if os.path.exists(target):
+                os.remove(target)
+            link_or_copy(os.path.join(self.path, name), target)
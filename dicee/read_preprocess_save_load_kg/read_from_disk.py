@@ -1,5 +1,6 @@
 from .util import read_from_disk, read_from_triple_store
 import glob
+import os
 import pandas as pd
 import numpy as np
 
@@ -40,14 +41,16 @@ class ReadFromDisk:
             self.kg.raw_test_set = None
         elif self.kg.dataset_dir:
             for i in glob.glob(self.kg.dataset_dir + '/*'):
-                if 'train' in i:
+                # Splits are recognized by file names, since the path of a dataset may contain e.g. "test".
+                file_name = os.path.basename(i)
+                if 'train' in file_name:
                     self.kg.raw_train_set = read_from_disk(i, self.kg.read_only_few, self.kg.sample_triples_ratio,
                                                        backend=self.kg.backend, separator=self.kg.separator)
                     if self.kg.add_noise_rate:
                         self.add_noisy_triples_into_training()
-                elif 'test' in i and self.kg.eval_model is not None:
+                elif 'test' in file_name and self.kg.eval_model is not None:
                     self.kg.raw_test_set = read_from_disk(i, backend=self.kg.backend, separator=self.kg.separator)
-                elif 'valid' in i and self.kg.eval_model is not None:
+                elif 'valid' in file_name and self.kg.eval_model is not None:
                     self.kg.raw_valid_set = read_from_disk(i, backend=self.kg.backend, separator=self.kg.separator)
                 else:
                     print(f'Not processed data: {i}')
@@ -1,9 +1,10 @@
 import numpy as np
 import polars
 import pandas
-from .util import load_pickle, load_numpy_ndarray
+from .util import load_pickle
 import os
-from dicee.static_funcs import save_pickle, save_numpy_ndarray
+from dicee.static_funcs import save_pickle, save_numpy_ndarray, StringIndex, load_string_index
+from dicee.static_funcs_training import load_filter_index
 
 
 class LoadSaveToDisk:
@@ -36,34 +37,51 @@ class LoadSaveToDisk:
                 self.kg.relation_to_idx.to_csv(path_or_buf=self.kg.path_for_serialization + "/relation_to_idx.csv", header=True)
             else:
                 raise RuntimeError("Unexpected type for entity_to_idx or relation_to_idx")
+            # (2) Save memory mapped string indexes to load pretrained models without constructing dictionaries.
+            StringIndex.from_mapping(self.kg.entity_to_idx).save(self.kg.path_for_serialization, "entity_to_idx")
+            StringIndex.from_mapping(self.kg.relation_to_idx).save(self.kg.path_for_serialization, "relation_to_idx")
 
-            save_numpy_ndarray(data=self.kg.train_set, file_path=self.kg.path_for_serialization + '/train_set.npy')
-            if self.kg.valid_set is not None:
-                save_numpy_ndarray(data=self.kg.valid_set, file_path=self.kg.path_for_serialization + '/valid_set.npy')
-            if self.kg.test_set is not None:
-                save_numpy_ndarray(data=self.kg.test_set, file_path=self.kg.path_for_serialization + '/test_set.npy')
+            # (3) Save indexed datasets. Memory mapped datasets (--backend polars_streaming) are already on disk.
+            for name in ["train_set", "valid_set", "test_set"]:
+                data = getattr(self.kg, name)
+                if data is not None and not isinstance(data, np.memmap):
+                    save_numpy_ndarray(data=data, file_path=self.kg.path_for_serialization + f'/{name}.npy')
 
-    def load(self):
-        assert self.kg.path_for_deserialization is not None
-        assert self.kg.path_for_serialization == self.kg.path_for_deserialization
+    def load(self, path: str = None):
+        """ Load a knowledge graph saved via save() from path, i.e., path_for_deserialization by default """
+        path = self.kg.path_for_deserialization if path is None else path
+        assert path is not None
 
-        self.kg.entity_to_idx = load_pickle(file_path=self.kg.path_for_deserialization + '/entity_to_idx.p')
-        self.kg.relation_to_idx = load_pickle(file_path=self.kg.path_for_deserialization + '/relation_to_idx.p')
-        assert isinstance(self.kg.entity_to_idx, dict)
-        assert isinstance(self.kg.relation_to_idx, dict)
+        # (1) Load vocabularies.
+        self.kg.entity_to_idx = self.load_vocabulary(path, "entity_to_idx", "entity")
+        self.kg.relation_to_idx = self.load_vocabulary(path, "relation_to_idx", "relation")
         self.kg.num_entities = len(self.kg.entity_to_idx)
         self.kg.num_relations = len(self.kg.relation_to_idx)
 
-        self.kg.train_set = load_numpy_ndarray(file_path=self.kg.path_for_deserialization + '/train_set.npy')
-
-        if os.path.isfile(self.kg.path_for_deserialization + '/valid_set.npy'):
-            self.kg.valid_set = load_numpy_ndarray(file_path=self.kg.path_for_deserialization + '/valid_set.npy')
-        if os.path.isfile(self.kg.path_for_deserialization + '/test_set.npy'):
-            self.kg.test_set = load_numpy_ndarray(file_path=self.kg.path_for_deserialization + '/test_set.npy')
+        # (2) Load indexed datasets. Datasets of --backend polars_streaming are memory mapped again.
+        mmap_mode = "r" if self.kg.backend == "polars_streaming" else None
+        self.kg.train_set = np.load(path + '/train_set.npy', mmap_mode=mmap_mode)
+        if os.path.isfile(path + '/valid_set.npy'):
+            self.kg.valid_set = np.load(path + '/valid_set.npy', mmap_mode=mmap_mode)
+        if os.path.isfile(path + '/test_set.npy'):
+            self.kg.test_set = np.load(path + '/test_set.npy', mmap_mode=mmap_mode)
 
         if self.kg.eval_model:
-            self.kg.er_vocab = load_pickle(file_path=self.kg.path_for_deserialization + '/er_vocab.p')
-            self.kg.re_vocab = load_pickle(file_path=self.kg.path_for_deserialization + '/re_vocab.p')
-            self.kg.ee_vocab = load_pickle(file_path=self.kg.path_for_deserialization + '/ee_vocab.p')
-            self.kg.domain_constraints_per_rel, self.kg.range_constraints_per_rel = load_pickle(
-                file_path=self.kg.path_for_deserialization + '/constraints.p')
+            # Filter indexes are memory mapped.
+            self.kg.er_vocab = load_filter_index(path, 'er_vocab')
+            self.kg.re_vocab = load_filter_index(path, 're_vocab')
+            self.kg.ee_vocab = load_filter_index(path, 'ee_vocab')
+            if os.path.isfile(path + '/constraints.p'):
+                self.kg.domain_constraints_per_rel, self.kg.range_constraints_per_rel = load_pickle(
+                    file_path=path + '/constraints.p')
+
+    def load_vocabulary(self, path: str, name: str, column: str):
+        """ Load a vocabulary into the data structure constructed by the backend """
+        mapping = load_string_index(path, name)
+        if isinstance(mapping, dict):
+            # Pickled dictionaries of former versions
+            return mapping
+        strings = list(mapping)
+        if self.kg.backend in ["polars", "polars_streaming"]:
+            return polars.DataFrame({column: strings}, schema={column: polars.String}).with_row_index("index")
+        return pandas.DataFrame({column: strings})
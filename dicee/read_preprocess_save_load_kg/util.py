@@ -1,4 +1,7 @@
 from collections import defaultdict
+import concurrent.futures
+import io
+import itertools
 import numpy as np
 import polars
 import glob
@@ -7,37 +10,39 @@ import functools
 import pandas as pd
 import pickle
 import os
+import re
 import psutil
 import requests
-from typing import Tuple
+from typing import Tuple, List, Union
 
 def polars_dataframe_indexer(df_polars:polars.DataFrame, idx_entity:polars.DataFrame, idx_relation:polars.DataFrame)->polars.DataFrame:
     """
      Replaces 'subject', 'relation', and 'object' columns in the input Polars DataFrame with their corresponding index values
      from the entity and relation index DataFrames.
 
-     This function processes the DataFrame in three main steps:
-     1. Replace the 'relation' values with the corresponding index from `idx_relation`.
-     2. Replace the 'subject' values with the corresponding index from `idx_entity`.
-     3. Replace the 'object' values with the corresponding index from `idx_entity`.
+     Instead of joining every column with a vocabulary, the columns are cast to Enum data types whose categories are
+     the vocabularies ordered by their indices. The physical codes of the Enum values are the indices. Hence,
+     subject and object columns share the same dictionary and the same vocabulary yields the same indices
+     for train, valid and test splits.
 
      Parameters:
      -----------
      df_polars : polars.DataFrame
-         The input Polars DataFrame containing columns: 'subject', 'relation', and 'object'.
+         The input Polars DataFrame or LazyFrame containing columns: 'subject', 'relation', and 'object'.
 
      idx_entity : polars.DataFrame
          A Polars DataFrame that contains the mapping between entity names and their corresponding indices.
-         Must have columns: 'entity' and 'index'.
+         Must have columns: 'entity' and 'index', where indices are 0, ..., n-1.
 
      idx_relation : polars.DataFrame
          A Polars DataFrame that contains the mapping between relation names and their corresponding indices.
-         Must have columns: 'relation' and 'index'.
+         Must have columns: 'relation' and 'index', where indices are 0, ..., n-1.
 
      Returns:
      --------
      polars.DataFrame
          A DataFrame with the 'subject', 'relation', and 'object' columns replaced by their corresponding indices.
+         Values not found in the vocabularies are replaced by null.
 
      Example Usage:
      --------------
@@ -55,31 +60,25 @@ def polars_dataframe_indexer(df_polars:polars.DataFrame, idx_entity:polars.DataF
              "index": [0, 1, 2]
          })
      >>> polars_dataframe_indexer(df_polars, idx_entity, idx_relation)
-
-     Steps:
-     ------
-     1. Join the input DataFrame `df_polars` on the 'relation' column with `idx_relation` to replace the relations with their indices.
-     2. Join on 'subject' to replace it with the corresponding entity index using a left join on `idx_entity`.
-     3. Join on 'object' to replace it with the corresponding entity index using a left join on `idx_entity`.
-     4. Select only the 'subject', 'relation', and 'object' columns to return the final result.
      """
-    assert isinstance(df_polars, polars.DataFrame)
-    assert isinstance(idx_entity, polars.DataFrame)
-    assert isinstance(idx_relation, polars.DataFrame)
-
-    # Step : Join on 'relation' to replace relation with its index
-    df_merged = df_polars.join(idx_relation, on="relation", how="left")
-    df_merged = df_merged.select([polars.col("subject"), polars.col("index").alias("relation"), polars.col("object")])
-    # Step :  Consider Left Table on subject and Right Table on entity with the left join
-    # Returns all rows from the left table, and the matched rows from the right table
-    df_merged = df_merged.join(idx_entity, left_on="subject", right_on="entity", how="left")
-    df_merged = df_merged.drop("subject").rename({"index": "subject"})
-    # Step 3: Join on 'object' to replace object with its index
-    df_final = df_merged.join(idx_entity, left_on="object", right_on="entity", how="left")
-    df_final = df_final.drop("object").rename({"index": "object"})
-    # Step 4: Select the desired columns
-    df_final = df_final.select([polars.col("subject"), polars.col("relation"), polars.col("object")])
-    return df_final
+    # LazyFrames are indexed lazily, e.g., to stream the result via sink_parquet.
+    assert isinstance(df_polars, (polars.DataFrame, polars.LazyFrame))
+    entity_enum = polars_vocabulary_enum(idx_entity, "entity")
+    relation_enum = polars_vocabulary_enum(idx_relation, "relation")
+    return df_polars.select([polars.col("subject").cast(entity_enum, strict=False).to_physical().cast(polars.UInt32),
+                             polars.col("relation").cast(relation_enum, strict=False).to_physical().cast(polars.UInt32),
+                             polars.col("object").cast(entity_enum, strict=False).to_physical().cast(polars.UInt32)])
+
+
+def polars_vocabulary_enum(vocabulary: Union[polars.DataFrame, polars.LazyFrame], name: str) -> polars.Enum:
+    """ An Enum data type whose i-th category is the value indexed by i in a vocabulary """
+    if isinstance(vocabulary, polars.LazyFrame):
+        vocabulary = vocabulary.collect()
+    assert isinstance(vocabulary, polars.DataFrame)
+    vocabulary = vocabulary.sort("index")
+    assert len(vocabulary) == 0 or (vocabulary["index"][0] == 0 and vocabulary["index"][-1] == len(vocabulary) - 1), \
+        f"Indices of {name} vocabulary must be 0,...,n-1"
+    return polars.Enum(vocabulary[name])
 
 
 def pandas_dataframe_indexer(df_pandas: pd.DataFrame, idx_entity: pd.DataFrame, idx_relation: pd.DataFrame) -> pd.DataFrame:
@@ -87,6 +86,9 @@ def pandas_dataframe_indexer(df_pandas: pd.DataFrame, idx_entity: pd.DataFrame,
     Replaces 'subject', 'relation', and 'object' columns in the input Pandas DataFrame with their corresponding index values
     from the entity and relation index DataFrames.
 
+    The columns are encoded as categoricals whose categories are the vocabularies. Subject and object columns
+    share a single categorical data type, i.e., a single hash table, and the categorical codes are the indices.
+
     Parameters:
     -----------
     df_pandas : pd.DataFrame
@@ -94,29 +96,29 @@ def pandas_dataframe_indexer(df_pandas: pd.DataFrame, idx_entity: pd.DataFrame,
 
     idx_entity : pd.DataFrame
         A Pandas DataFrame that contains the mapping between entity names and their corresponding indices.
-        Must have columns: 'entity' and 'index'.
+        Must have a column 'entity' and a range index.
 
     idx_relation : pd.DataFrame
         A Pandas DataFrame that contains the mapping between relation names and their corresponding indices.
-        Must have columns: 'relation' and 'index'.
+        Must have a column 'relation' and a range index.
 
     Returns:
     --------
     pd.DataFrame
         A DataFrame with the 'subject', 'relation', and 'object' columns replaced by their corresponding indices.
+        Values not found in the vocabularies are replaced by -1.
     """
     assert isinstance(df_pandas, pd.DataFrame)
     assert isinstance(idx_entity, pd.DataFrame)
     assert isinstance(idx_relation, pd.DataFrame)
-
-    # Create a dictionary that maps entities to their indices
-    entity_to_index = pd.Series(idx_entity.index, index=idx_entity['entity']).to_dict()
-    df_pandas['subject'] = df_pandas['subject'].map(entity_to_index)
-    df_pandas['object'] = df_pandas['object'].map(entity_to_index)
-    del entity_to_index
-    relation_to_index = pd.Series(idx_relation.index, index=idx_relation['relation']).to_dict()
-    df_pandas['relation'] = df_pandas['relation'].map(relation_to_index)
-    del relation_to_index
+    assert idx_entity.index.equals(pd.RangeIndex(len(idx_entity)))
+    assert idx_relation.index.equals(pd.RangeIndex(len(idx_relation)))
+    # The hash table of categories is constructed once and reused for subject and object columns.
+    entity_dtype = pd.CategoricalDtype(idx_entity['entity'])
+    relation_dtype = pd.CategoricalDtype(idx_relation['relation'])
+    df_pandas['subject'] = pd.Categorical(df_pandas['subject'], dtype=entity_dtype).codes
+    df_pandas['object'] = pd.Categorical(df_pandas['object'], dtype=entity_dtype).codes
+    df_pandas['relation'] = pd.Categorical(df_pandas['relation'], dtype=relation_dtype).codes
     return df_pandas
 
 
@@ -133,6 +135,45 @@ def apply_reciprical_or_noise(add_reciprical: bool, eval_model: str, df: object
         return df
 
 
+def add_reciprocal_triples(x: np.ndarray, num_relations: int) -> np.ndarray:
+    """
+    Add reciprocal triples into integer indexed triples, i.e., {(s,p,o)} union {(o,p + num_relations,s)}.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        Integer indexed triples of shape (n,3).
+    num_relations : int
+        The number of relations before the augmentation.
+
+    Returns
+    -------
+    np.ndarray
+        Integer indexed triples of shape (2n,3).
+    """
+    assert isinstance(x, np.ndarray) and x.ndim == 2 and x.shape[1] == 3
+    return np.concatenate([x, x[:, [2, 1, 0]] + np.array([0, num_relations, 0], dtype=x.dtype)])
+
+
+def add_inverse_relations(relation_to_idx: Union[pd.DataFrame, polars.DataFrame]) -> Union[pd.DataFrame,
+                                                                                             polars.DataFrame]:
+    """
+    Extend a relation vocabulary of |R| relations with p_inverse relations indexed from |R| to 2|R|-1.
+
+    Reciprocal triples are added after indexing via add_reciprocal_triples. Hence, only the vocabulary needs the
+    string names of inverse relations.
+    """
+    if isinstance(relation_to_idx, pd.DataFrame):
+        inverse = (relation_to_idx["relation"] + "_inverse").to_frame("relation")
+        return pd.concat([relation_to_idx, inverse], ignore_index=True)
+    assert isinstance(relation_to_idx, polars.DataFrame)
+    num_relations = len(relation_to_idx)
+    return polars.concat([relation_to_idx,
+                          relation_to_idx.select([(polars.col("index") + num_relations).cast(
+                                                      relation_to_idx.schema["index"]),
+                                                  polars.col("relation") + "_inverse"])])
+
+
 def timeit(func):
     @functools.wraps(func)
     def timeit_wrapper(*args, **kwargs):
@@ -181,11 +222,128 @@ def read_with_polars(data_path, read_only_few: int = None, sample_triples_ratio:
     return df
 
 
+def scan_with_polars(data_path, read_only_few: int = None, sample_triples_ratio: float = None,
+                     separator: str = None) -> polars.LazyFrame:
+    """ Lazily scan triples via Polars, i.e., nothing is read into memory until the LazyFrame is collected or sunk """
+    assert separator is not None, "separator cannot be None"
+    assert ".zst" not in data_path, "Compressed files cannot be scanned lazily. Use --backend polars"
+    print(f'*** Scanning {data_path} with Polars ***')
+    lf = polars.scan_csv(data_path,
+                         has_header=False,
+                         infer_schema=False,
+                         new_columns=['subject', 'relation', 'object'],
+                         separator=separator).select(['subject', 'relation', 'object'])
+    if read_only_few:
+        lf = lf.head(read_only_few)
+    if sample_triples_ratio:
+        # A hash based sample does not require to materialize rows.
+        print(f'Subsampling {sample_triples_ratio} of input data...')
+        lf = lf.filter(polars.struct(['subject', 'relation', 'object']).hash(seed=1) % 1_000_000
+                       < int(sample_triples_ratio * 1_000_000))
+    # Type heuristic prediction: If KG is an RDF KG, remove all triples where subject is not <?>.
+    h = lf.head().collect().to_pandas()
+    if sum(h["subject"].str.startswith('<')) + sum(h["relation"].str.startswith('<')) > 2:
+        print('Removing triples with literal values...')
+        lf = lf.filter(polars.col("object").str.starts_with('<'))
+    return lf
+
+
+def streaming_vocabulary(lazy_frames: List[polars.LazyFrame], columns: List[str], name: str,
+                         num_partitions: int = 1) -> polars.DataFrame:
+    """
+    Unique values of columns of LazyFrames with their integer indices.
+
+    Values are partitioned by their hashes and unique values of a partition are collected via the streaming engine,
+    i.e., only a single partition of values is deduplicated in memory at once.
+    """
+    assert num_partitions >= 1
+    values = polars.concat([lf.select(polars.col(c).alias(name)) for lf in lazy_frames for c in columns])
+    partitions = []
+    for i in range(num_partitions):
+        partition = values if num_partitions == 1 else values.filter(polars.col(name).hash(seed=0) % num_partitions == i)
+        partitions.append(partition.unique().collect(streaming=True))
+        print(f"Partition {i + 1}/{num_partitions} of {name} vocabulary: {len(partitions[-1])} unique values")
+    return polars.concat(partitions).with_row_index("index").select(["index", name])
+
+
+def index_into_memmap(lf: polars.LazyFrame, entity_to_idx: polars.DataFrame, relation_to_idx: polars.DataFrame,
+                      path: str, dtype, chunk_size: int = 10_000_000, reciprocal_offset: int = None) -> np.memmap:
+    """
+    Index triples of a LazyFrame and write them into a memory mapped .npy file of shape (n,3).
+
+    The joins are streamed into a temporary Parquet file that is copied chunk by chunk into the .npy file.
+    If reciprocal_offset is given, (o, p + reciprocal_offset, s) triples are written into the second half of a
+    (2n,3) file.
+    """
+    import pyarrow.parquet as pq
+    path_parquet = path + ".parquet"
+    polars_dataframe_indexer(lf, entity_to_idx, relation_to_idx).sink_parquet(path_parquet)
+    parquet_file = pq.ParquetFile(path_parquet)
+    num_rows = parquet_file.metadata.num_rows
+    memmap = np.lib.format.open_memmap(path, mode="w+", dtype=dtype,
+                                       shape=(num_rows if reciprocal_offset is None else 2 * num_rows, 3))
+    start = 0
+    for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=['subject', 'relation', 'object']):
+        triples = np.stack([batch.column(i).to_numpy(zero_copy_only=False) for i in range(3)], axis=1)
+        memmap[start:start + batch.num_rows] = triples
+        if reciprocal_offset is not None:
+            memmap[num_rows + start:num_rows + start + batch.num_rows] = triples[:, [2, 1, 0]] + np.array(
+                [0, reciprocal_offset, 0], dtype=triples.dtype)
+        start += batch.num_rows
+    memmap.flush()
+    del memmap
+    os.remove(path_parquet)
+    return np.load(path, mmap_mode="r")
+
+
+def read_csv_range(data_path: str, start: int, end: int, separator: str,
+                   sample_triples_ratio: float = None) -> pd.DataFrame:
+    """ Parse triples in the [start, end) byte range of a csv file with the C engine of pandas """
+    with open(data_path, "rb") as file_descriptor:
+        file_descriptor.seek(start)
+        data = file_descriptor.read(end - start)
+    try:
+        # Arrow backed strings are pickled as buffers instead of Python objects between processes.
+        df = pd.read_csv(io.BytesIO(data), sep=separator, header=None, usecols=[0, 1, 2],
+                         names=['subject', 'relation', 'object'], dtype="string[pyarrow]")
+    except pd.errors.EmptyDataError:
+        df = pd.DataFrame(columns=['subject', 'relation', 'object'], dtype="string[pyarrow]")
+    if sample_triples_ratio:
+        df = df.sample(frac=sample_triples_ratio, random_state=start % 2 ** 32)
+    return df
+
+
+def read_csv_in_parallel(data_path: str, separator: str, sample_triples_ratio: float = None,
+                         range_size: int = 2 ** 26, num_workers: int = None) -> pd.DataFrame:
+    """
+    Read a csv file of triples by parsing its newline aligned byte ranges of range_size bytes in a process pool.
+
+    If sample_triples_ratio is given, each range is sampled in its process, i.e., only the sampled triples are
+    concatenated.
+    """
+    ranges = newline_aligned_byte_ranges(data_path, range_size)
+    if len(ranges) == 1:
+        frames = [read_csv_range(data_path, *ranges[0], separator, sample_triples_ratio)]
+    else:
+        num_workers = num_workers if num_workers else min(len(ranges), os.cpu_count() or 1)
+        print(f'Reading {len(ranges)} byte ranges with {num_workers} processes...')
+        with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers) as executor:
+            frames = list(executor.map(read_csv_range, itertools.repeat(data_path), *zip(*ranges),
+                                       itertools.repeat(separator), itertools.repeat(sample_triples_ratio)))
+    return pd.concat(frames, ignore_index=True)
+
+
 @timeit
 def read_with_pandas(data_path, read_only_few: int = None, sample_triples_ratio: float = None,separator:str=None):
     assert separator is not None, "separator cannot be None"
     print(f'*** Reading {data_path} with Pandas ***')
-    if data_path[-3:] in [".nt","ttl", 'txt', 'csv', 'zst']:
+    if data_path[-3:] in [".nt","ttl", 'txt', 'csv'] and not read_only_few:
+        # (1) Uncompressed files are split into byte ranges parsed in parallel.
+        df = read_csv_in_parallel(data_path, separator, sample_triples_ratio)
+        # Ranges are already sampled.
+        sample_triples_ratio = None
+    elif data_path[-3:] in [".nt","ttl", 'txt', 'csv', 'zst']:
+        # (1) The first read_only_few triples are parsed without reading the rest of the file.
         print('Reading with pandas.read_csv with sep ** s+ ** ...')
         df = pd.read_csv(data_path,
                          sep=separator,#"\s+",
@@ -193,7 +351,7 @@ def read_with_pandas(data_path, read_only_few: int = None, sample_triples_ratio:
                          nrows=None if read_only_few is None else read_only_few,
                          usecols=[0, 1, 2],
                          names=['subject', 'relation', 'object'],
-                         dtype=str)
+                         dtype="string[pyarrow]")
     else:
         df = pd.read_parquet(data_path, engine='pyarrow')
         # (2)a Read only few if it is asked.
@@ -217,6 +375,115 @@ def read_with_pandas(data_path, read_only_few: int = None, sample_triples_ratio:
     return df
 
 
+def newline_aligned_byte_ranges(data_path: str, range_size: int) -> List[Tuple[int, int]]:
+    """ Split a file into [start, end) byte ranges of about range_size bytes, each of which ends after a newline """
+    assert range_size > 0
+    file_size = os.path.getsize(data_path)
+    boundaries = [0]
+    with open(data_path, "rb") as file_descriptor:
+        while boundaries[-1] + range_size < file_size:
+            # Move to the first byte after the next newline.
+            file_descriptor.seek(boundaries[-1] + range_size - 1)
+            file_descriptor.readline()
+            if file_descriptor.tell() >= file_size:
+                break
+            boundaries.append(file_descriptor.tell())
+    boundaries.append(file_size)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+# A subject, predicate and object IRI or blank node, an optional graph label of N-Quads and an optional comment.
+# Triples with literal values, comments, and empty lines do not match.
+NTRIPLES_PATTERN = (r'^\s*(?P<subject><[^>]*>|_:\S*[^\s.])\s*(?P<relation><[^>]*>)\s*'
+                    r'(?P<object><[^>]*>|_:\S*[^\s.])\s*(?:(?:<[^>]*>|_:\S*[^\s.])\s*)?\.\s*(?:#.*)?\s*$')
+IRI_ESCAPE_PATTERN = re.compile(r'\\u([0-9A-Fa-f]{4})|\\U([0-9A-Fa-f]{8})')
+
+
+def unescape_iri(iri: str) -> str:
+    """ Decode \\uXXXX and \\UXXXXXXXX escapes of an N-Triples IRI as rdflib does """
+    return IRI_ESCAPE_PATTERN.sub(lambda m: chr(int(m.group(1) or m.group(2), 16)), iri)
+
+
+def parse_ntriples_range(data_path: str, start: int, end: int, sample_triples_ratio: float = None):
+    """
+    Parse lines in the [start, end) byte range of an N-Triples or N-Quads file into a pyarrow.RecordBatch.
+
+    Lines are sliced from the bytes without creating Python objects and matched by pyarrow.compute in C++,
+    which releases the GIL. Hence, byte ranges can be parsed by threads in parallel.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    with open(data_path, "rb") as file_descriptor:
+        file_descriptor.seek(start)
+        data = file_descriptor.read(end - start)
+    if not data.endswith(b"\n"):
+        data += b"\n"
+    # (1) Each line, including its newline, is a string of an arrow array sharing the buffer of data.
+    offsets = np.concatenate([[0], np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == 10) + 1]).astype(np.int64)
+    lines = pa.LargeStringArray.from_buffers(len(offsets) - 1, pa.py_buffer(offsets), pa.py_buffer(data))
+    lines.validate(full=True)
+    # (2) Match lines and drop lines that are not triples between IRIs or blank nodes.
+    matches = pc.extract_regex(lines, pattern=NTRIPLES_PATTERN)
+    matches = matches.filter(pc.is_valid(matches))
+    if sample_triples_ratio:
+        matches = matches.filter(pa.array(np.random.default_rng(seed=start).random(len(matches))
+                                          < sample_triples_ratio))
+    # (3) <iri> => iri as in rdflib.URIRef.
+    columns = [pc.utf8_trim(matches.field(i), characters="<>").cast(pa.string()) for i in range(3)]
+    # (4) Escaped IRIs are rare and decoded in Python.
+    for i, column in enumerate(columns):
+        is_escaped = pc.match_substring(column, "\\")
+        if pc.any(is_escaped).as_py():
+            escaped = column.filter(is_escaped).to_pylist()
+            columns[i] = pc.replace_with_mask(column, is_escaped, pa.array([unescape_iri(iri) for iri in escaped],
+                                                                           type=pa.string()))
+    return pa.RecordBatch.from_arrays(columns, names=['subject', 'relation', 'object'])
+
+
+def iter_ntriples(data_path: str, read_only_few: int = None, sample_triples_ratio: float = None,
+                  range_size: int = 2 ** 26, num_workers: int = None):
+    """
+    Stream triples of an N-Triples or N-Quads file as pyarrow.RecordBatch objects in the order of the file.
+
+    The file is split into newline aligned byte ranges of range_size bytes parsed by num_workers threads.
+    Triples with literal values are dropped. If read_only_few is given, the first read_only_few triples are
+    yielded without reading the rest of the file.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    ranges = newline_aligned_byte_ranges(data_path, range_size)
+    num_workers = num_workers if num_workers else min(len(ranges), os.cpu_count() or 1)
+    num_triples = 0
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        # At most 2 x num_workers ranges are in memory at once.
+        futures = [executor.submit(parse_ntriples_range, data_path, start, end, sample_triples_ratio)
+                   for start, end in ranges[:2 * num_workers]]
+        for i in range(len(ranges)):
+            batch = futures[i].result()
+            futures[i] = None
+            if i + 2 * num_workers < len(ranges):
+                futures.append(executor.submit(parse_ntriples_range, data_path,
+                                               *ranges[i + 2 * num_workers], sample_triples_ratio))
+            if read_only_few and num_triples + batch.num_rows >= read_only_few:
+                yield batch.slice(0, read_only_few - num_triples)
+                for future in futures[i + 1:]:
+                    future.cancel()
+                return
+            num_triples += batch.num_rows
+            yield batch
+
+
+@timeit
+def read_with_ntriples_parser(data_path: str, read_only_few: int = None, sample_triples_ratio: float = None,
+                              num_workers: int = None) -> pd.DataFrame:
+    """ Read triples between IRIs or blank nodes of an N-Triples or N-Quads file into a pandas DataFrame """
+    import pyarrow as pa
+    print(f'*** Reading {data_path} with the streaming N-Triples parser ***')
+    batches = list(iter_ntriples(data_path, read_only_few, sample_triples_ratio, num_workers=num_workers))
+    if len(batches) == 0:
+        return pd.DataFrame(columns=['subject', 'relation', 'object'], dtype=str)
+    return pa.Table.from_batches(batches).to_pandas()
+
+
 def read_from_disk(data_path: str, read_only_few: int = None,
                    sample_triples_ratio: float = None, backend:str=None,separator:str=None)\
         ->Tuple[polars.DataFrame,pd.DataFrame]:
@@ -233,7 +500,12 @@ def read_from_disk(data_path: str, read_only_few: int = None,
             return read_with_pandas(data_path, read_only_few, sample_triples_ratio, separator)
         elif backend == 'polars':
             return read_with_polars(data_path, read_only_few, sample_triples_ratio, separator)
+        elif backend == 'polars_streaming':
+            return scan_with_polars(data_path, read_only_few, sample_triples_ratio, separator)
         elif backend == "rdflib":
+            if dformat in ["nt", "nq"]:
+                # N-Triples and N-Quads are streamed in parallel instead of being parsed into a rdflib.Graph.
+                return read_with_ntriples_parser(data_path, read_only_few, sample_triples_ratio)
             # Lazy import
             from rdflib import Graph
             assert dformat in ["ttl", "owl", "nt", "turtle", "rdf/xml", "n3", " n-triples"],\
@@ -291,6 +563,31 @@ def get_ee_vocab(data, file_path: str = None):
     return ee_vocab
 
 
+def create_filter_indexes(data: np.ndarray, path: str = None):
+    """
+    Construct er, re, and ee filter indexes in the compressed sparse row format via sorting.
+
+    Parameters
+    ----------
+    data: np.ndarray of integer indexed triples
+    path: a folder to save the indexes as er_vocab_*.npy, re_vocab_*.npy, and ee_vocab_*.npy
+
+    Returns
+    -------
+    Tuple[FilterIndex, FilterIndex, FilterIndex]
+    """
+    from dicee.static_funcs_training import FilterIndex
+    # (h,r) => t, (r,t) => h, (h,t) => r
+    er_vocab = FilterIndex.from_triples(data, key_columns=(0, 1), value_column=2)
+    re_vocab = FilterIndex.from_triples(data, key_columns=(1, 2), value_column=0)
+    ee_vocab = FilterIndex.from_triples(data, key_columns=(0, 2), value_column=1)
+    if path:
+        er_vocab.save(path, "er_vocab")
+        re_vocab.save(path, "re_vocab")
+        ee_vocab.save(path, "ee_vocab")
+    return er_vocab, re_vocab, ee_vocab
+
+
 def create_constraints(triples, file_path: str = None):
     """
     (1) Extract domains and ranges of relations
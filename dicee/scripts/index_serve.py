@@ -2,14 +2,15 @@
 $ docker pull qdrant/qdrant && docker run -p 6333:6333 -p 6334:6334      -v $(pwd)/qdrant_storage:/qdrant/storage:z      qdrant/qdrant
 $ dicee_vector_db --index --serve --path CountryEmbeddings --collection "countries_vdb"
 
+Without a qdrant server, the built-in index stored under CountryEmbeddings/embedding_index can be used
+$ dicee_vector_db --index --serve --path CountryEmbeddings --collection "countries_vdb" --backend builtin
 """
 import argparse
 import os
+import json
 import numpy as np
 import pandas as pd
-from qdrant_client import QdrantClient
-from qdrant_client.http.models import Distance, VectorParams
-from qdrant_client.http.models import PointStruct
+from dicee.embedding_index import EmbeddingIndex
 
 from fastapi import FastAPI
 import uvicorn
@@ -24,7 +25,25 @@ def get_default_arguments():
     parser.add_argument("--serve", action="store_true", help="A flag for serving")
 
     parser.add_argument("--collection", type=str, required=True,help="Named of the vector database collection")
+    parser.add_argument("--backend", type=str, default="qdrant", choices=["qdrant", "builtin"],
+                        help="qdrant server or the built-in in-process index stored under {path}/embedding_index")
+    parser.add_argument("--metric", type=str, default="cosine", choices=["cosine", "dot"],
+                        help="Similarity metric of the collection or the built-in index")
+    parser.add_argument("--dtype", type=str, default="float32", choices=["float32", "float16"],
+                        help="Storage type of embeddings in the built-in index")
+    parser.add_argument("--num_lists", type=int, default=0,
+                        help="Number of k-means partitions of the built-in index. 0 implies the exact search only")
+    parser.add_argument("--num_probes", type=int, default=None,
+                        help="Number of partitions searched per query by the built-in index. None implies the exact search")
 
+    parser.add_argument("--embeddings", type=str, default=None,
+                        help="A csv file or a binary .npy file of entity embeddings. "
+                             "By default, the csv file with entity_embeddings.csv suffix in --path")
+    parser.add_argument("--chunk_size", type=int, default=100_000, help="Number of embeddings read at once")
+    parser.add_argument("--upsert_batch_size", type=int, default=1024, help="Number of points per upsert request")
+    parser.add_argument("--num_upsert_workers", type=int, default=4, help="Number of concurrent upsert requests")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue an interrupted indexing from {path}/{collection}_index_progress.json")
     parser.add_argument("--vdb_host", type=str,default="localhost",help="Host of qdrant vector database")
     parser.add_argument("--vdb_port", type=int,default=6333,help="port number")
     parser.add_argument("--host",type=str, default="0.0.0.0",help="Host")
@@ -32,43 +51,126 @@ def get_default_arguments():
     return parser.parse_args()
 
 
-def index(args):
-    client = QdrantClient(host=args.vdb_host, port=args.vdb_port)
-    entity_to_idx = pd.read_csv(args.path + "/entity_to_idx.csv", index_col=0)
-    assert entity_to_idx.index.is_monotonic_increasing, "Entity Index must be monotonically increasing!{}"
-    entity_to_idx = {name: idx for idx, name in enumerate(entity_to_idx["entity"].tolist())}
-
-    csv_files_holding_embeddings = [args.path + "/" + f for f in os.listdir(args.path) if "entity_embeddings.csv" in f]
+def get_entity_embeddings_csv(path: str) -> str:
+    csv_files_holding_embeddings = [path + "/" + f for f in os.listdir(path) if "entity_embeddings.csv" in f]
     assert len(
         csv_files_holding_embeddings) == 1, f"There must be only single csv file containing entity_embeddings.csv prefix. Currently, :{len(csv_files_holding_embeddings)}"
-    path_entity_embeddings_csv = csv_files_holding_embeddings[0]
+    return csv_files_holding_embeddings[0]
+
+
+def read_embeddings_in_chunks(args, idx_to_entity: List[str], chunk_size: int, start: int = 0):
+    """ Yield (ids, names, vectors) chunks of an entity embeddings csv file or a binary .npy file """
+    path = args.embeddings if getattr(args, "embeddings", None) else get_entity_embeddings_csv(args.path)
+    if path.endswith(".npy"):
+        # i.th row of the memory mapped matrix is the embedding of the i.th entity.
+        embeddings = np.load(path, mmap_mode="r")
+        assert len(embeddings) == len(idx_to_entity), "Number of rows and entities differ!"
+        for i in range(start, len(embeddings), chunk_size):
+            ids = np.arange(i, min(i + chunk_size, len(embeddings)))
+            yield ids, [idx_to_entity[j] for j in ids.tolist()], np.asarray(embeddings[i:i + chunk_size], dtype=np.float32)
+    else:
+        entity_to_idx = {name: idx for idx, name in enumerate(idx_to_entity)}
+        offset = 0
+        for chunk in pd.read_csv(path, index_col=0, header=0, chunksize=chunk_size):
+            # Skip rows that were upserted before.
+            chunk = chunk.iloc[max(start - offset, 0):]
+            offset += chunk_size
+            if len(chunk) == 0:
+                continue
+            names = chunk.index.astype(str).tolist()
+            yield np.array([entity_to_idx[name] for name in names]), names, chunk.values.astype(np.float32)
+
+
+def index_builtin(args):
+    idx_to_entity = pd.read_csv(args.path + "/entity_to_idx.csv", index_col=0)
+    assert idx_to_entity.index.is_monotonic_increasing, "Entity Index must be monotonically increasing!{}"
+    idx_to_entity = idx_to_entity["entity"].astype(str).tolist()
+    embeddings = None
+    # Read embeddings in chunks and place rows according to their entity indices.
+    for ids, _, vectors in read_embeddings_in_chunks(args, idx_to_entity, getattr(args, "chunk_size", 100_000)):
+        if embeddings is None:
+            embeddings = np.zeros((len(idx_to_entity), vectors.shape[1]), dtype=args.dtype)
+        embeddings[ids] = vectors
+    assert embeddings is not None and embeddings.shape[1] > 0
+    print(f"Creating a built-in index with {args.metric} metric and {args.num_lists} partitions")
+    EmbeddingIndex.build(embeddings, metric=args.metric, dtype=args.dtype,
+                         num_lists=args.num_lists).save(args.path + "/embedding_index")
+    print("Completed!")
+
+
+def get_progress_path(args) -> str:
+    return f"{args.path}/{args.collection}_index_progress.json"
 
-    points = []
-    embedding_dim = None
-    for ith_row, (index_name, embedding_vector) in enumerate(
-            pd.read_csv(path_entity_embeddings_csv, index_col=0, header=0).iterrows()):
-        index_name: str
-        embedding_vector: np.ndarray
-        embedding_vector = embedding_vector.values
 
-        points.append(PointStruct(id=entity_to_idx[index_name],
-                                  vector=embedding_vector,
-                                  payload={"name": index_name}))
+def is_local_client(client) -> bool:
+    """ Whether a QdrantClient runs in the local mode, e.g. QdrantClient(":memory:"), instead of talking to a server """
+    from qdrant_client.local.qdrant_local import QdrantLocal
+    return isinstance(getattr(client, "_client", None), QdrantLocal)
 
-        embedding_dim = len(embedding_vector)
 
-    assert embedding_dim > 0
-    # If the collection is not created, create it
-    if args.collection in [i.name for i in client.get_collections().collections]:
+def index(args, client=None):
+    """
+    Upsert entity embeddings into a qdrant collection.
+
+    Embeddings are streamed in chunks of args.chunk_size rows and a chunk is upserted in batches of
+    args.upsert_batch_size points by args.num_upsert_workers threads (a single thread for a local client). After each chunk, the number of upserted rows
+    is written into {path}/{collection}_index_progress.json so that --resume continues from there.
+    """
+    if args.backend == "builtin":
+        return index_builtin(args)
+    from qdrant_client import QdrantClient
+    from qdrant_client.http.models import Distance, VectorParams, Batch
+    from concurrent.futures import ThreadPoolExecutor
+    from tqdm import tqdm
+    if client is None:
+        client = QdrantClient(host=args.vdb_host, port=args.vdb_port)
+    idx_to_entity = pd.read_csv(args.path + "/entity_to_idx.csv", index_col=0)
+    assert idx_to_entity.index.is_monotonic_increasing, "Entity Index must be monotonically increasing!{}"
+    idx_to_entity = idx_to_entity["entity"].astype(str).tolist()
+    chunk_size = getattr(args, "chunk_size", 100_000)
+    batch_size = getattr(args, "upsert_batch_size", 1024)
+    num_workers = getattr(args, "num_upsert_workers", 4)
+    if is_local_client(client):
+        # The in-memory and on-disk local modes of qdrant_client are not thread-safe.
+        num_workers = 1
+    # (1) Find the number of rows upserted before.
+    start = 0
+    progress_path = get_progress_path(args)
+    exists = args.collection in [i.name for i in client.get_collections().collections]
+    if getattr(args, "resume", False) and exists and os.path.isfile(progress_path):
+        with open(progress_path, "r") as file_descriptor:
+            start = json.load(file_descriptor)["num_upserted"]
+        print(f"Resuming indexing of {args.collection} from row {start}")
+    elif exists:
         print("Deleting existing collection ", args.collection)
         client.delete_collection(collection_name=args.collection)
+        exists = False
+
+    def upsert(ids, names, vectors):
+        client.upsert(collection_name=args.collection, wait=True,
+                      points=Batch(ids=ids.tolist(), vectors=vectors.tolist(), payloads=[{"name": n} for n in names]))
+        return len(ids)
 
-    print(f"Creating a collection {args.collection} with distance metric:Cosine")
-    client.create_collection(collection_name=args.collection,
-                             vectors_config=VectorParams(size=embedding_dim,
-                                                         distance=Distance.COSINE))
-    client.upsert(collection_name=args.collection, points=points)
+    # (2) Upsert chunks in concurrent batches.
+    with ThreadPoolExecutor(max_workers=num_workers) as executor, \
+            tqdm(total=len(idx_to_entity), initial=start, unit="points", desc="Indexing") as progress_bar:
+        for ids, names, vectors in read_embeddings_in_chunks(args, idx_to_entity, chunk_size, start):
+            if not exists:
+                distance = Distance.DOT if getattr(args, "metric", "cosine") == "dot" else Distance.COSINE
+                print(f"Creating a collection {args.collection} with distance metric:{distance.name}")
+                client.create_collection(collection_name=args.collection,
+                                         vectors_config=VectorParams(size=vectors.shape[1], distance=distance))
+                exists = True
+            futures = [executor.submit(upsert, ids[i:i + batch_size], names[i:i + batch_size], vectors[i:i + batch_size])
+                       for i in range(0, len(ids), batch_size)]
+            for future in futures:
+                progress_bar.update(future.result())
+            start += len(ids)
+            with open(progress_path, "w") as file_descriptor:
+                json.dump({"num_upserted": start}, file_descriptor)
+    assert exists, "No embeddings found!"
     print("Completed!")
+    return client
 
 
 app = FastAPI()
@@ -81,9 +183,18 @@ class NeuralSearcher:
         assert os.path.exists(args.path + "/entity_to_idx.csv"), f"{args.path + '/entity_to_idx.csv'} does not exist!"
         self.entity_to_idx = pd.read_csv(args.path + "/entity_to_idx.csv", index_col=0)
         assert self.entity_to_idx.index.is_monotonic_increasing, "Entity Index must be monotonically increasing!{}"
-        self.entity_to_idx = {name: idx for idx, name in enumerate(self.entity_to_idx["entity"].tolist())}
-        # initialize Qdrant client
-        self.qdrant_client = QdrantClient(host=args.vdb_host,port=args.vdb_port)
+        self.idx_to_entity = self.entity_to_idx["entity"].tolist()
+        self.entity_to_idx = {name: idx for idx, name in enumerate(self.idx_to_entity)}
+        self.backend = args.backend
+        self.num_probes = args.num_probes
+        if self.backend == "builtin":
+            # Memory mapped in-process index
+            assert EmbeddingIndex.exists(args.path + "/embedding_index"), "Run dicee_vector_db --index --backend builtin"
+            self.embedding_index = EmbeddingIndex.load(args.path + "/embedding_index")
+        else:
+            # initialize Qdrant client
+            from qdrant_client import QdrantClient
+            self.qdrant_client = QdrantClient(host=args.vdb_host,port=args.vdb_port)
         # semantic search
         self.topk=5
 
@@ -98,10 +209,20 @@ class NeuralSearcher:
                 ids.append(idx)
         if len(ids)<1:
             return {"error":f"IDs are not found for ({entity} or {entities})"}
+        elif self.backend == "builtin":
+            return [{"name": self.idx_to_entity[i], "vector": self.embedding_index.embeddings[i].astype(np.float32).tolist()}
+                    for i in ids]
         else:
             return [{"name": result.payload["name"], "vector": result.vector} for result in self.qdrant_client.retrieve(collection_name=self.collection_name,ids=ids, with_vectors=True)]
 
     def search(self, entity: str):
+        if self.backend == "builtin":
+            idx = self.entity_to_idx[entity]
+            indices, scores = self.embedding_index.search(self.embedding_index.embeddings[idx], topk=self.topk + 1,
+                                                          num_probes=self.num_probes)
+            # As in qdrant, the queried entity is excluded.
+            return [{"id": i, "name": self.idx_to_entity[i], "score": score}
+                    for i, score in zip(indices[0].tolist(), scores[0].tolist()) if i != idx and i >= 0][:self.topk]
         return self.qdrant_client.query_points(collection_name=self.collection_name, query=self.entity_to_idx[entity],limit=self.topk)
 
 @app.get("/")
@@ -1,4 +1,5 @@
 import json
+import os
 from dicee.executer import Execute, ContinuousExecute
 import argparse
 
@@ -25,10 +26,14 @@ def get_default_arguments(description=None):
     parser.add_argument("--save_embeddings_as_csv", action="store_true",
                         help="A flag for saving embeddings in csv file.")
     parser.add_argument("--backend", type=str, default="pandas",
-                        choices=["pandas", "polars", "rdflib"],
-                        help='Backend for loading, preprocessing, indexing input knowledge graph.')
+                        choices=["pandas", "polars", "polars_streaming", "rdflib"],
+                        help='Backend for loading, preprocessing, indexing input knowledge graph. '
+                             'polars_streaming indexes a knowledge graph larger than memory into a memory mapped file.')
     parser.add_argument("--separator", type=str, default="\s+",
                         help='Pandas \s+, t for \t polars works with the last two.')
+    parser.add_argument("--preprocessing_cache_dir", type=str, default=os.path.join("~", ".cache", "dicee"),
+                        help="A folder of preprocessed knowledge graphs reused by runs on the same input files "
+                             "with the same preprocessing arguments. None disables caching.")
     # Model related arguments
     parser.add_argument("--model", type=str,
                         default="Keci",
@@ -56,8 +61,13 @@ def get_default_arguments(description=None):
                         help='{"PPE":{ "last_percent_to_consider": 10}}'
                              '"Perturb": {"level": "out", "ratio": 0.2, "method": "RN", "scaler": 0.3}')
     parser.add_argument("--trainer", type=str, default='PL',
-                        choices=['torchCPUTrainer', 'PL', 'torchDDP', "TP"],
-                        help='PL (pytorch lightning trainer), torchDDP (custom ddp), torchCPUTrainer (custom cpu only), MP (Model Paralelisim)')
+                        choices=['torchCPUTrainer', 'PL', 'torchDDP', "TP", "torchHogwild"],
+                        help='PL (pytorch lightning trainer), torchDDP (custom ddp), torchCPUTrainer (custom cpu only), MP (Model Paralelisim), '
+                             'torchHogwild (lock-free multi-process cpu training with --num_core processes)')
+    parser.add_argument("--ddp_backend", type=str, default=None, choices=["nccl", "gloo"],
+                        help="Backend of torchDDP. nccl for GPUs, gloo for CPUs. None implies nccl if GPUs are available.")
+    parser.add_argument("--autocast_dtype", type=str, default=None, choices=["float32", "bfloat16", "float16"],
+                        help="Mixed precision of torchDDP. None implies float16 on GPUs and float32 on CPUs.")
     parser.add_argument('--scoring_technique', default="NegSample",
                         help="Training technique for knowledge graph embedding model",
                         choices=["AllvsAll", "KvsAll", "1vsAll", "NegSample", "1vsSample", "KvsSample"])
@@ -76,12 +86,25 @@ def get_default_arguments(description=None):
                         help="e.g. gradient_accumulation_steps=2 "
                              "implies that gradients are accumulated at every second mini-batch")
     parser.add_argument("--label_smoothing_rate", type=float, default=0.0, help='None for not using it.')
+    parser.add_argument("--sparse_targets", action="store_true",
+                        help="Keep KvsAll multi-label vectors sparse up to the loss computation.")
+    parser.add_argument("--sparse_embeddings", action="store_true",
+                        help="Use sparse entity and relation embeddings updated via SparseAdam "
+                             "(or a row-wise Adagrad if --optim Adagrad). "
+                             "Supported with torchCPUTrainer and NegSample or 1vsSample.")
     parser.add_argument("--kernel_size", type=int, default=3,
                         help="Square kernel size for convolution based models.")
     parser.add_argument("--num_of_output_channels", type=int, default=2,
                         help="# of output channels in convolution")
     parser.add_argument("--num_core", type=int, default=0,
-                        help='Number of cores to be used. 0 implies using single CPU')
+                        help='Number of cores to be used. 0 implies using single CPU. '
+                             'For torchHogwild, number of training processes, 0 implies using all CPUs')
+    parser.add_argument("--num_prefetch_batches", type=int, default=0,
+                        help='Number of mini-batches constructed in advance on a background thread in torchCPUTrainer. '
+                             '0 implies no prefetching. With prefetching, resuming from a snapshot is not exact, '
+                             'as the background thread draws random numbers concurrently.')
+    parser.add_argument("--pin_memory", action="store_true",
+                        help='Page-lock prefetched mini-batches to copy them into GPU memory asynchronously.')
     parser.add_argument("--random_seed", type=int, default=1,
                         help='Seed for all, see pl seed_everything().')
     parser.add_argument('--p', type=int, default=0,
@@ -99,6 +122,17 @@ def get_default_arguments(description=None):
                         help='Evaluating link prediction performance on data splits. ')
     parser.add_argument("--save_model_at_every_epoch", type=int, default=None,
                         help='At every X number of epochs model will be saved. If None, we save 4 times.')
+    parser.add_argument("--snapshot_every_n_batches", type=int, default=None,
+                        help='At every N mini-batches, a resumable snapshot.pt is written into the experiment folder. '
+                             'Only available for torchCPUTrainer and torchDDP.')
+    parser.add_argument("--resume_from", type=str, default=None,
+                        help='The path of a snapshot.pt or a folder containing it to resume the training from the '
+                             'exact mini-batch. The remaining arguments should be the same as in the interrupted run.')
+    parser.add_argument("--checkpoint_format", type=str, default="pt", choices=["pt", "mmap"],
+                        help='pt: model.pt via torch.save. mmap: a raw file per tensor and a header.json under model_mmap, '
+                             'loaded via memory mapping without a copy.')
+    parser.add_argument("--checkpoint_shard_size", type=int, default=None,
+                        help='Number of rows of a tensor copied to CPU and written at once in the mmap checkpoint format.')
     # Continual Learning
     parser.add_argument("--continual_learning", type=str, default=None,
                         help="The path of a folder containing a pretrained model and configurations")
@@ -0,0 +1,383 @@
+"""
+Micro-batching inference server of a pretrained KGE model
+
+$ pip3 install fastapi uvicorn
+$ dicee_serve --path Experiments/2024-01-01_00-00-00 --max_batch_size 256 --max_latency_ms 5
+$ curl -X 'POST' 'http://0.0.0.0:8000/api/predict_tail' -H 'Content-Type: application/json' -d '{"h": "germany", "r": "locatedin", "topk": 3}'
+$ curl -X 'GET' 'http://0.0.0.0:8000/metrics'
+
+Concurrent requests of the same kind arriving within max_latency_ms are scored together, e.g.,
+tail entity predictions of a micro-batch are computed by a single forward_k_vs_all call.
+"""
+import argparse
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Callable, List, Optional
+import numpy as np
+import torch
+from dicee.knowledge_graph_embeddings import KGE
+
+from fastapi import FastAPI, HTTPException
+import uvicorn
+from pydantic import BaseModel, Field
+
+
+def get_default_arguments():
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--path", type=str, required=True, help="The path of a pretrained model folder")
+    parser.add_argument("--max_batch_size", type=int, default=256,
+                        help="Maximum number of requests scored at once")
+    parser.add_argument("--max_latency_ms", type=float, default=5.0,
+                        help="Maximum time waited for further requests after the first request of a batch")
+    parser.add_argument("--max_triples_per_forward", type=int, default=2 ** 22,
+                        help="Maximum number of triples scored by a forward pass of head and relation predictions")
+    parser.add_argument("--host", type=str, default="0.0.0.0", help="Host")
+    parser.add_argument("--port", type=int, default=8000, help="port number")
+    return parser.parse_args()
+
+
+class ServingMetrics:
+    """ Latencies and completion times of the last window_size requests """
+
+    def __init__(self, window_size: int = 10_000):
+        self.latencies = deque(maxlen=window_size)
+        self.completion_times = deque(maxlen=window_size)
+        self.num_requests = 0
+        self.num_batches = 0
+
+    def record(self, latencies: List[float]) -> None:
+        now = time.perf_counter()
+        self.latencies.extend(latencies)
+        self.completion_times.extend(now for _ in latencies)
+        self.num_requests += len(latencies)
+        self.num_batches += 1
+
+    def summary(self) -> dict:
+        if self.num_requests == 0:
+            return {"num_requests": 0, "num_batches": 0}
+        latencies = np.asarray(self.latencies) * 1000
+        elapsed = time.perf_counter() - self.completion_times[0]
+        return {"num_requests": self.num_requests,
+                "num_batches": self.num_batches,
+                "mean_batch_size": self.num_requests / self.num_batches,
+                "p50_latency_ms": float(np.percentile(latencies, 50)),
+                "p99_latency_ms": float(np.percentile(latencies, 99)),
+                "requests_per_second": len(self.completion_times) / max(elapsed, 1e-9)}
+
+
+class MicroBatcher:
+    """
+    Coalesce concurrent requests into batches.
+
+    The first queued request opens a batch that is closed after max_latency_ms or once max_batch_size requests are
+    collected. A batch is processed by batch_fn(items) -> results in the executor, i.e., off the event loop.
+    Items are checked by validate_fn(item) before they are queued. If a batch fails, its items are processed one at
+    a time so that only the failing requests receive the exception.
+    """
+
+    def __init__(self, batch_fn: Callable[[List], List], executor: ThreadPoolExecutor, max_batch_size: int = 256,
+                 max_latency_ms: float = 5.0, validate_fn: Optional[Callable] = None):
+        assert max_batch_size > 0 and max_latency_ms >= 0
+        self.batch_fn = batch_fn
+        self.validate_fn = validate_fn
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000
+        self.metrics = ServingMetrics()
+        self.queue = None
+        self.task = None
+
+    def start(self) -> None:
+        self.queue = asyncio.Queue()
+        self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def submit(self, item):
+        if self.validate_fn is not None:
+            self.validate_fn(item)
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((item, future, time.perf_counter()))
+        return await future
+
+    async def collect(self) -> List:
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_latency
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self.collect()
+            items, futures, start_times = zip(*batch)
+            try:
+                results = await loop.run_in_executor(self.executor, self.batch_fn, list(items))
+            except Exception as e:
+                if len(items) == 1:
+                    if not futures[0].done():
+                        futures[0].set_exception(e)
+                    continue
+                # Retry items one at a time so that a bad request does not fail the whole batch.
+                results = []
+                for item, future in zip(items, futures):
+                    try:
+                        results.append((await loop.run_in_executor(self.executor, self.batch_fn, [item]))[0])
+                    except Exception as item_exception:
+                        results.append(None)
+                        if not future.done():
+                            future.set_exception(item_exception)
+            for future, result in zip(futures, results):
+                if not future.done():
+                    future.set_result(result)
+            now = time.perf_counter()
+            self.metrics.record([now - i for i in start_times])
+
+
+class KGEServer:
+    """
+    Batched scoring of a pretrained KGE model.
+
+    Every kind of query has its own MicroBatcher. Batches are processed one at a time by a single thread.
+    Head and relation predictions score at most max_triples_per_forward triples per forward pass.
+    """
+
+    def __init__(self, kge: KGE, max_batch_size: int = 256, max_latency_ms: float = 5.0,
+                 max_triples_per_forward: int = 2 ** 22):
+        assert not kge.configs.get("byte_pair_encoding", None), "Serving BPE models is not supported"
+        assert max_triples_per_forward > 0
+        self.kge = kge
+        self.kge.set_model_eval_mode()
+        self.max_triples_per_forward = max_triples_per_forward
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.batchers = {name: MicroBatcher(fn, self.executor, max_batch_size, max_latency_ms, validate_fn)
+                         for name, fn, validate_fn in [("triple_score", self.batch_triple_score, None),
+                                                       ("predict_tail", self.batch_predict_tail, self.validate_topk),
+                                                       ("predict_head", self.batch_predict_head, self.validate_topk),
+                                                       ("predict_relation", self.batch_predict_relation,
+                                                        self.validate_topk)]}
+
+    def start(self) -> None:
+        for batcher in self.batchers.values():
+            batcher.start()
+
+    async def stop(self) -> None:
+        for batcher in self.batchers.values():
+            await batcher.stop()
+
+    def metrics(self) -> dict:
+        return {name: batcher.metrics.summary() for name, batcher in self.batchers.items()}
+
+    def entity_index(self, entity: str) -> int:
+        if entity not in self.kge.entity_to_idx:
+            raise KeyError(f"Entity {entity} is not found")
+        return self.kge.entity_to_idx[entity]
+
+    def relation_index(self, relation: str) -> int:
+        if relation not in self.kge.relation_to_idx:
+            raise KeyError(f"Relation {relation} is not found")
+        return self.kge.relation_to_idx[relation]
+
+    @staticmethod
+    def validate_topk(item) -> None:
+        """ The last element of a prediction item is topk """
+        if not isinstance(item[-1], int) or item[-1] < 1:
+            raise ValueError(f"topk must be a positive integer. Currently:{item[-1]}")
+
+    @staticmethod
+    def format_topk(top_scores: torch.FloatTensor, top_indices: torch.LongTensor, topks: List[int],
+                    idx_to_item) -> List[List]:
+        top_scores = torch.sigmoid(top_scores).float().tolist()
+        return [[(idx_to_item[j], s) for j, s in zip(indices[:k], values[:k])]
+                for indices, values, k in zip(top_indices.tolist(), top_scores, topks)]
+
+    def topk_per_query(self, scores: torch.FloatTensor, topks: List[int], idx_to_item) -> List[List]:
+        top_scores, top_indices = torch.topk(scores, min(max(topks), scores.shape[1]), dim=1)
+        return self.format_topk(top_scores, top_indices, topks, idx_to_item)
+
+    def chunked_topk(self, score_fn: Callable, num_queries: int, num_items: int, k: int):
+        """
+        Top k scores and indices of items per query, where score_fn(rows, items) scores the items (a LongTensor)
+        for the queries rows (a slice). At most max_triples_per_forward scores are computed at once.
+        """
+        k = min(k, num_items)
+        items_per_chunk = min(num_items, self.max_triples_per_forward)
+        rows_per_chunk = max(1, self.max_triples_per_forward // items_per_chunk)
+        top_scores, top_indices = [], []
+        for row_start in range(0, num_queries, rows_per_chunk):
+            rows = slice(row_start, min(row_start + rows_per_chunk, num_queries))
+            best_scores, best_indices = None, None
+            for item_start in range(0, num_items, items_per_chunk):
+                items = torch.arange(item_start, min(item_start + items_per_chunk, num_items))
+                scores, position = torch.topk(score_fn(rows, items), min(k, len(items)), dim=1)
+                indices = items[position]
+                if best_scores is not None:
+                    # Merge the top k of the chunk into the current top k.
+                    scores, indices = torch.cat((best_scores, scores), dim=1), torch.cat((best_indices, indices), dim=1)
+                    scores, position = torch.topk(scores, min(k, scores.shape[1]), dim=1)
+                    indices = torch.gather(indices, 1, position)
+                best_scores, best_indices = scores, indices
+            top_scores.append(best_scores)
+            top_indices.append(best_indices)
+        return torch.cat(top_scores), torch.cat(top_indices)
+
+    @torch.no_grad()
+    def batch_triple_score(self, items: List) -> List[float]:
+        x = torch.LongTensor(items).to(self.kge.model.device)
+        return torch.sigmoid(self.kge.model(x)).flatten().float().tolist()
+
+    @torch.no_grad()
+    def batch_predict_tail(self, items: List) -> List[List]:
+        h, r, topks = zip(*items)
+        # A single forward_k_vs_all call for all (h, r) pairs of the batch.
+        x = torch.LongTensor(np.stack((h, r), axis=1)).to(self.kge.model.device)
+        return self.topk_per_query(self.kge.score_all_tails(x), topks, self.kge.idx_to_entity)
+
+    @torch.no_grad()
+    def batch_predict_head(self, items: List) -> List[List]:
+        r, t, topks = zip(*items)
+        r, t = torch.LongTensor(r), torch.LongTensor(t)
+
+        def score(rows: slice, heads: torch.LongTensor) -> torch.FloatTensor:
+            # (rows x heads, 3) triples scored in a single forward pass.
+            num_rows = len(r[rows])
+            x = torch.stack((heads.repeat(num_rows), r[rows].repeat_interleave(len(heads)),
+                             t[rows].repeat_interleave(len(heads))), dim=1).to(self.kge.model.device)
+            return self.kge.model(x).view(num_rows, len(heads)).cpu()
+
+        top_scores, top_indices = self.chunked_topk(score, len(items), self.kge.num_entities, max(topks))
+        return self.format_topk(top_scores, top_indices, topks, self.kge.idx_to_entity)
+
+    @torch.no_grad()
+    def batch_predict_relation(self, items: List) -> List[List]:
+        h, t, topks = zip(*items)
+        h, t = torch.LongTensor(h), torch.LongTensor(t)
+
+        def score(rows: slice, relations: torch.LongTensor) -> torch.FloatTensor:
+            num_rows = len(h[rows])
+            x = torch.stack((h[rows].repeat_interleave(len(relations)), relations.repeat(num_rows),
+                             t[rows].repeat_interleave(len(relations))), dim=1).to(self.kge.model.device)
+            return self.kge.model(x).view(num_rows, len(relations)).cpu()
+
+        top_scores, top_indices = self.chunked_topk(score, len(items), self.kge.num_relations, max(topks))
+        return self.format_topk(top_scores, top_indices, topks, self.kge.idx_to_relations)
+
+    async def triple_score(self, h: str, r: str, t: str) -> float:
+        return await self.batchers["triple_score"].submit(
+            (self.entity_index(h), self.relation_index(r), self.entity_index(t)))
+
+    async def predict_tail(self, h: str, r: str, topk: int = 10) -> List:
+        return await self.batchers["predict_tail"].submit((self.entity_index(h), self.relation_index(r), topk))
+
+    async def predict_head(self, r: str, t: str, topk: int = 10) -> List:
+        return await self.batchers["predict_head"].submit((self.relation_index(r), self.entity_index(t), topk))
+
+    async def predict_relation(self, h: str, t: str, topk: int = 10) -> List:
+        return await self.batchers["predict_relation"].submit((self.entity_index(h), self.entity_index(t), topk))
+
+    def entity_embedding(self, entity: str) -> List[float]:
+        self.entity_index(entity)
+        return self.kge.get_entity_embeddings([entity])[0].tolist()
+
+    def relation_embedding(self, relation: str) -> List[float]:
+        self.relation_index(relation)
+        return self.kge.get_relation_embeddings([relation])[0].tolist()
+
+
+class Query(BaseModel):
+    h: Optional[str] = None
+    r: Optional[str] = None
+    t: Optional[str] = None
+    topk: int = Field(10, ge=1)
+
+
+def create_app(server: KGEServer) -> FastAPI:
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        server.start()
+        yield
+        await server.stop()
+
+    app = FastAPI(lifespan=lifespan)
+
+    async def answer(coroutine):
+        try:
+            return {"result": await coroutine}
+        except KeyError as e:
+            raise HTTPException(status_code=404, detail=str(e.args[0]))
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
+    @app.get("/")
+    async def root():
+        return {"message": "Hello Dice Embedding User", "model": server.kge.name}
+
+    @app.post("/api/triple_score")
+    async def triple_score(query: Query):
+        return await answer(server.triple_score(query.h, query.r, query.t))
+
+    @app.post("/api/predict_tail")
+    async def predict_tail(query: Query):
+        return await answer(server.predict_tail(query.h, query.r, query.topk))
+
+    @app.post("/api/predict_head")
+    async def predict_head(query: Query):
+        return await answer(server.predict_head(query.r, query.t, query.topk))
+
+    @app.post("/api/predict_relation")
+    async def predict_relation(query: Query):
+        return await answer(server.predict_relation(query.h, query.t, query.topk))
+
+    @app.get("/api/entity_embedding")
+    async def entity_embedding(q: str):
+        try:
+            return {"result": server.entity_embedding(q)}
+        except KeyError as e:
+            raise HTTPException(status_code=404, detail=str(e.args[0]))
+
+    @app.get("/api/relation_embedding")
+    async def relation_embedding(q: str):
+        try:
+            return {"result": server.relation_embedding(q)}
+        except KeyError as e:
+            raise HTTPException(status_code=404, detail=str(e.args[0]))
+
+    @app.get("/metrics")
+    async def metrics():
+        return server.metrics()
+
+    return app
+
+
+def main():
+    args = get_default_arguments()
+    server = KGEServer(KGE(path=args.path), max_batch_size=args.max_batch_size, max_latency_ms=args.max_latency_ms,
+                       max_triples_per_forward=args.max_triples_per_forward)
+    uvicorn.run(create_app(server), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
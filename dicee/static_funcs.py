@@ -1,7 +1,7 @@
 import numpy as np
 import torch
 import datetime
-from typing import Tuple, List
+from typing import Tuple, List, Union
 from .models import Pyke, DistMult, CKeci, Keci, TransE, DeCaL, DualE,\
     ComplEx, AConEx, AConvO, AConvQ, ConvQ, ConvO, ConEx, QMult, OMult, Shallom, LFMult
 from .models.pykeen_models import PykeenKGE
@@ -12,12 +12,13 @@ import json
 import glob
 import functools
 import os
+import sys
 import psutil
 from .models.base_model import BaseKGE
 import pickle
+import bisect
 from collections import defaultdict
-import polars as pl
-import requests
+from collections.abc import Mapping
 import csv
 from .models.ensemble import EnsembleKGE
 
@@ -93,8 +94,148 @@ def load_term_mapping(file_path=str):
         return load_pickle(file_path=file_path+".p")
     except FileNotFoundError:
         print(f"python file not found\t{file_path} with .p extension")
+    import polars as pl
     return pl.read_csv(file_path + ".csv")
 
+
+class StringIndex(Mapping):
+    """
+    Read-only mapping from strings (e.g. entities or relations) to their indices over memory mapped arrays.
+
+    Strings are utf-8 encoded and concatenated into an arena in the order of their indices, i.e., the idx.th string
+    is arena[offsets[idx]:offsets[idx+1]]. A string is resolved via a binary search over the indices sorted by their
+    strings. Hence, no Python object is created per string and a lookup touches only O(log n) pages.
+
+    Arguments
+   ----------
+   arena: np.ndarray
+       utf-8 encoded strings of dtype uint8
+   offsets: np.ndarray
+       Start positions of strings in the arena of shape (num_strings + 1,)
+   order: np.ndarray
+       Indices sorted by their strings of shape (num_strings,)
+   """
+
+    def __init__(self, arena: np.ndarray, offsets: np.ndarray, order: np.ndarray):
+        assert len(offsets) == len(order) + 1, "len(offsets) must be len(order) + 1"
+        self.arena = arena
+        self.offsets = offsets
+        self.order = order
+
+    @classmethod
+    def from_strings(cls, strings: List[str]):
+        """ Construct the index from strings ordered by their indices """
+        encoded = [str(i).encode("utf-8") for i in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(i) for i in encoded], dtype=np.int64)
+        arena = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        order = np.array(sorted(range(len(encoded)), key=encoded.__getitem__), dtype=np.int64)
+        return cls(arena, offsets, order)
+
+    @classmethod
+    def from_mapping(cls, mapping):
+        """ Construct the index from a dictionary {str:idx} or a pandas/polars DataFrame with index and str columns """
+        if isinstance(mapping, StringIndex):
+            return mapping
+        elif isinstance(mapping, dict):
+            strings = [None] * len(mapping)
+            for k, v in mapping.items():
+                strings[v] = k
+        elif "polars" in sys.modules and isinstance(mapping, sys.modules["polars"].DataFrame):
+            strings = mapping.sort("index")[mapping.columns[-1]].to_list()
+        elif isinstance(mapping, pd.DataFrame):
+            strings = mapping.sort_index()[mapping.columns[-1]].to_list()
+        else:
+            raise RuntimeError(f"Unexpected type for a string index: {type(mapping)}")
+        return cls.from_strings(strings)
+
+    @staticmethod
+    def exists(path: str, name: str) -> bool:
+        return all(os.path.isfile(f"{path}/{name}_{i}.npy") for i in ["arena", "offsets", "order"])
+
+    def save(self, path: str, name: str) -> None:
+        """ Save the index into {path}/{name}_arena.npy, {path}/{name}_offsets.npy and {path}/{name}_order.npy """
+        np.save(f"{path}/{name}_arena.npy", self.arena)
+        np.save(f"{path}/{name}_offsets.npy", self.offsets)
+        np.save(f"{path}/{name}_order.npy", self.order)
+
+    @classmethod
+    def load(cls, path: str, name: str, mmap_mode: str = "r"):
+        """ Load the index via memory mapping, i.e., without reading the arrays into memory """
+        return cls(np.load(f"{path}/{name}_arena.npy", mmap_mode=mmap_mode),
+                   np.load(f"{path}/{name}_offsets.npy", mmap_mode=mmap_mode),
+                   np.load(f"{path}/{name}_order.npy", mmap_mode=mmap_mode))
+
+    def _encoded(self, idx) -> bytes:
+        return self.arena[self.offsets[idx]:self.offsets[idx + 1]].tobytes()
+
+    def string(self, idx: int) -> str:
+        idx = int(idx)
+        if not 0 <= idx < len(self):
+            raise KeyError(idx)
+        return self._encoded(idx).decode("utf-8")
+
+    def __getitem__(self, key: str) -> int:
+        encoded = str(key).encode("utf-8")
+        position = bisect.bisect_left(self.order, encoded, key=self._encoded)
+        if position < len(self) and self._encoded(self.order[position]) == encoded:
+            return int(self.order[position])
+        raise KeyError(key)
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def __iter__(self):
+        # Strings are iterated in the order of their indices as in the dictionary mappings.
+        for idx in range(len(self)):
+            yield self._encoded(idx).decode("utf-8")
+
+    def values(self):
+        return range(len(self))
+
+    def items(self):
+        return zip(iter(self), self.values())
+
+    @property
+    def inverse(self):
+        """ Read-only mapping from indices to strings """
+        return IndexToString(self)
+
+
+class IndexToString(Mapping):
+    """ Read-only mapping from indices to strings backed by a StringIndex """
+
+    def __init__(self, string_index: StringIndex):
+        self.string_index = string_index
+
+    def __getitem__(self, idx: int) -> str:
+        return self.string_index.string(idx)
+
+    def __len__(self) -> int:
+        return len(self.string_index)
+
+    def __iter__(self):
+        return iter(range(len(self.string_index)))
+
+    def values(self):
+        return iter(self.string_index)
+
+
+def load_string_index(path: str, name: str) -> Union[StringIndex, dict]:
+    """
+    Load a memory mapped string index (e.g. name='entity_to_idx') stored in path.
+    If it does not exist (former versions), the pickled dictionary or the csv file is loaded into a dictionary.
+    """
+    if StringIndex.exists(path, name):
+        return StringIndex.load(path, name)
+    try:
+        with open(f"{path}/{name}.p", 'rb') as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        column = name.split("_")[0]
+        return {v[column]: k for k, v in pd.read_csv(f"{path}/{name}.csv", index_col=0).to_dict(orient='index').items()}
+
+
 # @TODO: Could these funcs can be merged?
 def select_model(args: dict, is_continual_training: bool = None, storage_path: str = None):
     isinstance(args, dict)
@@ -121,7 +262,7 @@ def select_model(args: dict, is_continual_training: bool = None, storage_path: s
             print('Loading pre-trained model...')
             model, labelling_flag = intialize_model(args)
             try:
-                weights = torch.load(storage_path + '/model.pt', torch.device('cpu'))
+                weights = load_checkpoint(storage_path + '/model.pt')
                 model.load_state_dict(weights)
                 for parameter in model.parameters():
                     parameter.requires_grad = True
@@ -143,7 +284,8 @@ def load_model(path_of_experiment_folder: str, model_name='model.pt',verbose=0)
         print(f'Loading model {model_name}...', end=' ')
     start_time = time.time()
     # (1) Load weights..
-    weights = torch.load(path_of_experiment_folder + f'/{model_name}', torch.device('cpu'))
+    weights = load_checkpoint(path_of_experiment_folder + f'/{model_name}')
+    is_mmap_checkpoint = os.path.isfile(get_mmap_checkpoint_path(path_of_experiment_folder + f'/{model_name}') + "/header.json")
     configs = load_json(path_of_experiment_folder + '/configuration.json')
     reports = load_json(path_of_experiment_folder + '/report.json')
 
@@ -166,12 +308,18 @@ def load_model(path_of_experiment_folder: str, model_name='model.pt',verbose=0)
     if verbose>0:
         print(f'Done! It took {time.time() - start_time:.3f}')
     # (4) Select the model
-    model, _ = intialize_model(configs,verbose)
-    # (5) Put (1) into (4)
-    if isinstance(weights,torch.jit._script.RecursiveScriptModule):
-        model.load_state_dict(weights.state_dict())
+    if is_mmap_checkpoint:
+        # (5) Parameters are not allocated and memory mapped tensors of (1) are used as parameters without a copy.
+        with torch.device("meta"):
+            model, _ = intialize_model(configs, verbose)
+        model.load_state_dict(weights, assign=True)
     else:
-        model.load_state_dict(weights)
+        model, _ = intialize_model(configs,verbose)
+        # (5) Put (1) into (4)
+        if isinstance(weights,torch.jit._script.RecursiveScriptModule):
+            model.load_state_dict(weights.state_dict())
+        else:
+            model.load_state_dict(weights)
     # (6) Set it into eval model.
     for parameter in model.parameters():
         parameter.requires_grad = False
@@ -182,22 +330,9 @@ def load_model(path_of_experiment_folder: str, model_name='model.pt',verbose=0)
     else:
         if verbose>0:
             print('Loading entity and relation indexes...', end=' ')
-        try:
-            # Maybe ? https://docs.python.org/3/library/mmap.html
-            # TODO:CD: Deprecate the pickle usage for data serialization.
-            # TODO: CD: We do not need to keep the mapping in memory
-            with open(path_of_experiment_folder + '/entity_to_idx.p', 'rb') as f:
-                entity_to_idx = pickle.load(f)
-        except FileNotFoundError:
-            entity_to_idx = { v["entity"]:k for k,v in pd.read_csv(f"{path_of_experiment_folder}/entity_to_idx.csv",index_col=0).to_dict(orient='index').items()}
-
-        try:
-            # TODO:CD: Deprecate the pickle usage for data serialization.
-            # TODO: CD: We do not need to keep the mapping in memory
-            with open(path_of_experiment_folder + '/relation_to_idx.p', 'rb') as f:
-                relation_to_idx = pickle.load(f)
-        except FileNotFoundError:
-            relation_to_idx = { v["relation"]:k for k,v in pd.read_csv(f"{path_of_experiment_folder}/relation_to_idx.csv",index_col=0).to_dict(orient='index').items()}
+        # Memory mapped string indexes are opened without materializing dictionaries.
+        entity_to_idx = load_string_index(path_of_experiment_folder, "entity_to_idx")
+        relation_to_idx = load_string_index(path_of_experiment_folder, "relation_to_idx")
         if verbose > 0:
             print(f'Done! It took {time.time() - start_time:.4f}')
         return model, (entity_to_idx, relation_to_idx)
@@ -253,18 +388,8 @@ def load_model_ensemble(path_of_experiment_folder: str) -> Tuple[BaseKGE, Tuple[
     model.eval()
     start_time = time.time()
     print('Loading entity and relation indexes...', end=' ')
-    # TODO: CD: We do not need to keep the mapping in memory
-    # TODO:CD: Deprecate the pickle usage for data serialization.
-
-    entity_to_idx = {v["entity"]: k for k, v in
-                     pd.read_csv(f"{path_of_experiment_folder}/entity_to_idx.csv", index_col=0).to_dict(
-                         orient='index').items()}
-    relation_to_idx = {v["relation"]: k for k, v in
-                     pd.read_csv(f"{path_of_experiment_folder}/relation_to_idx.csv", index_col=0).to_dict(
-                         orient='index').items()}
-
-    assert isinstance(entity_to_idx, dict)
-    assert isinstance(relation_to_idx, dict)
+    entity_to_idx = load_string_index(path_of_experiment_folder, "entity_to_idx")
+    relation_to_idx = load_string_index(path_of_experiment_folder, "relation_to_idx")
     print(f'Done! It took {time.time() - start_time:.4f}')
     return model, (entity_to_idx, relation_to_idx)
 
@@ -274,6 +399,15 @@ def save_numpy_ndarray(*, data: np.ndarray, file_path: str):
         np.save(f, data)
 
 
+def get_numpy_data_type(num: int) -> type:
+    """ Smallest integer type representing indices up to num """
+    assert isinstance(num, int)
+    for dtype in [np.int8, np.int16, np.int32]:
+        if np.iinfo(dtype).max > num:
+            return dtype
+    raise TypeError('Int64?')
+
+
 def numpy_data_type_changer(train_set: np.ndarray, num: int) -> np.ndarray:
     """
     Detect most efficient data type for a given triples
@@ -281,24 +415,92 @@ def numpy_data_type_changer(train_set: np.ndarray, num: int) -> np.ndarray:
     :param num:
     :return:
     """
-    assert isinstance(num, int)
-    if np.iinfo(np.int8).max > num:
-        # print(f'Setting int8,\t {np.iinfo(np.int8).max}')
-        train_set = train_set.astype(np.int8)
-    elif np.iinfo(np.int16).max > num:
-        # print(f'Setting int16,\t {np.iinfo(np.int16).max}')
-        train_set = train_set.astype(np.int16)
-    elif np.iinfo(np.int32).max > num:
-        # print(f'Setting int32,\t {np.iinfo(np.int32).max}')
-        train_set = train_set.astype(np.int32)
-    else:
-        raise TypeError('Int64?')
-    return train_set
+    return train_set.astype(get_numpy_data_type(num))
+
 
+def get_mmap_checkpoint_path(path: str) -> str:
+    """ .../model.pt => .../model_mmap """
+    return path[:-len(".pt")] + "_mmap" if path.endswith(".pt") else path + "_mmap"
 
-def save_checkpoint_model(model, path: str) -> None:
+
+def save_mmap_checkpoint(state_dict: dict, path: str, shard_size: int = None) -> None:
+    """
+    Store a state dict as one raw file per tensor and a header.json describing dtypes, shapes and files.
+
+    Parameters
+    ----------
+    state_dict: dict of tensors
+    path: path of a folder to be created
+    shard_size: if given, tensors are copied to CPU and written in shards of at most shard_size rows, i.e.,
+    a tensor on a GPU is not copied into host memory at once. Each tensor is still stored in a single file.
+
+    Returns
+    -------
+    None
+    """
+    assert shard_size is None or shard_size > 0
+    os.makedirs(path, exist_ok=True)
+    header = dict()
+    for name, tensor in state_dict.items():
+        tensor = tensor.detach()
+        num_rows = tensor.shape[0] if tensor.ndim > 0 else 1
+        step = shard_size if shard_size and tensor.ndim > 0 else max(num_rows, 1)
+        file_name = f"{name}.bin"
+        storage_dtype = None
+        with open(os.path.join(path, file_name), "wb") as file_descriptor:
+            for start in range(0, max(num_rows, 1), step):
+                shard = (tensor[start:start + step] if tensor.ndim > 0 else tensor).cpu().contiguous()
+                # numpy does not support bfloat16, the raw bits are stored.
+                array = shard.view(torch.int16).numpy() if shard.dtype == torch.bfloat16 else shard.numpy()
+                storage_dtype = array.dtype.str
+                array.tofile(file_descriptor)
+        header[name] = {"dtype": str(tensor.dtype).replace("torch.", ""),
+                        "storage_dtype": storage_dtype,
+                        "shape": list(tensor.shape),
+                        "file": file_name}
+    # The header is written at last, i.e., a checkpoint without header.json is incomplete.
+    with open(os.path.join(path, "header.json"), "w") as file_descriptor:
+        json.dump(header, file_descriptor, indent=4)
+
+
+def load_mmap_checkpoint(path: str) -> dict:
+    """
+    Load a state dict stored via save_mmap_checkpoint without reading tensors into memory.
+
+    Tensors are created on top of copy-on-write memory maps of their files. Hence, pages are read on demand and
+    shared between processes loading the same checkpoint.
+    """
+    with open(os.path.join(path, "header.json"), "r") as file_descriptor:
+        header = json.load(file_descriptor)
+    state_dict = dict()
+    for name, info in header.items():
+        dtype = getattr(torch, info["dtype"])
+        shape = tuple(info["shape"])
+        if int(np.prod(shape)) == 0:
+            state_dict[name] = torch.empty(shape, dtype=dtype)
+            continue
+        array = np.memmap(os.path.join(path, info["file"]), dtype=np.dtype(info["storage_dtype"]), mode="c",
+                          shape=shape if len(shape) > 0 else (1,))
+        tensor = torch.from_numpy(array)
+        if dtype == torch.bfloat16:
+            tensor = tensor.view(torch.bfloat16)
+        state_dict[name] = tensor.reshape(shape)
+    return state_dict
+
+
+def load_checkpoint(path: str) -> dict:
+    """ Load a state dict from .../model.pt or, if it exists, from the memory mapped .../model_mmap """
+    mmap_path = get_mmap_checkpoint_path(path)
+    if os.path.isfile(os.path.join(mmap_path, "header.json")):
+        return load_mmap_checkpoint(mmap_path)
+    return torch.load(path, torch.device('cpu'))
+
+
+def save_checkpoint_model(model, path: str, checkpoint_format: str = "pt", shard_size: int = None) -> None:
     """ Store Pytorch model into disk"""
-    if isinstance(model, BaseKGE):
+    if isinstance(model, BaseKGE) and checkpoint_format == "mmap":
+        save_mmap_checkpoint(model.state_dict(), get_mmap_checkpoint_path(path), shard_size=shard_size)
+    elif isinstance(model, BaseKGE):
         torch.save(model.state_dict(), path)
     elif isinstance(model, EnsembleKGE):
         # path comes with ../model_...
@@ -310,11 +512,13 @@ def save_checkpoint_model(model, path: str) -> None:
 
 
 def store(trained_model, model_name: str = 'model', full_storage_path: str = None,
-          save_embeddings_as_csv=False) -> None:
+          save_embeddings_as_csv=False, checkpoint_format: str = "pt", shard_size: int = None) -> None:
     assert full_storage_path is not None
     assert isinstance(model_name, str)
     assert len(model_name) > 1
-    save_checkpoint_model(model=trained_model, path=full_storage_path + f'/{model_name}.pt')
+    assert checkpoint_format in ["pt", "mmap"]
+    save_checkpoint_model(model=trained_model, path=full_storage_path + f'/{model_name}.pt',
+                          checkpoint_format=checkpoint_format, shard_size=shard_size)
 
     if save_embeddings_as_csv:
         entity_emb, relation_ebm = trained_model.get_embeddings()
@@ -360,6 +564,29 @@ def add_noisy_triples(train_set: pd.DataFrame, add_noise_rate: float) -> pd.Data
     assert num_triples + num_noisy_triples == len(train_set)
     return train_set
 
+def exists_memory_map_train_set(path: str) -> bool:
+    """ Whether an experiment folder contains a memory map of indexed training triples """
+    if not os.path.isfile(path + '/memory_map_details.json'):
+        return False
+    with open(path + '/memory_map_details.json', 'r') as file_descriptor:
+        file_name = json.load(file_descriptor).get("file", "memory_map_train_set.npy")
+    return os.path.isfile(os.path.join(path, file_name))
+
+
+def load_memory_map_train_set(path: str) -> Tuple[np.memmap, dict]:
+    """
+    Memory map of indexed training triples described in {path}/memory_map_details.json.
+    The data of a .npy file, e.g. train_set.npy of --backend polars_streaming, starts after its header, i.e., at offset.
+    """
+    with open(path + '/memory_map_details.json', 'r') as file_descriptor:
+        memory_map_details = json.load(file_descriptor)
+    return np.memmap(os.path.join(path, memory_map_details.get("file", "memory_map_train_set.npy")),
+                     mode='r',
+                     dtype=memory_map_details["dtype"],
+                     shape=tuple(memory_map_details["shape"]),
+                     offset=memory_map_details.get("offset", 0)), memory_map_details
+
+
 def read_or_load_kg(args, cls):
     print('*** Read or Load Knowledge Graph  ***')
     start_time = time.time()
@@ -377,7 +604,8 @@ def read_or_load_kg(args, cls):
              path_for_deserialization=args.path_experiment_folder if hasattr(args, 'path_experiment_folder') else None,
              backend=args.backend,
              training_technique=args.scoring_technique,
-             separator=args.separator)
+             separator=args.separator,
+             preprocessing_cache_dir=getattr(args, "preprocessing_cache_dir", None))
     print(f'Preprocessing took: {time.time() - start_time:.3f} seconds')
     # (2) Share some info about data for easy access.
     print(kg.description_of_input)
@@ -631,6 +859,7 @@ def evaluate(entity_to_idx, scores, easy_answers, hard_answers):
 
 
 def download_file(url, destination_folder="."):
+    import requests
     response = requests.get(url, stream=True)
     # lazy import
     from urllib.parse import urlparse
@@ -665,6 +894,7 @@ def download_files_from_url(base_url:str, destination_folder=".")->None:
     except ModuleNotFoundError:
         print("Please install the 'beautifulsoup4' package by running: pip install beautifulsoup4")
         raise
+    import requests
     response = requests.get(base_url)
     if response.status_code == 200:
         soup = BeautifulSoup(response.text, 'html.parser')
@@ -724,7 +954,7 @@ def from_pretrained_model_write_embeddings_into_csv(path: str) -> None:
         entity_emb, relation_emb = write_csv_from_model_parallel(path)
     else:
         # Load model
-        model = torch.load(os.path.join(path, "model.pt"))
+        model = load_checkpoint(os.path.join(path, "model.pt"))
         # Assuming model has a get_embeddings method
         entity_emb, relation_emb = model["entity_embeddings.weight"], model["relation_embeddings.weight"]
     str_entity = pd.read_csv(f"{path}/entity_to_idx.csv", index_col=0)["entity"]
@@ -1,5 +1,7 @@
+import os
+import pickle
 import torch
-from typing import Dict, Tuple, List, Iterable
+from typing import Dict, Tuple, List, Iterable, Union
 import numpy as np
 from tqdm import tqdm
 
@@ -9,6 +11,175 @@ def make_iterable_verbose(iterable_object, verbose, desc="Default", position=Non
     else:
         return iterable_object
 
+
+class FilterIndex:
+    """
+    Compressed sparse row (CSR) index of the entities (or relations) to be filtered for a given key.
+
+    A key is a pair of integer indices, e.g. (head entity, relation) for er_vocab, (relation, tail entity) for
+    re_vocab or (head entity, tail entity) for ee_vocab. Keys are packed into a single int64 and stored in a sorted
+    array so that a batch of keys is resolved with one np.searchsorted call.
+
+    Arguments
+   ----------
+   keys: np.ndarray
+       Sorted packed keys of shape (num_keys,)
+   indptr: np.ndarray
+       Row pointers of shape (num_keys + 1,)
+   indices: np.ndarray
+       Filtered indices of all keys, i.e. indices[indptr[i]:indptr[i+1]] belong to keys[i]
+   """
+    shift = 32
+
+    def __init__(self, keys: np.ndarray, indptr: np.ndarray, indices: np.ndarray):
+        assert len(keys) + 1 == len(indptr), "len(indptr) must be len(keys) + 1"
+        self.keys = keys
+        self.indptr = indptr
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def pack(cls, first, second) -> np.ndarray:
+        return (np.asarray(first, dtype=np.int64) << cls.shift) | np.asarray(second, dtype=np.int64)
+
+    @classmethod
+    def from_triples(cls, triples: np.ndarray, key_columns: Tuple[int, int] = (0, 1), value_column: int = 2):
+        """ Construct a filter index from integer indexed triples, e.g. key_columns=(0,1) and value_column=2 for er_vocab """
+        triples = np.asarray(triples)
+        assert triples.ndim == 2 and triples.shape[1] == 3
+        keys = cls.pack(triples[:, key_columns[0]], triples[:, key_columns[1]])
+        values = triples[:, value_column].astype(np.int64)
+        # (1) Sort by keys and values and remove duplicates.
+        order = np.lexsort((values, keys))
+        keys, values = keys[order], values[order]
+        if len(keys) > 0:
+            unique = np.ones(len(keys), dtype=bool)
+            unique[1:] = (keys[1:] != keys[:-1]) | (values[1:] != values[:-1])
+            keys, values = keys[unique], values[unique]
+        # (2) Row pointers.
+        unique_keys, counts = np.unique(keys, return_counts=True)
+        indptr = np.zeros(len(unique_keys) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        return cls(unique_keys, indptr, values)
+
+    @classmethod
+    def from_vocab(cls, vocab: Dict[Tuple, List]):
+        """ Construct a filter index from a dictionary mapping a pair of indices to a list of indices """
+        if isinstance(vocab, cls):
+            return vocab
+        first, second, values = [], [], []
+        for (a, b), filtered in vocab.items():
+            first.extend([a] * len(filtered))
+            second.extend([b] * len(filtered))
+            values.extend(filtered)
+        triples = np.zeros((len(values), 3), dtype=np.int64)
+        triples[:, 0], triples[:, 1], triples[:, 2] = first, second, values
+        return cls.from_triples(triples)
+
+    @staticmethod
+    def exists(path: str, name: str) -> bool:
+        return all(os.path.isfile(f"{path}/{name}_{i}.npy") for i in ["keys", "indptr", "indices"])
+
+    def save(self, path: str, name: str) -> None:
+        """ Save the index into {path}/{name}_keys.npy, {path}/{name}_indptr.npy and {path}/{name}_indices.npy """
+        np.save(f"{path}/{name}_keys.npy", self.keys)
+        np.save(f"{path}/{name}_indptr.npy", self.indptr)
+        np.save(f"{path}/{name}_indices.npy", self.indices)
+
+    @classmethod
+    def load(cls, path: str, name: str, mmap_mode: str = "r"):
+        """ Load the index via memory mapping, i.e., without reading the arrays into memory """
+        return cls(np.load(f"{path}/{name}_keys.npy", mmap_mode=mmap_mode),
+                   np.load(f"{path}/{name}_indptr.npy", mmap_mode=mmap_mode),
+                   np.load(f"{path}/{name}_indices.npy", mmap_mode=mmap_mode))
+
+    def lookup(self, first, second) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Retrieve filtered indices of a batch of keys.
+
+        Returns
+        -------
+        (row, col) such that col[i] must be filtered in the row[i].th item of the batch
+        """
+        queries = self.pack(first, second)
+        if len(self.keys) == 0 or len(queries) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        # (1) Locate queries in the sorted keys.
+        position = np.searchsorted(self.keys, queries)
+        position = np.minimum(position, len(self.keys) - 1)
+        found = self.keys[position] == queries
+        # (2) Number of filtered indices per query.
+        starts = self.indptr[position]
+        lengths = np.where(found, self.indptr[position + 1] - starts, 0)
+        # (3) Flatten the ranges [starts[i], starts[i]+lengths[i]).
+        row = np.repeat(np.arange(len(queries), dtype=np.int64), lengths)
+        offsets = np.cumsum(lengths) - lengths
+        col = self.indices[np.repeat(starts - offsets, lengths) + np.arange(lengths.sum(), dtype=np.int64)]
+        return row, np.asarray(col, dtype=np.int64)
+
+
+def load_filter_index(path: str, name: str) -> Union[FilterIndex, Dict[Tuple, List]]:
+    """
+    Load a memory mapped filter index (e.g. name='er_vocab') stored in path.
+    If it does not exist, the pickled dictionary (e.g. byte pair encoded vocabularies or former versions) is loaded.
+    """
+    if FilterIndex.exists(path, name):
+        return FilterIndex.load(path, name)
+    with open(f"{path}/{name}.p", "rb") as f:
+        return pickle.load(f)
+
+
+def filtered_ranks(scores: torch.Tensor, targets, filter_index: FilterIndex = None, first=None, second=None,
+                   extra_filter: Tuple[np.ndarray, np.ndarray] = None) -> np.ndarray:
+    """
+    Compute filtered ranks of targets in a batch of scores.
+
+    (1) Scores of all filtered indices are set to -inf with a single scatter, (2) the target scores are restored, and
+    (3) the rank of a target is the number of scores strictly greater than the target score plus one. Ties are
+    resolved realistically, i.e., the mean rank among candidates having the target score is taken, so that a model
+    assigning the same score to all candidates is not ranked first. NaN target scores are ranked last.
+
+    Parameters
+    ----------
+    scores: torch.Tensor of shape (batch_size, num_candidates). Modified in-place.
+    targets: indices of targets of shape (batch_size,)
+    filter_index: FilterIndex
+    first: first items of keys of shape (batch_size,)
+    second: second items of keys of shape (batch_size,)
+    extra_filter: additional (row, col) pairs to be filtered
+
+    Returns
+    -------
+    np.ndarray of (possibly fractional) ranks of shape (batch_size,)
+    """
+    targets = torch.as_tensor(np.asarray(targets, dtype=np.int64), device=scores.device)
+    batch_idx = torch.arange(len(targets), device=scores.device)
+    # (1) Store the assigned scores of targets.
+    target_values = scores[batch_idx, targets].clone()
+    # (2) Filter.
+    rows, cols = [], []
+    if filter_index is not None:
+        row, col = filter_index.lookup(first, second)
+        rows.append(row)
+        cols.append(col)
+    if extra_filter is not None:
+        rows.append(extra_filter[0])
+        cols.append(extra_filter[1])
+    if rows:
+        row = torch.from_numpy(np.concatenate(rows)).to(scores.device)
+        col = torch.from_numpy(np.concatenate(cols)).to(scores.device)
+        scores[row, col] = -torch.inf
+    # (3) Insert target scores back.
+    scores[batch_idx, targets] = target_values
+    # (4) Rank: 1 + number of candidates having greater scores + half of the other candidates having the same score.
+    num_greater = (scores > target_values.unsqueeze(1)).sum(dim=1)
+    num_ties = (scores == target_values.unsqueeze(1)).sum(dim=1) - 1
+    ranks = 1 + num_greater.double() + num_ties.double() / 2
+    ranks[torch.isnan(target_values)] = scores.shape[1]
+    return ranks.cpu().numpy()
+
 @torch.no_grad()
 def evaluate_lp(model=None, triple_idx=None, num_entities=None, er_vocab: Dict[Tuple, List]=None,
                 re_vocab: Dict[Tuple, List]=None,
@@ -22,6 +193,8 @@ def evaluate_lp(model=None, triple_idx=None, num_entities=None, er_vocab: Dict[T
     model.eval()
     print(info)
     print(f'Num of triples {len(triple_idx)}')
+    # CSR filter indexes are resolved in a batch fashion
+    er_vocab, re_vocab = FilterIndex.from_vocab(er_vocab), FilterIndex.from_vocab(re_vocab)
     hits = dict()
     reciprocal_ranks = []
     # Iterate over test triples
@@ -97,9 +270,10 @@ def evaluate_lp(model=None, triple_idx=None, num_entities=None, er_vocab: Dict[T
         batch_size_current = len(batch_triples)
         
         # (1) Extract heads, relations, and tails for the batch
-        h_batch = torch.tensor([data_point[0] for data_point in batch_triples])
-        r_batch = torch.tensor([data_point[1] for data_point in batch_triples])
-        t_batch = torch.tensor([data_point[2] for data_point in batch_triples])
+        batch_triples = np.asarray(batch_triples, dtype=np.int64)
+        h_batch = torch.from_numpy(batch_triples[:, 0])
+        r_batch = torch.from_numpy(batch_triples[:, 1])
+        t_batch = torch.from_numpy(batch_triples[:, 2])
 
         # Initialize score tensors
         predictions_tails = torch.zeros(batch_size_current, num_entities)
@@ -138,58 +312,15 @@ def evaluate_lp(model=None, triple_idx=None, num_entities=None, er_vocab: Dict[T
             predictions_heads[:, chunk_start:chunk_end] = preds_heads
             del x_heads
     
-        # Iterating one by one is not good when you are using batch norm
-        for i in range(0, batch_size_current):
-        # (1) Get a triple (head entity, relation, tail entity)
-            h = h_batch[i].item()
-            r = r_batch[i].item()
-            t = t_batch[i].item()
-
-            # 3. Computed filtered ranks for missing tail entities.
-            # 3.1. Compute filtered tail entity rankings
-            filt_tails = er_vocab[(h, r)]
-            filt_tails_set = set(filt_tails) - {t}
-            filt_tails_indices = list(filt_tails_set)
-            # 3.2 Get the predicted target's score
-            target_value = predictions_tails[i, t].item()
-            # 3.3 Filter scores of all triples containing filtered tail entities
-            predictions_tails[i, filt_tails_indices] = -np.Inf
-            # 3.4 Reset the target's score
-            predictions_tails[i, t] = target_value
-            # 3.5. Sort the score
-            _, sort_idxs = torch.sort(predictions_tails[i], descending=True)
-            sort_idxs = sort_idxs.detach()
-            filt_tail_entity_rank = np.where(sort_idxs == t)[0][0]
-
-            # 4. Computed filtered ranks for missing head entities.
-            # 4.1. Retrieve head entities to be filtered
-            filt_heads = re_vocab[(r, t)]
-            filt_heads_set = set(filt_heads) - {h}
-            filt_heads_indices = list(filt_heads_set)
-            # 4.2 Get the predicted target's score
-            target_value = predictions_heads[i, h].item()
-            # 4.3 Filter scores of all triples containing filtered head entities.
-            predictions_heads[i, filt_heads_indices] = -np.Inf
-            predictions_heads[i, h] = target_value
-            _, sort_idxs = torch.sort(predictions_heads[i], descending=True)
-            sort_idxs = sort_idxs.detach()
-            filt_head_entity_rank = np.where(sort_idxs == h)[0][0]
-
-            # 4. Add 1 to ranks as numpy array first item has the index of 0.
-            filt_head_entity_rank += 1
-            filt_tail_entity_rank += 1
-
-            rr = 1.0 / filt_head_entity_rank + (1.0 / filt_tail_entity_rank)
-            # 5. Store reciprocal ranks.
-            reciprocal_ranks.append(rr)
-            # print(f'{i}.th triple: mean reciprical rank:{rr}')
-
-            # 4. Compute Hit@N
-            for hits_level in range(1, 11):
-                res = 1 if filt_head_entity_rank <= hits_level else 0
-                res += 1 if filt_tail_entity_rank <= hits_level else 0
-                if res > 0:
-                    hits.setdefault(hits_level, []).append(res)
+        # (3) Computed filtered ranks for missing tail and head entities.
+        filt_tail_entity_ranks = filtered_ranks(predictions_tails, t_batch, er_vocab, first=h_batch, second=r_batch)
+        filt_head_entity_ranks = filtered_ranks(predictions_heads, h_batch, re_vocab, first=r_batch, second=t_batch)
+        # (4) Store reciprocal ranks.
+        reciprocal_ranks.extend((1.0 / filt_head_entity_ranks + 1.0 / filt_tail_entity_ranks).tolist())
+        # (5) Compute Hit@N
+        for hits_level in range(1, 11):
+            res = (filt_head_entity_ranks <= hits_level).astype(int) + (filt_tail_entity_ranks <= hits_level)
+            hits.setdefault(hits_level, []).extend(res[res > 0].tolist())
 
     mean_reciprocal_rank = sum(reciprocal_ranks) / (float(len(triple_idx) * 2))
 
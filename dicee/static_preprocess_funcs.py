@@ -48,6 +48,8 @@ def preprocesses_input_args(args):
                                    'train_val_test'], f'Unexpected input for eval_model ***\t{args.eval_model}\t***'
     if args.eval_model == 'None':
         args.eval_model = None
+    if getattr(args, "preprocessing_cache_dir", None) == 'None':
+        args.preprocessing_cache_dir = None
     # reciprocal checking
     if args.scoring_technique in ["AllvsAll", "1vsSample", "KvsAll", "1vsAll", "KvsSample"]:
         args.apply_reciprical_or_noise = True
@@ -57,7 +59,7 @@ def preprocesses_input_args(args):
         raise KeyError(f'Unexpected input for scoring_technique \t{args.scoring_technique}')
     if args.sample_triples_ratio is not None:
         assert 1.0 >= args.sample_triples_ratio >= 0.0
-    assert args.backend in ["pandas", "polars", "rdflib"]
+    assert args.backend in ["pandas", "polars", "polars_streaming", "rdflib"]
     sanity_checking_with_arguments(args)
     if args.model == 'Shallom':
         args.scoring_technique = 'KvsAll'
@@ -66,6 +68,23 @@ def preprocesses_input_args(args):
         args.normalization = None
     assert args.normalization in [None, 'LayerNorm', 'BatchNorm1d']
 
+    if args.sparse_embeddings:
+        assert args.scoring_technique in ["NegSample", "1vsSample"], \
+            f"sparse_embeddings requires NegSample or 1vsSample. Currently:{args.scoring_technique}"
+        assert args.trainer in ["torchCPUTrainer", "torchHogwild"], \
+            f"sparse_embeddings requires torchCPUTrainer or torchHogwild. Currently:{args.trainer}"
+
+    if args.sparse_targets:
+        assert args.scoring_technique == "KvsAll", \
+            f"sparse_targets requires KvsAll. Currently:{args.scoring_technique}"
+
+    if args.snapshot_every_n_batches or args.resume_from:
+        assert args.trainer in ["torchCPUTrainer", "torchDDP"], \
+            f"Snapshots are available for torchCPUTrainer and torchDDP. Currently:{args.trainer}"
+    if args.snapshot_every_n_batches and args.gradient_accumulation_steps > 1:
+        assert args.snapshot_every_n_batches % args.gradient_accumulation_steps == 0, \
+            "snapshot_every_n_batches must be a multiple of gradient_accumulation_steps"
+
     if args.model=="BytE":
         args.byte_pair_encoding=True
     return args
@@ -137,3 +156,44 @@ def mapping_from_first_two_cols_to_third(train_set_idx):
     for s_idx, p_idx, o_idx in train_set_idx:
         store.setdefault((s_idx, p_idx), list()).append(o_idx)
     return store
+
+
+@timeit
+def group_by_key_columns(train_set_idx: np.ndarray, key_columns: Tuple[int, int] = (0, 1),
+                         value_column: int = 2) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Group values by unique keys via sorting, e.g. (h,r) => [t] for key_columns=(0,1) and value_column=2.
+
+    Unlike mapping_from_first_two_cols_to_third, no Python objects are created per triple. Values of the i.th key
+    are values[offsets[i]:offsets[i + 1]].
+
+    Parameters
+    ----------
+    train_set_idx: np.ndarray of integer indexed triples
+    key_columns: columns of keys
+    value_column: column of values
+
+    Returns
+    -------
+    keys: np.ndarray of shape (num unique keys, 2)
+    offsets: np.ndarray of shape (num unique keys + 1,)
+    values: np.ndarray of shape (num unique key-value pairs,)
+    """
+    assert len(train_set_idx) > 0
+    first = np.asarray(train_set_idx[:, key_columns[0]], dtype=np.int64)
+    second = np.asarray(train_set_idx[:, key_columns[1]], dtype=np.int64)
+    values = np.asarray(train_set_idx[:, value_column], dtype=np.int64)
+    # (1) Sort by first, second and value.
+    order = np.lexsort((values, second, first))
+    first, second, values = first[order], second[order], values[order]
+    # (2) Remove duplicated triples.
+    unique = np.ones(len(values), dtype=bool)
+    unique[1:] = (first[1:] != first[:-1]) | (second[1:] != second[:-1]) | (values[1:] != values[:-1])
+    first, second, values = first[unique], second[unique], values[unique]
+    # (3) Boundaries of groups.
+    start = np.ones(len(values), dtype=bool)
+    start[1:] = (first[1:] != first[:-1]) | (second[1:] != second[:-1])
+    start_idx = np.flatnonzero(start)
+    keys = np.stack((first[start_idx], second[start_idx]), axis=1)
+    offsets = np.append(start_idx, len(values)).astype(np.int64)
+    return keys, offsets, values
@@ -7,6 +7,7 @@ from dicee.callbacks import ASWA, Eval, KronE, PrintCallback, AccumulateEpochLos
 from dicee.dataset_classes import construct_dataset
 from .torch_trainer import TorchTrainer
 from .torch_trainer_ddp import TorchDDPTrainer
+from .torch_trainer_hogwild import TorchHogwildTrainer
 from .model_parallelism import TensorParallel
 from ..models.ensemble import EnsembleKGE
 from ..static_funcs import timeit
@@ -22,16 +23,18 @@ def load_term_mapping(file_path=str):
     return polars.read_csv(file_path + ".csv")
 
 
-def initialize_trainer(args, callbacks)->TorchTrainer | TensorParallel | TorchDDPTrainer | pl.Trainer:
+def initialize_trainer(args, callbacks)->TorchTrainer | TorchHogwildTrainer | TensorParallel | TorchDDPTrainer | pl.Trainer:
     if args.trainer == 'torchCPUTrainer':
         print('Initializing TorchTrainer CPU Trainer...', end='\t')
         trainer = TorchTrainer(args, callbacks=callbacks)
+    elif args.trainer == 'torchHogwild':
+        print('Initializing TorchHogwildTrainer CPU Trainer...', end='\t')
+        trainer = TorchHogwildTrainer(args, callbacks=callbacks)
     elif args.trainer == 'TP':
         print('Initializing TensorParallel...', end='\t')
         trainer= TensorParallel(args, callbacks=callbacks)
     elif args.trainer == 'torchDDP':
-        assert torch.cuda.is_available()
-        print('Initializing TorchDDPTrainer GPU', end='\t')
+        print('Initializing TorchDDPTrainer', end='\t')
         trainer = TorchDDPTrainer(args, callbacks=callbacks)
     elif args.trainer == 'PL':
         print('Initializing Pytorch-lightning Trainer', end='\t')
@@ -202,18 +205,20 @@ class DICE_Trainer:
     def init_dataset(self) -> torch.utils.data.Dataset:
         print('Initializing Dataset...', end='\t')
         if isinstance(self.trainer.dataset,KG):
-            # Create a memory map of training dataset to reduce the memory usage
-            train_set_shape=self.trainer.dataset.train_set.shape
-            train_set_dtype=self.trainer.dataset.train_set.dtype
-            path_memory_map=self.trainer.dataset.path_for_serialization + '/memory_map_train_set.npy'
-            memmap_kg = np.memmap(path_memory_map, dtype=train_set_dtype, mode='w+', shape=train_set_shape)
-            memmap_kg[:] = self.trainer.dataset.train_set[:]
-            memmap_kg[:].flush()
-            del memmap_kg
-            self.trainer.dataset.train_se = np.memmap(path_memory_map,
-                                             mode='r',
-                                             dtype=train_set_dtype,
-                                             shape=train_set_shape)
+            # With --backend polars_streaming, training triples are already memory mapped from train_set.npy.
+            if not isinstance(self.trainer.dataset.train_set, np.memmap):
+                # Create a memory map of training dataset to reduce the memory usage
+                train_set_shape=self.trainer.dataset.train_set.shape
+                train_set_dtype=self.trainer.dataset.train_set.dtype
+                path_memory_map=self.trainer.dataset.path_for_serialization + '/memory_map_train_set.npy'
+                memmap_kg = np.memmap(path_memory_map, dtype=train_set_dtype, mode='w+', shape=train_set_shape)
+                memmap_kg[:] = self.trainer.dataset.train_set[:]
+                memmap_kg[:].flush()
+                del memmap_kg
+                self.trainer.dataset.train_se = np.memmap(path_memory_map,
+                                                 mode='r',
+                                                 dtype=train_set_dtype,
+                                                 shape=train_set_shape)
             train_dataset = construct_dataset(train_set=self.trainer.dataset.train_set,
                                               valid_set=self.trainer.dataset.valid_set,
                                               test_set=self.trainer.dataset.test_set,
@@ -227,7 +232,8 @@ class DICE_Trainer:
                                               neg_ratio=self.args.neg_ratio,
                                               label_smoothing_rate=self.args.label_smoothing_rate,
                                               byte_pair_encoding=self.args.byte_pair_encoding,
-                                              block_size=self.args.block_size)
+                                              block_size=self.args.block_size,
+                                              sparse_targets=getattr(self.args, "sparse_targets", False))
         else:
             assert isinstance(self.trainer.dataset, np.memmap), ("Train dataset must be an instance of memmap. "
                                                                  f"Currently, {type(np.memmap)}!")
@@ -249,7 +255,8 @@ class DICE_Trainer:
                                               neg_ratio=self.args.neg_ratio,
                                               label_smoothing_rate=self.args.label_smoothing_rate,
                                               byte_pair_encoding=self.args.byte_pair_encoding,
-                                              block_size=self.args.block_size)
+                                              block_size=self.args.block_size,
+                                              sparse_targets=getattr(self.args, "sparse_targets", False))
 
 
         return train_dataset
@@ -283,7 +290,9 @@ class DICE_Trainer:
                 assert isinstance(model,EnsembleKGE)
             else:
                 self.trainer.fit(model, train_dataloaders=self.init_dataloader(self.init_dataset()))
-
+            if isinstance(self.trainer, TorchTrainer) and self.trainer.epoch_timings:
+                # Data wait and compute times show whether training is input-bound or compute-bound.
+                self.report['epoch_timings'] = self.trainer.epoch_timings
 
             return model, form_of_labelling
         else:
@@ -329,7 +338,8 @@ class DICE_Trainer:
                                   form_of_labelling=form_of_labelling,
                                   scoring_technique=self.args.scoring_technique,
                                   neg_ratio=self.args.neg_ratio,
-                                  label_smoothing_rate=self.args.label_smoothing_rate)))
+                                  label_smoothing_rate=self.args.label_smoothing_rate,
+                                  sparse_targets=getattr(self.args, "sparse_targets", False))))
 
             res = self.evaluator.eval_with_data(dataset=dataset, trained_model=model, triple_idx=test_set_for_i_th_fold,
                                                 form_of_labelling=form_of_labelling)
@@ -0,0 +1,55 @@
+import os
+import random
+import numpy as np
+import torch
+
+
+def get_rng_states() -> dict:
+    """ Random number generator states of python, numpy, and torch """
+    return {"python": random.getstate(),
+            "numpy": np.random.get_state(),
+            "torch": torch.get_rng_state(),
+            "cuda": torch.cuda.get_rng_state_all() if torch.cuda.is_available() else None}
+
+
+def set_rng_states(states: dict) -> None:
+    random.setstate(states["python"])
+    np.random.set_state(states["numpy"])
+    torch.set_rng_state(states["torch"])
+    if states["cuda"] is not None and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(states["cuda"])
+
+
+def get_snapshot_path(path: str) -> str:
+    """ A snapshot file or a folder containing snapshot.pt """
+    if os.path.isdir(path):
+        path = os.path.join(path, "snapshot.pt")
+    return path
+
+
+def save_snapshot(path: str, snapshot: dict) -> None:
+    """
+    Write a snapshot atomically: a preemption during writing leaves the previous snapshot intact.
+
+    Parameters
+    ----------
+    path: path of the snapshot file
+    snapshot: dict containing model, optimizer and rng states, epoch, batch cursor and loss_history
+
+    Returns
+    -------
+    None
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as file_descriptor:
+        torch.save(snapshot, file_descriptor)
+        file_descriptor.flush()
+        os.fsync(file_descriptor.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path: str) -> dict:
+    path = get_snapshot_path(path)
+    assert os.path.isfile(path), f"Snapshot {path} does not exist"
+    # RNG states of python and numpy are not tensors.
+    return torch.load(path, map_location="cpu", weights_only=False)
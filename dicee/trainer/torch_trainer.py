@@ -1,10 +1,98 @@
 import torch
-from typing import Tuple
+from typing import Iterator, Tuple
 from dicee.abstracts import AbstractTrainer
 import time
 import os
+import queue
+import threading
 import psutil
 from tqdm import tqdm
+from .snapshot import get_rng_states, set_rng_states, get_snapshot_path, save_snapshot, load_snapshot
+
+
+def pin_batch(batch):
+    """ Page-lock tensors of a mini-batch to copy them into GPU memory asynchronously """
+    if isinstance(batch, torch.Tensor):
+        return batch.pin_memory()
+    elif isinstance(batch, (tuple, list)):
+        return type(batch)(pin_batch(i) for i in batch)
+    return batch
+
+
+def set_batch_generator(dataloader: torch.utils.data.DataLoader, generator: torch.Generator) -> None:
+    """
+    Draw random numbers of shuffling and, if mini-batches are constructed in the main process, of negative sampling
+    from generator instead of the global generator, e.g., to not race with the training loop on another thread.
+    """
+    dataloader.generator = generator
+    if isinstance(dataloader.sampler, torch.utils.data.RandomSampler):
+        dataloader.sampler.generator = generator
+    if dataloader.num_workers == 0:
+        # Workers draw from their own global generators seeded by the dataloader.
+        dataloader.dataset.generator = generator
+
+
+class BatchPrefetcher:
+    """
+        Construct next mini-batches on a background thread while the current mini-batch is being trained on.
+
+        Arguments
+       ----------
+       iterator: iterator over mini-batches, e.g., iter(torch.utils.data.DataLoader)
+
+       num_prefetch: number of mini-batches to be constructed in advance
+
+       pin_memory: page-lock constructed mini-batches
+   """
+
+    def __init__(self, iterator: Iterator, num_prefetch: int = 2, pin_memory: bool = False):
+        assert num_prefetch > 0
+        self.iterator = iterator
+        self.pin_memory = pin_memory
+        self.queue = queue.Queue(maxsize=num_prefetch)
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._produce, daemon=True)
+        self.thread.start()
+
+    def _put(self, item) -> bool:
+        while not self.stop_event.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self) -> None:
+        try:
+            for batch in self.iterator:
+                if self.pin_memory:
+                    batch = pin_batch(batch)
+                if not self._put((batch, None)):
+                    return
+        except Exception as e:
+            # Raise the error in the training loop.
+            self._put((None, e))
+            return
+        self._put((StopIteration, None))
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        batch, error = self.queue.get()
+        if error is not None:
+            self.close()
+            raise error
+        if batch is StopIteration:
+            self.close()
+            raise StopIteration
+        return batch
+
+    def close(self) -> None:
+        self.stop_event.set()
+        self.thread.join()
+
 
 class TorchTrainer(AbstractTrainer):
     """
@@ -25,6 +113,10 @@ class TorchTrainer(AbstractTrainer):
         self.model = None
         self.train_dataloaders = None
         self.training_step = None
+        # Generator of mini-batch construction on the prefetching thread
+        self.batch_generator = None
+        # Data wait time, compute time and throughput per epoch
+        self.epoch_timings = []
         torch.manual_seed(self.attributes.random_seed)
         torch.cuda.manual_seed_all(self.attributes.random_seed)
         if hasattr(self.attributes,"gpus") and self.attributes.gpus and torch.cuda.is_available():
@@ -89,25 +181,74 @@ class TorchTrainer(AbstractTrainer):
               f'| BatchSize:{self.train_dataloaders.batch_size} '
               f'| EpochBatchsize:{len(train_dataloaders)}')
 
-        for epoch in (tqdm_bar := tqdm(range(self.attributes.max_epochs))):
+        num_prefetch_batches = getattr(self.attributes, "num_prefetch_batches", 0)
+        if num_prefetch_batches:
+            # Mini-batches constructed on another thread do not consume random numbers of the training loop.
+            self.batch_generator = torch.Generator().manual_seed(self.attributes.random_seed)
+            set_batch_generator(self.train_dataloaders, self.batch_generator)
+        # (2) Resume from a snapshot.
+        start_epoch, snapshot = 0, None
+        if getattr(self.attributes, "resume_from", None):
+            snapshot = self._load_snapshot(self.attributes.resume_from)
+            start_epoch = snapshot["epoch"]
+        snapshot_every_n_batches = getattr(self.attributes, "snapshot_every_n_batches", None)
+        for epoch in (tqdm_bar := tqdm(range(start_epoch, self.attributes.max_epochs))):
             epoch_loss = 0
             i = 0
-            construct_mini_batch_time = None
+            if snapshot is not None:
+                # Shuffling of the dataloader depends on the rng states at the start of an epoch.
+                set_rng_states(snapshot["epoch_rng_states"])
+                assert (self.batch_generator is not None) == ("batch_generator" in snapshot["epoch_rng_states"]), \
+                    "num_prefetch_batches must be given if and only if it was given in the interrupted run"
+                if self.batch_generator is not None:
+                    self.batch_generator.set_state(snapshot["epoch_rng_states"]["batch_generator"])
+                epoch_loss = snapshot["epoch_loss"]
+            epoch_rng_states = get_rng_states()
+            if self.batch_generator is not None:
+                epoch_rng_states["batch_generator"] = self.batch_generator.get_state()
+            data_iterator = iter(self.train_dataloaders)
+            if snapshot is not None:
+                # Skip mini-batches seen before the snapshot and continue with the rng states at the batch cursor.
+                # Skipping advances the batch generator as far as the snapshotted mini-batches did.
+                for _ in range(snapshot["batch"]):
+                    next(data_iterator)
+                set_rng_states(snapshot["rng_states"])
+                i = snapshot["batch"]
+            # (3) Construct next mini-batches on a background thread.
+            if num_prefetch_batches:
+                data_iterator = BatchPrefetcher(data_iterator, num_prefetch=num_prefetch_batches,
+                                                pin_memory=getattr(self.attributes, "pin_memory", False)
+                                                           and torch.device(self.device).type == "cuda")
+            data_wait_time, compute_time, num_triples = 0.0, 0.0, 0
+            start_time = time.perf_counter()
             batch: list
-            for i, batch in enumerate(self.train_dataloaders):
+            for i, batch in enumerate(data_iterator, start=i):
                 # (1) Extract Input and Outputs and set them on the dice
                 x_batch, y_batch = self.extract_input_outputs_set_device(batch)
-                start_time = time.time()
-                if construct_mini_batch_time:
-                    construct_mini_batch_time = start_time - construct_mini_batch_time
+                compute_start_time = time.perf_counter()
+                data_wait_time += compute_start_time - start_time
                 # (2) Forward-Backward-Update.
                 batch_loss = self._run_batch(i, x_batch, y_batch)
+                compute_time += time.perf_counter() - compute_start_time
+                num_triples += len(x_batch[0] if isinstance(x_batch, tuple) else x_batch)
                 epoch_loss += batch_loss
+                timings = (f"data={data_wait_time:.2f}s, compute={compute_time:.2f}s, "
+                           f"triples/s={num_triples / max(data_wait_time + compute_time, 1e-9):.0f}")
                 tqdm_bar.set_description_str(f"Epoch:{epoch + 1}")
                 if i>0:
-                    tqdm_bar.set_postfix_str(f"loss_step={batch_loss:.5f}, loss_epoch={epoch_loss/i:.5f}")
+                    tqdm_bar.set_postfix_str(f"loss_step={batch_loss:.5f}, loss_epoch={epoch_loss/i:.5f}, {timings}")
                 else:
-                    tqdm_bar.set_postfix_str(f"loss_step={batch_loss:.5f}, loss_epoch={batch_loss:.5f}")
+                    tqdm_bar.set_postfix_str(f"loss_step={batch_loss:.5f}, loss_epoch={batch_loss:.5f}, {timings}")
+                # (3) Periodic snapshot.
+                if snapshot_every_n_batches and (i + 1) % snapshot_every_n_batches == 0:
+                    self._save_snapshot(epoch=epoch, batch=i + 1, epoch_loss=epoch_loss,
+                                        epoch_rng_states=epoch_rng_states)
+                start_time = time.perf_counter()
+            self.epoch_timings.append({"epoch": epoch + 1,
+                                       "data_wait_time": data_wait_time,
+                                       "compute_time": compute_time,
+                                       "triples_per_second": num_triples / max(data_wait_time + compute_time, 1e-9)})
+            snapshot = None
             avg_epoch_loss = epoch_loss / len(self.train_dataloaders)
             """
             # Autobatch Finder: Double the current batch size if memory allows and repeat this process at mast 5 times.
@@ -130,6 +271,39 @@ class TorchTrainer(AbstractTrainer):
             self.on_train_epoch_end(self, self.model)
         self.on_fit_end(self, self.model)
 
+    def _save_snapshot(self, epoch: int, batch: int, epoch_loss: float, epoch_rng_states: dict) -> None:
+        """
+            Save a snapshot to continue training from the given epoch and batch cursor
+
+            Arguments
+           ----------
+           epoch: current epoch
+           batch: index of the next mini-batch
+           epoch_loss: sum of batch losses in the current epoch
+           epoch_rng_states: rng states at the start of the current epoch, including the batch generator if given
+           Returns
+           -------
+           None
+       """
+        save_snapshot(get_snapshot_path(self.attributes.full_storage_path),
+                      {"model": self.model.state_dict(),
+                       "optimizer": self.optimizer.state_dict(),
+                       "epoch": epoch,
+                       "batch": batch,
+                       "epoch_loss": epoch_loss,
+                       "loss_history": list(self.model.loss_history),
+                       "epoch_rng_states": epoch_rng_states,
+                       "rng_states": get_rng_states()})
+
+    def _load_snapshot(self, snapshot_path: str) -> dict:
+        """ Load model and optimizer states and loss history from a snapshot """
+        snapshot = load_snapshot(snapshot_path)
+        self.model.load_state_dict(snapshot["model"])
+        self.optimizer.load_state_dict(snapshot["optimizer"])
+        self.model.loss_history = snapshot["loss_history"]
+        print(f'Resuming from epoch {snapshot["epoch"] + 1} batch {snapshot["batch"]} of {snapshot_path}')
+        return snapshot
+
     def forward_backward_update(self, x_batch: torch.Tensor, y_batch: torch.Tensor) -> torch.Tensor:
         """
             Compute forward, loss, backward, and parameter update
@@ -169,11 +343,12 @@ class TorchTrainer(AbstractTrainer):
             else:
                 # (1) NegSample: x is a triple, y is a float
                 x_batch, y_batch = batch
-                return x_batch.to(self.device), y_batch.to(self.device)
+                return x_batch.to(self.device, non_blocking=True), y_batch.to(self.device, non_blocking=True)
         elif len(batch) == 3:
             x_batch, y_idx_batch, y_batch, = batch
-            x_batch, y_idx_batch, y_batch = x_batch.to(self.device), y_idx_batch.to(self.device), y_batch.to(
-                self.device)
+            x_batch, y_idx_batch, y_batch = (x_batch.to(self.device, non_blocking=True),
+                                             y_idx_batch.to(self.device, non_blocking=True),
+                                             y_batch.to(self.device, non_blocking=True))
             return (x_batch, y_idx_batch), y_batch
         else:
             print(len(batch))
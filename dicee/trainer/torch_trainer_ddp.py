@@ -4,6 +4,7 @@ from typing import Iterable
 from dicee.abstracts import AbstractTrainer
 from torch.utils.data import DataLoader
 from tqdm import tqdm
+from .snapshot import get_rng_states, set_rng_states, get_snapshot_path, save_snapshot, load_snapshot
 
 torch.set_float32_matmul_precision('high')
 
@@ -14,10 +15,23 @@ def make_iterable_verbose(iterable_object, verbose, desc="Default", position=Non
         return iterable_object
 
 
+def get_ddp_backend(ddp_backend: str = None) -> str:
+    """ nccl if GPUs are available, otherwise gloo for multi-process multi-host CPU training """
+    if ddp_backend is None:
+        ddp_backend = "nccl" if torch.cuda.is_available() else "gloo"
+    assert ddp_backend in ["nccl", "gloo"], f"Unexpected ddp_backend:{ddp_backend}"
+    if ddp_backend == "nccl":
+        assert torch.cuda.is_available(), "nccl backend requires GPUs. Use --ddp_backend gloo on CPUs"
+    return ddp_backend
+
+
 class TorchDDPTrainer(AbstractTrainer):
     """
         A Trainer based on torch.nn.parallel.DistributedDataParallel
 
+        With the nccl backend, each process trains on a GPU. With the gloo backend, each process trains on CPUs,
+        e.g. OMP_NUM_THREADS=4 torchrun --nnodes 1 --nproc_per_node 8 dicee --trainer torchDDP --ddp_backend gloo
+
         Arguments
        ----------
        train_set_idx
@@ -41,6 +55,7 @@ class TorchDDPTrainer(AbstractTrainer):
 
     def __init__(self, args, callbacks):
         super().__init__(args, callbacks)
+        self.ddp_backend = get_ddp_backend(getattr(self.attributes, "ddp_backend", None))
 
     def fit(self, *args, **kwargs):
         """ Train model        """
@@ -49,12 +64,12 @@ class TorchDDPTrainer(AbstractTrainer):
         # (1) Run the fit the start callback.
         self.on_fit_start(self, model)
         # (2) Setup DDP.
-        torch.distributed.init_process_group(backend="nccl")
+        torch.distributed.init_process_group(backend=self.ddp_backend)
         train_dataset_loader = kwargs['train_dataloaders']
         # (1) Create DATA LOADER.
         train_dataset_loader = DataLoader(train_dataset_loader.dataset,
                                           batch_size=self.attributes.batch_size,
-                                          pin_memory=True,
+                                          pin_memory=self.ddp_backend == "nccl",
                                           shuffle=False,
                                           num_workers=self.attributes.num_core,
                                           persistent_workers=False,
@@ -62,7 +77,8 @@ class TorchDDPTrainer(AbstractTrainer):
                                           sampler=torch.utils.data.distributed.DistributedSampler(
                                               train_dataset_loader.dataset))
         # (3) Start NodeTrainer.
-        NodeTrainer(self, model, train_dataset_loader, self.callbacks, self.attributes.num_epochs).train()
+        NodeTrainer(self, model, train_dataset_loader, self.callbacks, self.attributes.num_epochs,
+                    autocast_dtype=getattr(self.attributes, "autocast_dtype", None)).train()
         torch.distributed.destroy_process_group()
         self.on_fit_end(self, model)
 
@@ -73,28 +89,88 @@ class NodeTrainer:
                  model: torch.nn.Module,
                  train_dataset_loader: DataLoader,
                  callbacks,
-                 num_epochs: int) -> None:
+                 num_epochs: int,
+                 autocast_dtype: str = None) -> None:
         # (1) Trainer.
         self.trainer = trainer
         # (2) Local and Global Ranks.
         self.local_rank = int(os.environ["LOCAL_RANK"])
         self.global_rank = int(os.environ["RANK"])
+        if trainer.ddp_backend == "nccl":
+            self.device = torch.device("cuda", self.local_rank)
+            torch.cuda.set_device(self.device)
+        else:
+            self.device = torch.device("cpu")
         self.optimizer = model.configure_optimizers()
+        self.kge_model = model
         # (3) Send model to local trainer.
         self.train_dataset_loader = train_dataset_loader
-        self.loss_func = model.loss
+        # loss_function handles sparse multi-label vectors of --sparse_targets.
+        self.loss_func = model.loss_function
         self.callbacks = callbacks
-        self.model = torch.compile(model).to(self.local_rank)
-        self.model = torch.nn.parallel.DistributedDataParallel(self.model, device_ids=[self.local_rank])#, output_device=self.local_rank)
+        self.model = torch.compile(model).to(self.device)
+        if self.device.type == "cuda":
+            self.model = torch.nn.parallel.DistributedDataParallel(self.model, device_ids=[self.local_rank])#, output_device=self.local_rank)
+        else:
+            # On CPUs, gradients are all-reduced via gloo.
+            self.model = torch.nn.parallel.DistributedDataParallel(self.model)
         self.num_epochs = num_epochs
         self.loss_history = []
-        # TODO: CD: This should be given as an input param
-        ptdtype = {'float32': torch.float32, 'bfloat16': torch.bfloat16, 'float16': torch.float16}["float16"]
-        self.ctx = torch.amp.autocast(device_type="cuda",dtype=ptdtype)
-        self.scaler = torch.amp.GradScaler("cuda",enabled=True)
+        # (4) Mixed precision: float16 on GPUs and float32 on CPUs by default, bfloat16 can be selected for CPUs.
+        if autocast_dtype is None:
+            autocast_dtype = "float16" if self.device.type == "cuda" else "float32"
+        ptdtype = {'float32': torch.float32, 'bfloat16': torch.bfloat16, 'float16': torch.float16}[autocast_dtype]
+        self.ctx = torch.amp.autocast(device_type=self.device.type, dtype=ptdtype, enabled=ptdtype != torch.float32)
+        # Loss scaling is only needed for float16.
+        self.scaler = torch.amp.GradScaler(self.device.type, enabled=ptdtype == torch.float16)
+        # (5) Snapshots.
+        self.snapshot_every_n_batches = getattr(trainer.attributes, "snapshot_every_n_batches", None)
+        self.snapshot = None
+        if getattr(trainer.attributes, "resume_from", None):
+            self.snapshot = self._load_snapshot(trainer.attributes.resume_from)
 
-    def _load_snapshot(self, snapshot_path):
-        raise NotImplementedError
+    def _load_snapshot(self, snapshot_path: str) -> dict:
+        """ Load model, optimizer and grad scaler states and loss history from a snapshot """
+        snapshot = load_snapshot(snapshot_path)
+        assert len(snapshot["rng_states"]) == torch.distributed.get_world_size(), \
+            "The number of processes must be the same as in the run of the snapshot"
+        self.kge_model.load_state_dict(snapshot["model"])
+        self.optimizer.load_state_dict(snapshot["optimizer"])
+        self.scaler.load_state_dict(snapshot["scaler"])
+        self.kge_model.loss_history = snapshot["loss_history"]
+        if self.local_rank == self.global_rank == 0:
+            print(f'Resuming from epoch {snapshot["epoch"] + 1} batch {snapshot["batch"]} of {snapshot_path}')
+        return snapshot
+
+    def _save_snapshot(self, epoch: int, batch: int, epoch_loss: float, epoch_rng_states: dict) -> None:
+        """
+        Save a snapshot to continue training from the given epoch and batch cursor.
+        RNG states of all processes are gathered and written by the global rank 0.
+
+        Parameters
+        ----------
+        epoch: current epoch
+        batch: index of the next mini-batch
+        epoch_loss: sum of batch losses of this process in the current epoch
+        epoch_rng_states: rng states of this process at the start of the current epoch
+
+        Returns
+        -------
+        None
+        """
+        states = [None] * torch.distributed.get_world_size()
+        torch.distributed.all_gather_object(states, (epoch_loss, epoch_rng_states, get_rng_states()))
+        if self.global_rank == 0:
+            save_snapshot(get_snapshot_path(self.trainer.attributes.full_storage_path),
+                          {"model": self.kge_model.state_dict(),
+                           "optimizer": self.optimizer.state_dict(),
+                           "scaler": self.scaler.state_dict(),
+                           "epoch": epoch,
+                           "batch": batch,
+                           "epoch_loss": [state[0] for state in states],
+                           "loss_history": list(self.kge_model.loss_history),
+                           "epoch_rng_states": [state[1] for state in states],
+                           "rng_states": [state[2] for state in states]})
 
     def _run_batch(self, source: torch.LongTensor, targets: torch.FloatTensor):
         """
@@ -121,16 +197,20 @@ class NodeTrainer:
         self.optimizer.zero_grad(set_to_none=True)
         return batch_loss
 
+    def to_device(self, x: torch.Tensor) -> torch.Tensor:
+        if self.device.type == "cuda":
+            # pin arrays x,y, which allows us to move them to GPU asynchronously (non_blocking=True)
+            return x.pin_memory().to(self.device, non_blocking=True)
+        return x
+
     def extract_input_outputs(self, z: list):
-        # pin arrays x,y, which allows us to move them to GPU asynchronously (non_blocking=True)
         if len(z) == 2:
             x_batch, y_batch = z
-            # pin arrays x,y, which allows us to move them to GPU asynchronously (non_blocking=True)
-            x_batch, y_batch = x_batch.pin_memory().to(self.local_rank, non_blocking=True), y_batch.pin_memory().to(self.local_rank, non_blocking=True)
+            x_batch, y_batch = self.to_device(x_batch), self.to_device(y_batch)
             return x_batch, y_batch
         elif len(z) == 3:
             x_batch, y_idx_batch, y_batch, = z
-            x_batch, y_batch,y_idx_batch = x_batch.pin_memory().to(self.local_rank, non_blocking=True), y_batch.pin_memory().to(self.local_rank, non_blocking=True),y_idx_batch.pin_memory().to(self.local_rank, non_blocking=True)
+            x_batch, y_batch, y_idx_batch = self.to_device(x_batch), self.to_device(y_batch), self.to_device(y_idx_batch)
             return (x_batch, y_idx_batch), y_batch
         else:
             raise ValueError('Unexpected batch shape..')
@@ -166,13 +246,27 @@ class NodeTrainer:
 
         """
         num_of_batches=len(self.train_dataset_loader)
-        for epoch in (tqdm_bar := make_iterable_verbose(range(self.num_epochs),
+        start_epoch = 0 if self.snapshot is None else self.snapshot["epoch"]
+        for epoch in (tqdm_bar := make_iterable_verbose(range(start_epoch, self.num_epochs),
                                                       verbose=self.local_rank == self.global_rank == 0,
                                                       position=0,
                                                         leave=True)):
             self.train_dataset_loader.sampler.set_epoch(epoch)
             epoch_loss = 0
-            for i, z in enumerate(self.train_dataset_loader):
+            i = 0
+            if self.snapshot is not None:
+                set_rng_states(self.snapshot["epoch_rng_states"][self.global_rank])
+                epoch_loss = self.snapshot["epoch_loss"][self.global_rank]
+            epoch_rng_states = get_rng_states()
+            data_iterator = iter(self.train_dataset_loader)
+            if self.snapshot is not None:
+                # Skip mini-batches seen before the snapshot and continue with the rng states at the batch cursor.
+                for _ in range(self.snapshot["batch"]):
+                    next(data_iterator)
+                set_rng_states(self.snapshot["rng_states"][self.global_rank])
+                i = self.snapshot["batch"]
+                self.snapshot = None
+            for i, z in enumerate(data_iterator, start=i):
                 source, targets = self.extract_input_outputs(z)
                 batch_loss = self._run_batch(source, targets)
                 epoch_loss += batch_loss
@@ -182,6 +276,9 @@ class NodeTrainer:
                         tqdm_bar.set_postfix_str(f"batch={i} | {num_of_batches}, loss_step={batch_loss:.5f}, loss_epoch={epoch_loss / i:.5f}")
                     else:
                         tqdm_bar.set_postfix_str(f"loss_step={batch_loss:.5f}, loss_epoch={batch_loss:.5f}")
+                if self.snapshot_every_n_batches and (i + 1) % self.snapshot_every_n_batches == 0:
+                    self._save_snapshot(epoch=epoch, batch=i + 1, epoch_loss=epoch_loss,
+                                        epoch_rng_states=epoch_rng_states)
 
             avg_epoch_loss = epoch_loss / num_of_batches
 
@@ -0,0 +1,145 @@
+import os
+import queue
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+from torch.utils.data import DataLoader, Subset
+from tqdm import tqdm
+from .torch_trainer import TorchTrainer
+
+
+def hogwild_worker(rank: int, trainer, model, dataset, batch_size: int, num_epochs: int, start_queue,
+                   result_queue, num_threads: int) -> None:
+    """
+    Train a model being in shared memory on a shard of the training dataset without locks.
+
+    Parameters
+    ----------
+    rank: index of the worker and the shard
+    trainer: TorchHogwildTrainer
+    model: BaseKGE whose parameters are in shared memory
+    dataset: torch.utils.data.Dataset
+    batch_size: int
+    num_epochs: int
+    start_queue: an epoch starts after the main process puts an item into it
+    result_queue: (rank, sum of batch losses, number of batches) are put after an epoch
+    num_threads: number of threads used by this worker
+
+    Returns
+    -------
+    None
+    """
+    torch.set_num_threads(num_threads)
+    torch.manual_seed(trainer.attributes.random_seed + rank)
+    # (1) Each worker has its own optimizer states, while updates are written into the shared parameters.
+    trainer.model = model
+    trainer.optimizer = model.configure_optimizers()
+    trainer.training_step = model.training_step
+    # (2) Shard the training dataset.
+    shard = np.array_split(np.arange(len(dataset)), trainer.num_workers)[rank]
+    train_dataloader = DataLoader(Subset(dataset, shard.tolist()), batch_size=batch_size, shuffle=True,
+                                  collate_fn=dataset.collate_fn, num_workers=0)
+    for _ in range(num_epochs):
+        start_queue.get()
+        epoch_loss, num_batches = 0.0, 0
+        for i, batch in enumerate(train_dataloader):
+            x_batch, y_batch = trainer.extract_input_outputs_set_device(batch)
+            epoch_loss += trainer._run_batch(i, x_batch, y_batch)
+            num_batches += 1
+        result_queue.put((rank, epoch_loss, num_batches))
+
+
+class TorchHogwildTrainer(TorchTrainer):
+    """
+        Hogwild! trainer for multi CPUs on a single node:
+        parameters of a model are placed in shared memory and updated by num_core processes without locks.
+        Each process iterates over its own shard of the training dataset.
+
+        Arguments
+       ----------
+       args: ?
+
+       callbacks: list of Abstract callback instances, called on the main process.
+
+   """
+
+    def __init__(self, args, callbacks):
+        super().__init__(args, callbacks)
+        assert self.device == 'cpu', "torchHogwild trainer runs only on CPUs"
+        self.num_workers = self.attributes.num_core if self.attributes.num_core > 0 else os.cpu_count()
+
+    @staticmethod
+    def get_results(result_queue, workers) -> list:
+        """ Receive a result from each worker and fail if a worker exits unexpectedly """
+        results = []
+        while len(results) < len(workers):
+            try:
+                results.append(result_queue.get(timeout=1))
+            except queue.Empty:
+                for p in workers:
+                    if p.exitcode is not None and p.exitcode != 0:
+                        raise RuntimeError(f"A hogwild worker exited with {p.exitcode}")
+        return results
+
+    def fit(self, *args, train_dataloaders, **kwargs) -> None:
+        """
+            Training starts
+
+            Arguments
+           ----------
+           args:tuple
+           (BASEKGE,)
+           kwargs:Tuple
+               empty dictionary
+           Returns
+           -------
+           None
+       """
+        assert len(args) == 1
+        model, = args
+        self.model = model
+        self.train_dataloaders = train_dataloaders
+        # (1) Start running callbacks
+        self.on_fit_start(self, self.model)
+        # (2) Place parameters into shared memory.
+        self.model.share_memory()
+        print(f'NumOfDataPoints:{len(self.train_dataloaders.dataset)} '
+              f'| NumOfEpochs:{self.attributes.max_epochs} '
+              f'| LearningRate:{self.model.learning_rate} '
+              f'| BatchSize:{self.train_dataloaders.batch_size} '
+              f'| NumOfWorkers:{self.num_workers}')
+        # (3) Start workers. Forking shares the memory mapped training dataset with workers.
+        ctx = mp.get_context("fork")
+        start_queues = [ctx.SimpleQueue() for _ in range(self.num_workers)]
+        result_queue = ctx.Queue()
+        num_threads = max(1, torch.get_num_threads() // self.num_workers)
+        workers = [ctx.Process(target=hogwild_worker,
+                               args=(rank, self, self.model, self.train_dataloaders.dataset,
+                                     self.train_dataloaders.batch_size, self.attributes.max_epochs,
+                                     start_queues[rank], result_queue, num_threads))
+                   for rank in range(self.num_workers)]
+        for p in workers:
+            p.start()
+        try:
+            # (4) Aggregate epoch losses of workers and run callbacks on the main process.
+            for epoch in (tqdm_bar := tqdm(range(self.attributes.max_epochs))):
+                for start_queue in start_queues:
+                    start_queue.put(epoch)
+                results = self.get_results(result_queue, workers)
+                epoch_loss = sum(loss for _, loss, _ in results)
+                num_batches = sum(n for _, _, n in results)
+                avg_epoch_loss = epoch_loss / max(num_batches, 1)
+                tqdm_bar.set_description_str(f"Epoch:{epoch + 1}")
+                tqdm_bar.set_postfix_str(f"loss_epoch={avg_epoch_loss:.5f}")
+                self.model.loss_history.append(avg_epoch_loss)
+                self.on_train_epoch_end(self, self.model)
+        except BaseException:
+            # (5) Workers waiting for the next epoch would block the interpreter exit.
+            for p in workers:
+                p.terminate()
+                p.join()
+            raise
+        for p in workers:
+            p.join()
+            assert p.exitcode == 0, f"A hogwild worker exited with {p.exitcode}"
+        self.on_fit_end(self, self.model)
@@ -0,0 +1,84 @@
+""" A benchmark for indexing string triples via joins vs. via categorical/Enum codes
+
+$ python docs/SoftwareBenchmarks/dataframe_indexer_benchmark.py --num_triples 10_000_000 --num_entities 1_000_000
+
+Every function runs in a fresh process. Peak memory is the increase of the maximum resident set size of the process
+during indexing.
+"""
+import argparse
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+
+def generate(num_triples: int, num_entities: int, num_relations: int):
+    import polars
+    rng = np.random.default_rng(seed=1)
+    entities = np.array([f"<http://embedding.cc/entity/Q{i}>" for i in range(num_entities)], dtype=object)
+    relations = np.array([f"<http://embedding.cc/prop/direct/P{i}>" for i in range(num_relations)], dtype=object)
+    df = polars.DataFrame({"subject": entities[rng.integers(0, num_entities, num_triples)],
+                           "relation": relations[rng.integers(0, num_relations, num_triples)],
+                           "object": entities[rng.integers(0, num_entities, num_triples)]})
+    idx_entity = polars.concat([df.select(polars.col("subject").alias("entity")),
+                                df.select(polars.col("object").alias("entity"))]).unique(maintain_order=True)
+    idx_relation = df.select(polars.col("relation").unique(maintain_order=True))
+    return df, idx_entity.with_row_index("index"), idx_relation.with_row_index("index")
+
+
+def polars_joins(df, idx_entity, idx_relation):
+    """ Former polars_dataframe_indexer: a hash join per column """
+    import polars
+    df = df.join(idx_relation, on="relation", how="left")
+    df = df.select([polars.col("subject"), polars.col("index").alias("relation"), polars.col("object")])
+    df = df.join(idx_entity, left_on="subject", right_on="entity", how="left")
+    df = df.drop("subject").rename({"index": "subject"})
+    df = df.join(idx_entity, left_on="object", right_on="entity", how="left")
+    df = df.drop("object").rename({"index": "object"})
+    return df.select(["subject", "relation", "object"]).to_numpy()
+
+
+def polars_enum(df, idx_entity, idx_relation):
+    from dicee.read_preprocess_save_load_kg.util import polars_dataframe_indexer
+    return polars_dataframe_indexer(df, idx_entity, idx_relation).to_numpy()
+
+
+def pandas_dict_map(df, idx_entity, idx_relation):
+    """ Former pandas_dataframe_indexer: a Python dictionary per vocabulary """
+    import pandas as pd
+    entity_to_index = pd.Series(idx_entity.index, index=idx_entity['entity']).to_dict()
+    df['subject'] = df['subject'].map(entity_to_index)
+    df['object'] = df['object'].map(entity_to_index)
+    relation_to_index = pd.Series(idx_relation.index, index=idx_relation['relation']).to_dict()
+    df['relation'] = df['relation'].map(relation_to_index)
+    return df.values
+
+
+def pandas_categorical(df, idx_entity, idx_relation):
+    from dicee.read_preprocess_save_load_kg.util import pandas_dataframe_indexer
+    return pandas_dataframe_indexer(df, idx_entity, idx_relation).values
+
+
+def run(func_name: str, num_triples: int, num_entities: int, num_relations: int):
+    df, idx_entity, idx_relation = generate(num_triples, num_entities, num_relations)
+    if func_name.startswith("pandas"):
+        # Conversion into pandas is not a part of the indexing.
+        df, idx_entity, idx_relation = df.to_pandas(), idx_entity.to_pandas(), idx_relation.to_pandas()
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start_time = time.time()
+    x = globals()[func_name](df, idx_entity, idx_relation)
+    runtime = time.time() - start_time
+    return runtime, (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - max_rss) / 1024, x.shape
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num_triples', type=int, default=10_000_000)
+    parser.add_argument('--num_entities', type=int, default=1_000_000)
+    parser.add_argument('--num_relations', type=int, default=1_000)
+    args = parser.parse_args()
+    for name in ["polars_joins", "polars_enum", "pandas_dict_map", "pandas_categorical"]:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            runtime, peak_memory, shape = executor.submit(run, name, args.num_triples, args.num_entities,
+                                                          args.num_relations).result()
+        print(f'{name}:\tTook {runtime:.3f} seconds\tPeak memory increase {peak_memory:.1f} MB\tShape: {shape}')
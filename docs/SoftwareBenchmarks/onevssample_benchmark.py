@@ -0,0 +1,46 @@
+""" A benchmark for drawing negative examples in 1vsSample per triple vs. per batch"""
+import time
+import argparse
+import numpy as np
+import torch
+from dicee.dataset_classes import OnevsSample
+
+
+def per_triple_sampling(dataset: OnevsSample, batch: torch.Tensor):
+    """ Former OnevsSample.__getitem__: a multinomial over all entities for each triple """
+    for triple in batch:
+        y = triple[-1].unsqueeze(0)
+        weights = torch.ones(dataset.num_entities)
+        weights[y] = 0.0
+        negative_idx = torch.multinomial(weights, num_samples=dataset.neg_sample_ratio, replacement=False)
+        torch.cat((y, negative_idx), 0)
+
+
+def per_batch_sampling(dataset: OnevsSample, batch: torch.Tensor):
+    dataset.collate_fn(list(batch))
+
+
+def benchmark(func, dataset: OnevsSample, batch_size: int, num_batches: int):
+    start_time = time.time()
+    for i in range(num_batches):
+        batch = dataset.train_data[i * batch_size:(i + 1) * batch_size]
+        func(dataset, batch)
+    total_time = time.time() - start_time
+    print(f'{func.__name__}: {batch_size * num_batches / total_time:.1f} samples/s')
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--num_entities', type=int, default=1_000_000)
+parser.add_argument('--num_relations', type=int, default=100)
+parser.add_argument('--neg_ratio', type=int, default=10)
+parser.add_argument('--batch_size', type=int, default=1024)
+parser.add_argument('--num_batches', type=int, default=5)
+args = parser.parse_args()
+num_triples = args.batch_size * args.num_batches
+train_set = np.stack([np.random.randint(0, args.num_entities, num_triples),
+                      np.random.randint(0, args.num_relations, num_triples),
+                      np.random.randint(0, args.num_entities, num_triples)], axis=1)
+dataset = OnevsSample(train_set=train_set, num_entities=args.num_entities, num_relations=args.num_relations,
+                      neg_sample_ratio=args.neg_ratio)
+benchmark(per_triple_sampling, dataset, args.batch_size, args.num_batches)
+benchmark(per_batch_sampling, dataset, args.batch_size, args.num_batches)
@@ -62,11 +62,23 @@ def read_by_polar(path_csv: str):
     print(df.head())
 
 
+def read_by_pandas_in_parallel(path_csv: str):
+    from dicee.read_preprocess_save_load_kg.util import read_csv_in_parallel
+    print('Reading with Pandas over byte ranges in parallel...', end='\t')
+    start_time = time.time()
+    df = read_csv_in_parallel(path_csv, separator=r"\s+")
+    print(f'Took {time.time() - start_time} seconds')
+    print(f'Shape: {df.shape}')
+    print(f'Type:{type(df)}')
+    print(df.head())
+
+
 parser = argparse.ArgumentParser()
 parser.add_argument('--path', required=True)
 
 args = parser.parse_args()
 read_by_pandas(args.path)
+read_by_pandas_in_parallel(args.path)
 read_by_modin_pandas(args.path)
 read_by_vaex(args.path)
 read_by_polar(args.path)
@@ -68,7 +68,8 @@ setup(
     python_requires='>=3.10',
     entry_points={"console_scripts":
                       ["dicee=dicee.scripts.run:main",
-                       "dicee_vector_db=dicee.scripts.index_serve:main"]},
+                       "dicee_vector_db=dicee.scripts.index_serve:main",
+                       "dicee_serve=dicee.scripts.serve:main"]},
     long_description=long_description,
     long_description_content_type="text/markdown",
 )
@@ -0,0 +1,33 @@
+from dicee.read_preprocess_save_load_kg.util import polars_dataframe_indexer, pandas_dataframe_indexer
+import pandas as pd
+import polars as pl
+
+TRIPLES = {"subject": ["alice", "bob", "carol", "alice"],
+           "relation": ["knows", "likes", "knows", "unknown"],
+           "object": ["bob", "carol", "dave", "eve"]}
+ENTITIES = ["carol", "alice", "dave", "bob"]
+RELATIONS = ["likes", "knows"]
+EXPECTED = [(1, 1, 3), (3, 0, 0), (0, 1, 2)]
+
+
+class TestDataFrameIndexer:
+    def test_polars_indexer(self):
+        idx_entity = pl.DataFrame({"entity": ENTITIES}).with_row_index("index")
+        idx_relation = pl.DataFrame({"relation": RELATIONS}).with_row_index("index")
+        df = polars_dataframe_indexer(pl.DataFrame(TRIPLES), idx_entity, idx_relation)
+        assert df.columns == ["subject", "relation", "object"]
+        assert df.rows()[:3] == EXPECTED
+        # Unknown values are null.
+        assert df.rows()[3] == (1, None, None)
+        # Rows of a vocabulary are not required to be sorted by their indices.
+        lazy = polars_dataframe_indexer(pl.DataFrame(TRIPLES).lazy(), idx_entity.reverse(), idx_relation.lazy())
+        assert lazy.collect().rows() == df.rows()
+
+    def test_pandas_indexer(self):
+        idx_entity = pd.DataFrame({"entity": ENTITIES})
+        idx_relation = pd.DataFrame({"relation": RELATIONS})
+        df = pandas_dataframe_indexer(pd.DataFrame(TRIPLES), idx_entity, idx_relation)
+        assert df.columns.tolist() == ["subject", "relation", "object"]
+        assert list(df.itertuples(index=False, name=None))[:3] == EXPECTED
+        # Unknown values are -1.
+        assert tuple(df.iloc[3].tolist()) == (1, -1, -1)
@@ -1,4 +1,7 @@
 from dicee.executer import Execute
+from dicee.knowledge_graph_embeddings import KGE
+import json
+import numpy as np
 import pytest
 from dicee.config import Namespace
 class TestBackends:
@@ -30,3 +33,26 @@ class TestBackends:
         args.backend = 'polars'
         args.separator="	"
         Execute(args).start()
+
+    @pytest.mark.filterwarnings('ignore::UserWarning')
+    def test_polars_streaming_as_backend(self):
+        args = Namespace()
+        args.dataset_dir = 'KGs/UMLS'
+        args.backend = 'polars_streaming'
+        args.separator = "	"
+        args.model = 'DistMult'
+        args.scoring_technique = 'NegSample'
+        args.num_epochs = 1
+        args.embedding_dim = 16
+        args.trainer = 'torchCPUTrainer'
+        result = Execute(args).start()
+        path = result['path_experiment_folder']
+        # Indexed training triples are memory mapped into the trainer.
+        with open(path + '/memory_map_details.json') as file_descriptor:
+            assert json.load(file_descriptor)["file"] == "train_set.npy"
+        train_set = np.load(path + '/train_set.npy', mmap_mode='r')
+        assert len(train_set) == result['num_train_triples']
+        assert train_set[:, [0, 2]].max() < result['num_entities'] == 135
+        assert train_set[:, 1].max() < result['num_relations']
+        assert 0.0 <= result['Test']['MRR'] <= 1.0
+        assert KGE(path).predict_topk(h=["acquired_abnormality"], r=["location_of"], topk=3)
@@ -0,0 +1,87 @@
+from dicee.executer import Execute
+from dicee.config import Namespace
+from dicee.knowledge_graph_embeddings import KGE
+from dicee.embedding_index import EmbeddingIndex
+import numpy as np
+import pytest
+
+
+class TestEmbeddingIndex:
+    def test_exact_search(self):
+        rng = np.random.default_rng(0)
+        embeddings = rng.standard_normal((1000, 16)).astype(np.float32)
+        queries = rng.standard_normal((7, 16)).astype(np.float32)
+        # (1) Dot products.
+        indices, scores = EmbeddingIndex.build(embeddings, metric="dot").search(queries, topk=5, block_size=64)
+        expected = np.argsort(-(queries @ embeddings.T), axis=1)[:, :5]
+        assert np.array_equal(indices, expected)
+        assert np.all(scores[:, :-1] >= scores[:, 1:])
+        # (2) Cosine similarities.
+        normalized = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        indices, scores = EmbeddingIndex.build(embeddings, metric="cosine").search(queries, topk=5, block_size=100)
+        assert np.array_equal(indices, np.argsort(-(queries @ normalized.T), axis=1)[:, :5])
+        assert np.all(scores <= 1.0 + 1e-5)
+
+    def test_ivf_and_persistence(self, tmp_path):
+        rng = np.random.default_rng(0)
+        embeddings = rng.standard_normal((500, 8)).astype(np.float32)
+        queries = rng.standard_normal((4, 8)).astype(np.float32)
+        index = EmbeddingIndex.build(embeddings, metric="cosine", num_lists=10)
+        assert index.list_offsets[-1] == len(embeddings)
+        exact_indices, exact_scores = index.search(queries, topk=3)
+        # Probing all lists is the exact search.
+        ivf_indices, ivf_scores = index.search(queries, topk=3, num_probes=10)
+        assert np.array_equal(exact_indices, ivf_indices)
+        assert np.allclose(exact_scores, ivf_scores, atol=1e-5)
+        index.save(str(tmp_path))
+        assert EmbeddingIndex.exists(str(tmp_path))
+        loaded = EmbeddingIndex.load(str(tmp_path))
+        assert isinstance(loaded.embeddings, np.memmap)
+        assert np.array_equal(loaded.search(queries, topk=3, num_probes=2)[0], index.search(queries, topk=3, num_probes=2)[0])
+        # float16 storage
+        half = EmbeddingIndex.build(embeddings, metric="dot", dtype="float16")
+        assert half.embeddings.dtype == np.float16
+        half_indices, half_scores = half.search(queries, topk=3)
+        assert np.allclose(half_scores, np.einsum("qd,qkd->qk", queries, embeddings[half_indices]), atol=1e-2)
+
+    def test_search_does_not_modify_embeddings(self, tmp_path):
+        rng = np.random.default_rng(0)
+        embeddings = rng.standard_normal((300, 8)).astype(np.float32)
+        original = embeddings.copy()
+        queries = rng.standard_normal((3, 8)).astype(np.float32)
+        index = EmbeddingIndex.build(embeddings, metric="cosine", num_lists=4)
+        # float32 embeddings are stored without a copy.
+        assert np.shares_memory(index.embeddings, embeddings)
+        expected = index.search(queries, topk=5)
+        index.search(queries, topk=5, num_probes=2)
+        assert np.array_equal(embeddings, original)
+        assert np.array_equal(index.search(queries, topk=5)[0], expected[0])
+        # The exact search on a read-only memory map.
+        index.save(str(tmp_path))
+        loaded = EmbeddingIndex.load(str(tmp_path))
+        assert not loaded.embeddings.flags.writeable
+        indices, scores = loaded.search(queries, topk=5)
+        assert np.array_equal(indices, expected[0])
+        assert np.allclose(scores, expected[1])
+
+    @pytest.mark.filterwarnings('ignore::UserWarning')
+    def test_search_similar_entities(self):
+        args = Namespace()
+        args.model = 'DistMult'
+        args.scoring_technique = 'KvsAll'
+        args.dataset_dir = 'KGs/UMLS'
+        args.num_epochs = 1
+        args.batch_size = 1024
+        args.embedding_dim = 32
+        args.trainer = 'torchCPUTrainer'
+        args.eval_model = None
+        result = Execute(args).start()
+        pre_trained_kge = KGE(path=result['path_experiment_folder'])
+        weights = pre_trained_kge.model.entity_embeddings.weight.detach().clone()
+        entity = pre_trained_kge.idx_to_entity[0]
+        similar = pre_trained_kge.search_similar_entities([entity], topk=5)
+        assert len(similar) == 1 and len(similar[0]) == 5
+        assert entity not in [name for name, _ in similar[0]]
+        pre_trained_kge.search_similar_entities([entity], topk=5)
+        assert (pre_trained_kge.model.entity_embeddings.weight == weights).all()
+        assert EmbeddingIndex.exists(result['path_experiment_folder'] + '/embedding_index')
@@ -0,0 +1,67 @@
+import numpy as np
+import torch
+from dicee.static_funcs_training import FilterIndex, filtered_ranks
+from dicee.static_preprocess_funcs import get_er_vocab
+
+
+class TestFilteredRanking:
+    def test_filter_index_from_triples_and_vocab(self):
+        triples = np.array([[0, 0, 1], [0, 0, 2], [1, 0, 2], [0, 1, 3], [0, 0, 1]])
+        index = FilterIndex.from_triples(triples)
+        assert len(index) == 3
+        row, col = index.lookup(np.array([0, 1, 2]), np.array([0, 0, 0]))
+        assert row.tolist() == [0, 0, 1]
+        assert col.tolist() == [1, 2, 2]
+        index_from_vocab = FilterIndex.from_vocab(get_er_vocab(triples))
+        assert index_from_vocab.keys.tolist() == index.keys.tolist()
+        assert index_from_vocab.indices.tolist() == index.indices.tolist()
+
+    def test_ranks_match_sort_based_ranks(self):
+        rng = np.random.default_rng(1)
+        num_entities, num_relations = 50, 4
+        triples = np.stack([rng.integers(0, num_entities, 500),
+                            rng.integers(0, num_relations, 500),
+                            rng.integers(0, num_entities, 500)], axis=1)
+        er_vocab = get_er_vocab(triples)
+        scores = torch.rand(len(triples), num_entities)
+        ranks = filtered_ranks(scores.clone(), triples[:, 2], FilterIndex.from_triples(triples),
+                               first=triples[:, 0], second=triples[:, 1])
+        for j, (h, r, t) in enumerate(triples):
+            predictions = scores[j].clone()
+            target_value = predictions[t].item()
+            predictions[er_vocab[(h, r)]] = -np.inf
+            predictions[t] = target_value
+            _, sort_idxs = torch.sort(predictions, descending=True)
+            assert ranks[j] == torch.where(sort_idxs == t)[0].item() + 1
+
+    def test_ties_and_nan_scores(self):
+        num_entities = 10
+        targets = np.array([3, 0, 7])
+        # (1) A constant model is ranked in the middle of all candidates.
+        ranks = filtered_ranks(torch.zeros(3, num_entities), targets)
+        assert np.allclose(ranks, (num_entities + 1) / 2)
+        assert np.mean(1. / ranks) < 1.0
+        # (2) Filtered candidates do not tie with the target.
+        triples = np.array([[0, 0, 3], [0, 0, 4], [0, 0, 5]])
+        ranks = filtered_ranks(torch.zeros(1, num_entities), np.array([3]), FilterIndex.from_triples(triples),
+                               first=np.array([0]), second=np.array([0]))
+        assert ranks.tolist() == [1 + (num_entities - 3) / 2]
+        # (3) Ties with the target besides greater scores.
+        scores = torch.tensor([[0.9, 0.5, 0.5, 0.5, 0.1]])
+        assert filtered_ranks(scores, np.array([2])).tolist() == [3.0]
+        # (4) A diverged model is ranked last.
+        assert filtered_ranks(torch.full((3, num_entities), float("nan")), targets).tolist() == [num_entities] * 3
+
+    def test_filter_indexes_saved_and_memory_mapped(self, tmp_path):
+        from dicee.read_preprocess_save_load_kg.util import create_filter_indexes
+        from dicee.static_funcs_training import load_filter_index
+        triples = np.array([[0, 0, 1], [0, 0, 2], [1, 1, 2], [2, 0, 0]])
+        er_vocab, re_vocab, ee_vocab = create_filter_indexes(triples, str(tmp_path))
+        for name, index in [("er_vocab", er_vocab), ("re_vocab", re_vocab), ("ee_vocab", ee_vocab)]:
+            loaded = load_filter_index(str(tmp_path), name)
+            assert isinstance(loaded.indices, np.memmap)
+            assert loaded.keys.tolist() == index.keys.tolist()
+            assert loaded.indptr.tolist() == index.indptr.tolist()
+            assert loaded.indices.tolist() == index.indices.tolist()
+        row, col = load_filter_index(str(tmp_path), "re_vocab").lookup(np.array([0]), np.array([2]))
+        assert col.tolist() == [0]
@@ -0,0 +1,44 @@
+from dicee.executer import Execute
+from dicee.config import Namespace
+from dicee.knowledge_graph_embeddings import KGE
+import numpy as np
+import pandas as pd
+import pytest
+
+
+class TestFindMissingTriples:
+    @pytest.mark.filterwarnings('ignore::UserWarning')
+    def test_find_missing_triples(self, tmp_path):
+        args = Namespace()
+        args.model = 'DistMult'
+        args.scoring_technique = 'KvsAll'
+        args.dataset_dir = 'KGs/UMLS'
+        args.num_epochs = 5
+        args.batch_size = 1024
+        args.embedding_dim = 32
+        args.trainer = 'torchCPUTrainer'
+        args.eval_model = None
+        result = Execute(args).start()
+        pre_trained_kge = KGE(path=result['path_experiment_folder'])
+        train_set = np.load(result['path_experiment_folder'] + '/train_set.npy')
+        known = {tuple(i) for i in train_set.tolist()}
+        entities = [pre_trained_kge.idx_to_entity[i] for i in range(20)]
+        # (1) A set of string triples.
+        missing = pre_trained_kge.find_missing_triples(confidence=0.5, entities=entities, topk=5)
+        for h, r, t in missing:
+            assert h in entities
+            assert (pre_trained_kge.entity_to_idx[h], pre_trained_kge.relation_to_idx[r],
+                    pre_trained_kge.entity_to_idx[t]) not in known
+        assert len(pre_trained_kge.find_missing_triples(confidence=0.5, entities=entities, topk=5, at_most=3)) <= 3
+        # (2) Streamed into a Parquet file.
+        path = pre_trained_kge.find_missing_triples(confidence=0.5, entities=entities, topk=5, batch_size=7,
+                                                    path=str(tmp_path / "missing.parquet"))
+        df = pd.read_parquet(path)
+        assert len(df) == len(missing)
+        assert (df["score"] >= 0.5).all()
+        # (3) Partitioned over processes.
+        path = pre_trained_kge.find_missing_triples(confidence=0.5, entities=entities, topk=5,
+                                                    path=str(tmp_path / "missing"), num_workers=2)
+        df_parts = pd.concat([pd.read_parquet(f"{path}/part-{i}.parquet") for i in range(2)])
+        assert set(map(tuple, df_parts[["head", "relation", "tail"]].values.tolist())) == \
+               set(map(tuple, df[["head", "relation", "tail"]].values.tolist()))
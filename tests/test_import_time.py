@@ -0,0 +1,39 @@
+import subprocess
+import sys
+
+# Cumulative import time of the dicee package itself in microseconds.
+IMPORT_TIME_BUDGET_US = 100_000
+
+
+def run_python(code: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True)
+
+
+class TestImportTime:
+    def test_import_time_budget(self):
+        # Lines of -X importtime: "import time: self [us] | cumulative | imported package"
+        lines = [line.split("|") for line in run_python("import dicee").stderr.splitlines()
+                 if line.startswith("import time:") and "|" in line]
+        cumulative = {package.strip(): int(time) for _, time, package in lines if time.strip().isdigit()}
+        assert "dicee" in cumulative
+        assert cumulative["dicee"] < IMPORT_TIME_BUDGET_US, f"import dicee took {cumulative['dicee']} us"
+
+    def test_lazy_exports(self):
+        # Neither torch nor lightning is imported by import dicee.
+        run_python("import sys, dicee\n"
+                   "assert not {'torch', 'lightning', 'pytorch_lightning', 'polars', 'pandas'} & set(sys.modules)")
+        # KGE does not require tiktoken, the trainers and the dataset classes.
+        run_python("import sys\n"
+                   "from dicee import KGE\n"
+                   "assert 'tiktoken' not in sys.modules\n"
+                   "assert 'dicee.trainer' not in sys.modules and 'dicee.dataset_classes' not in sys.modules")
+        run_python("import dicee\n"
+                   "assert dicee.Execute and dicee.QueryGenerator and dicee.DICE_Trainer and dicee.timeit\n"
+                   "assert dicee.KvsAll is dicee.dataset_classes.KvsAll")
+        # Wildcard imports export the former public API, but no helper of dicee/__init__.py.
+        run_python("import dicee\n"
+                   "namespace = {}\n"
+                   "exec('from dicee import *', namespace)\n"
+                   "assert {'KGE', 'Execute', 'DICE_Trainer', 'QueryGenerator', 'timeit', 'load_model', 'KvsAll',\n"
+                   "        'NegSampleDataset', 'DistMult'} <= set(namespace)\n"
+                   "assert 'importlib' not in namespace and not hasattr(dicee, 'importlib')")
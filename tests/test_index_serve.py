@@ -0,0 +1,58 @@
+from dicee.executer import Execute
+from dicee.config import Namespace
+from dicee.knowledge_graph_embeddings import KGE
+import argparse
+import json
+import numpy as np
+import pytest
+
+qdrant_client = pytest.importorskip("qdrant_client")
+pytest.importorskip("fastapi")
+from dicee.scripts.index_serve import index, get_progress_path, is_local_client  # noqa: E402
+
+
+class TestIndexServe:
+    @pytest.mark.filterwarnings('ignore::UserWarning')
+    def test_streaming_index(self, tmp_path):
+        args = Namespace()
+        args.model = 'DistMult'
+        args.scoring_technique = 'KvsAll'
+        args.dataset_dir = 'KGs/UMLS'
+        args.num_epochs = 1
+        args.batch_size = 1024
+        args.embedding_dim = 16
+        args.trainer = 'torchCPUTrainer'
+        args.eval_model = None
+        args.save_embeddings_as_csv = True
+        result = Execute(args).start()
+        path = result['path_experiment_folder']
+        num_entities = result['num_entities']
+        client = qdrant_client.QdrantClient(":memory:")
+        # Concurrent upserts are serialized for the local client.
+        assert is_local_client(client)
+        index_args = argparse.Namespace(path=path, collection="umls", backend="qdrant", metric="cosine", embeddings=None,
+                                        chunk_size=50, upsert_batch_size=16, num_upsert_workers=1, resume=False)
+        # (1) Streaming the csv file.
+        index(index_args, client=client)
+        assert client.count("umls").count == num_entities
+        with open(get_progress_path(index_args), "r") as file_descriptor:
+            assert json.load(file_descriptor)["num_upserted"] == num_entities
+        # (2) Resuming an interrupted indexing.
+        client.delete("umls", points_selector=list(range(100, num_entities)))
+        with open(get_progress_path(index_args), "w") as file_descriptor:
+            json.dump({"num_upserted": 100}, file_descriptor)
+        index_args.resume = True
+        index(index_args, client=client)
+        assert client.count("umls").count == num_entities
+        # (3) A binary embedding file.
+        pre_trained_kge = KGE(path=path)
+        embeddings = pre_trained_kge.model.entity_embeddings.weight.detach().numpy()
+        np.save(str(tmp_path / "entity_embeddings.npy"), embeddings)
+        index_args = argparse.Namespace(path=path, collection="umls_npy", backend="qdrant", metric="dot",
+                                        embeddings=str(tmp_path / "entity_embeddings.npy"), chunk_size=64,
+                                        upsert_batch_size=10, num_upsert_workers=2, resume=False)
+        index(index_args, client=client)
+        assert client.count("umls_npy").count == num_entities
+        point = client.retrieve("umls_npy", ids=[3], with_vectors=True)[0]
+        assert point.payload["name"] == pre_trained_kge.idx_to_entity[3]
+        assert np.allclose(point.vector, embeddings[3], atol=1e-5)
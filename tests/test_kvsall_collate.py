@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+import torch
+from dicee.dataset_classes import KvsAll
+from dicee.models import DistMult
+from dicee.config import Namespace
+from dicee.static_preprocess_funcs import preprocesses_input_args
+
+
+class TestKvsAllCollate:
+    def test_dense_and_sparse_targets(self):
+        train_set = np.array([[0, 0, 1], [0, 0, 2], [1, 0, 2], [2, 1, 0]])
+        entity_idxs = {str(i): i for i in range(3)}
+        relation_idxs = {str(i): i for i in range(2)}
+        for label_smoothing_rate in [0.0, 0.1]:
+            dense = KvsAll(train_set, entity_idxs=entity_idxs, relation_idxs=relation_idxs,
+                           form='EntityPrediction', label_smoothing_rate=label_smoothing_rate)
+            sparse = KvsAll(train_set, entity_idxs=entity_idxs, relation_idxs=relation_idxs,
+                            form='EntityPrediction', label_smoothing_rate=label_smoothing_rate, sparse_targets=True)
+            x, y = dense.collate_fn([dense[i] for i in range(len(dense))])
+            x_sparse, y_sparse = sparse.collate_fn([sparse[i] for i in range(len(sparse))])
+            assert torch.equal(x, x_sparse)
+            assert y.shape == y_sparse.shape == (len(dense), 3)
+            for (h, r), y_vec in zip(x.tolist(), y):
+                labelled = set(train_set[(train_set[:, 0] == h) & (train_set[:, 1] == r)][:, 2].tolist())
+                assert set(torch.where(y_vec > 0.5)[0].tolist()) == labelled
+
+            model = DistMult(args={"embedding_dim": 4, "num_entities": 3, "num_relations": 2,
+                                   "label_smoothing_rate": label_smoothing_rate})
+            yhat = torch.randn(len(dense), 3)
+            assert torch.allclose(model.loss_function(yhat, y), model.loss_function(yhat, y_sparse), atol=1e-6)
+
+    def test_group_by_key_columns(self):
+        from dicee.static_preprocess_funcs import group_by_key_columns, mapping_from_first_two_cols_to_third
+        train_set = np.random.default_rng(1).integers(0, 10, size=(200, 3))
+        keys, offsets, values = group_by_key_columns(train_set)
+        store = mapping_from_first_two_cols_to_third(train_set)
+        assert len(keys) == len(store) == len(offsets) - 1
+        for (h, r), start, end in zip(keys.tolist(), offsets[:-1], offsets[1:]):
+            assert values[start:end].tolist() == sorted(set(store[(h, r)]))
+
+    def test_sparse_targets_require_kvsall(self):
+        args = Namespace()
+        args.dataset_dir = 'KGs/UMLS'
+        args.scoring_technique = 'NegSample'
+        args.sparse_targets = True
+        with pytest.raises(AssertionError, match="sparse_targets requires KvsAll"):
+            preprocesses_input_args(args)
@@ -0,0 +1,55 @@
+from dicee.executer import Execute
+from dicee.config import Namespace
+from dicee.knowledge_graph_embeddings import KGE
+from dicee.static_funcs import save_mmap_checkpoint, load_mmap_checkpoint
+import os
+import torch
+import pytest
+
+
+class TestMmapCheckpoint:
+    def test_save_and_load(self, tmp_path):
+        state_dict = {"entity_embeddings.weight": torch.randn(10, 4),
+                      "relation_embeddings.weight": torch.randn(3, 4).to(torch.bfloat16),
+                      "normalizer.num_batches_tracked": torch.tensor(7),
+                      "empty": torch.zeros(0, 4)}
+        for shard_size in [None, 3]:
+            path = str(tmp_path / f"model_mmap_{shard_size}")
+            save_mmap_checkpoint(state_dict, path, shard_size=shard_size)
+            loaded = load_mmap_checkpoint(path)
+            assert loaded.keys() == state_dict.keys()
+            for k, v in state_dict.items():
+                assert loaded[k].dtype == v.dtype and loaded[k].shape == v.shape
+                assert torch.equal(loaded[k], v)
+        # Sharded writes yield the same single file per tensor, which is memory mapped without a copy.
+        for name in os.listdir(str(tmp_path / "model_mmap_None")):
+            assert (tmp_path / "model_mmap_None" / name).read_bytes() == (tmp_path / "model_mmap_3" / name).read_bytes()
+        loaded = load_mmap_checkpoint(str(tmp_path / "model_mmap_3"))
+        # Pages of the file are not copied until they are written.
+        with open(str(tmp_path / "model_mmap_3" / "entity_embeddings.weight.bin"), "r+b") as file_descriptor:
+            file_descriptor.write(torch.zeros(4).numpy().tobytes())
+        assert torch.equal(loaded["entity_embeddings.weight"][0], torch.zeros(4))
+
+    @pytest.mark.filterwarnings('ignore::UserWarning')
+    def test_kge_with_mmap_checkpoint(self):
+        args = Namespace()
+        args.model = 'Keci'
+        args.p = 0
+        args.q = 1
+        args.scoring_technique = 'KvsAll'
+        args.dataset_dir = 'KGs/UMLS'
+        args.num_epochs = 1
+        args.batch_size = 1024
+        args.embedding_dim = 32
+        args.trainer = 'torchCPUTrainer'
+        args.eval_model = None
+        args.checkpoint_format = 'mmap'
+        args.checkpoint_shard_size = 50
+        result = Execute(args).start()
+        path = result['path_experiment_folder']
+        assert os.path.isfile(path + '/model_mmap/header.json')
+        assert not os.path.isfile(path + '/model.pt')
+        pre_trained_kge = KGE(path=path)
+        assert not any(p.is_meta for p in pre_trained_kge.model.parameters())
+        scores = pre_trained_kge.triple_score(h=["acquired_abnormality"], r=['location_of'], t=["acquired_abnormality"])
+        assert torch.isfinite(scores).all()
@@ -0,0 +1,67 @@
+from dicee.read_preprocess_save_load_kg.util import newline_aligned_byte_ranges, iter_ntriples, read_from_disk
+import pytest
+
+NTRIPLES = """# A comment
+<http://example.org/alice> <http://example.org/knows> <http://example.org/bob> .
+<http://example.org/alice> <http://example.org/name> "Alice"@en .
+<http://example.org/bob><http://example.org/knows><http://example.org/carol>.
+
+<http://example.org/bob> <http://example.org/age> "42"^^<http://www.w3.org/2001/XMLSchema#integer> .
+_:b0 <http://example.org/knows> <http://example.org/alice> .
+<http://example.org/carol> <http://example.org/knows> _:b0 <http://example.org/graph> .
+<http://example.org/carol> <http://example.org/likes> <http://example.org/dave>\t.\r
+"""
+EXPECTED = [("http://example.org/alice", "http://example.org/knows", "http://example.org/bob"),
+            ("http://example.org/bob", "http://example.org/knows", "http://example.org/carol"),
+            ("_:b0", "http://example.org/knows", "http://example.org/alice"),
+            ("http://example.org/carol", "http://example.org/knows", "_:b0"),
+            ("http://example.org/carol", "http://example.org/likes", "http://example.org/dave")]
+
+
+def collect(batches):
+    return [triple for batch in batches for triple in zip(*[batch.column(i).to_pylist() for i in range(3)])]
+
+
+class TestNTriplesParser:
+    def test_byte_ranges(self, tmp_path):
+        path = tmp_path / "kg.nt"
+        path.write_text(NTRIPLES)
+        data = path.read_bytes()
+        for range_size in [1, 7, 64, 10 ** 6]:
+            ranges = newline_aligned_byte_ranges(str(path), range_size)
+            assert ranges[0][0] == 0 and ranges[-1][1] == len(data)
+            for (_, end), (start, _) in zip(ranges[:-1], ranges[1:]):
+                assert end == start and data[end - 1:end] == b"\n"
+
+    def test_parse(self, tmp_path):
+        pytest.importorskip("pyarrow")
+        path = tmp_path / "kg.nt"
+        path.write_text(NTRIPLES * 100)
+        # Small byte ranges parsed by several threads yield triples in the order of the file.
+        assert collect(iter_ntriples(str(path), range_size=64, num_workers=4)) == EXPECTED * 100
+        assert collect(iter_ntriples(str(path), read_only_few=7, range_size=64)) == (EXPECTED * 2)[:7]
+        assert len(collect(iter_ntriples(str(path), sample_triples_ratio=0.5, range_size=64))) < 500
+        df = read_from_disk(str(path), backend="rdflib", separator=" ")
+        assert df.columns.tolist() == ['subject', 'relation', 'object']
+        assert list(df.itertuples(index=False, name=None)) == EXPECTED * 100
+
+    def test_same_triples_as_rdflib(self, tmp_path):
+        rdflib = pytest.importorskip("rdflib")
+        path = tmp_path / "kg.nt"
+        path.write_text("\n".join(line for i, line in enumerate(NTRIPLES.splitlines()) if i in [1, 2, 5]) + "\n")
+        expected = {(str(s), str(p), str(o)) for s, p, o in rdflib.Graph().parse(str(path), format="nt")
+                    if not isinstance(o, rdflib.Literal)}
+        assert set(collect(iter_ntriples(str(path)))) == expected
+
+    def test_comments_and_escaped_iris(self, tmp_path):
+        pytest.importorskip("pyarrow")
+        path = tmp_path / "kg.nt"
+        path.write_text('<http://a/s> <http://a/p> <http://a/o> . # A trailing comment\n'
+                        '<http://a/s\\u00E9> <http://a/p> <http://a/o\\U0001F600> .\n'
+                        '<http://a/sé> <http://a/p> <http://a/o> .\n', encoding="utf-8")
+        expected = [("http://a/s", "http://a/p", "http://a/o"),
+                    ("http://a/sé", "http://a/p", "http://a/o\U0001F600"),
+                    ("http://a/sé", "http://a/p", "http://a/o")]
+        assert collect(iter_ntriples(str(path))) == expected
+        rdflib = pytest.importorskip("rdflib")
+        assert {(str(s), str(p), str(o)) for s, p, o in rdflib.Graph().parse(str(path), format="nt")} == set(expected)
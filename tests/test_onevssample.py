@@ -56,3 +56,20 @@ class TestRegressionQmult:
         assert result['Train']['MRR'] >= 0.220
         assert result['Val']['MRR'] >= 0.220
         assert result['Test']['MRR'] >= 0.220
+
+    def test_batch_negative_sampling(self):
+        import numpy as np
+        import torch
+        from dicee.dataset_classes import OnevsSample
+        train_set = np.array([[0, 0, 1], [1, 0, 2], [2, 1, 3], [3, 1, 0]])
+        for neg_ratio in [2, 3]:
+            dataset = OnevsSample(train_set=train_set, num_entities=5, num_relations=2, neg_sample_ratio=neg_ratio,
+                                  label_smoothing_rate=0.1)
+            x, y_idx, y_vec = dataset.collate_fn([dataset[i] for i in range(len(dataset))])
+            assert x.shape == (4, 2) and y_idx.shape == (4, 1 + neg_ratio) and y_vec.shape == (4, 1 + neg_ratio)
+            assert torch.equal(y_idx[:, 0], torch.from_numpy(train_set[:, 2]))
+            for row in y_idx:
+                # Negatives are distinct and differ from the true tail entity.
+                assert len(set(row.tolist())) == 1 + neg_ratio
+            assert torch.allclose(y_vec[:, 0], torch.full((4,), 0.9))
+            assert torch.allclose(y_vec[:, 1:], torch.full((4, neg_ratio), 0.1))
@@ -0,0 +1,28 @@
+from dicee.read_preprocess_save_load_kg.util import read_csv_in_parallel, read_with_pandas
+import pandas as pd
+
+
+def write_triples(path, num_triples: int):
+    with open(path, "w") as file_descriptor:
+        for i in range(num_triples):
+            # Whitespace separated triples with varying whitespace.
+            file_descriptor.write(f"e{i}\tr{i % 7}  e{i + 1}\n")
+
+
+class TestParallelReadCSV:
+    def test_same_triples_as_read_csv(self, tmp_path):
+        path = str(tmp_path / "train.txt")
+        write_triples(path, 10_000)
+        expected = pd.read_csv(path, sep=r"\s+", header=None, names=['subject', 'relation', 'object'], dtype=str)
+        df = read_csv_in_parallel(path, separator=r"\s+", range_size=4096, num_workers=2)
+        assert df.columns.tolist() == ['subject', 'relation', 'object']
+        assert df.astype(str).values.tolist() == expected.values.tolist()
+
+    def test_read_only_few_and_sample(self, tmp_path):
+        path = str(tmp_path / "train.txt")
+        write_triples(path, 10_000)
+        df = read_with_pandas(path, read_only_few=10, separator=r"\s+")
+        assert df.astype(str).values.tolist() == [[f"e{i}", f"r{i % 7}", f"e{i + 1}"] for i in range(10)]
+        df = read_csv_in_parallel(path, separator=r"\s+", sample_triples_ratio=0.1, range_size=4096, num_workers=2)
+        assert 500 < len(df) < 1500
+        assert set(df["subject"]) <= {f"e{i}" for i in range(10_000)}
@@ -0,0 +1,40 @@
+from dicee.executer import Execute
+from dicee.config import Namespace
+from dicee.knowledge_graph_embeddings import KGE
+import numpy as np
+import pytest
+
+
+class TestPredictTopkBatch:
+    @pytest.mark.filterwarnings('ignore::UserWarning')
+    def test_predict_topk_batch(self):
+        args = Namespace()
+        args.model = 'DistMult'
+        args.scoring_technique = 'KvsAll'
+        args.dataset_dir = 'KGs/UMLS'
+        args.num_epochs = 5
+        args.batch_size = 1024
+        args.embedding_dim = 32
+        args.trainer = 'torchCPUTrainer'
+        args.eval_model = None
+        result = Execute(args).start()
+        pre_trained_kge = KGE(path=result['path_experiment_folder'])
+        train_set = np.load(result['path_experiment_folder'] + '/train_set.npy')[:100]
+        h = [pre_trained_kge.idx_to_entity[i] for i in train_set[:, 0].tolist()]
+        r = [pre_trained_kge.idx_to_relations[i] for i in train_set[:, 1].tolist()]
+        indices, scores = pre_trained_kge.predict_topk_batch(h=h, r=r, topk=5, batch_size=32)
+        assert indices.shape == scores.shape == (100, 5)
+        assert np.all(scores[:, :-1] >= scores[:, 1:])
+        # Same predictions as predict_topk
+        entities, _ = zip(*pre_trained_kge.predict_topk(h=[h[0]], r=[r[0]], topk=5))
+        assert list(entities) == [pre_trained_kge.idx_to_entity[i] for i in indices[0].tolist()]
+        # Integer indices as inputs and string decoding
+        decoded, decoded_scores = pre_trained_kge.predict_topk_batch(h=train_set[:, 0], r=train_set[:, 1], topk=5,
+                                                                     decode=True)
+        assert decoded[0].tolist() == list(entities)
+        assert np.allclose(decoded_scores, scores)
+        # Tails of training triples are excluded.
+        indices, _ = pre_trained_kge.predict_topk_batch(h=train_set[:, 0], r=train_set[:, 1], topk=5,
+                                                        exclude_train=True)
+        for (head, relation, tail), row in zip(train_set.tolist(), indices.tolist()):
+            assert tail not in row
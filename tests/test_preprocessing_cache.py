@@ -0,0 +1,52 @@
+from dicee.executer import Execute
+from dicee.config import Namespace
+from dicee.read_preprocess_save_load_kg import ReadFromDisk
+import numpy as np
+import os
+import pytest
+import shutil
+
+
+def run(dataset_dir: str, cache_dir: str, backend: str = "pandas"):
+    args = Namespace()
+    args.model = 'DistMult'
+    args.scoring_technique = 'KvsAll'
+    args.dataset_dir = dataset_dir
+    args.backend = backend
+    args.separator = "\t"
+    args.num_epochs = 1
+    args.batch_size = 1024
+    args.embedding_dim = 16
+    args.trainer = 'torchCPUTrainer'
+    args.eval_model = 'train_val_test'
+    args.preprocessing_cache_dir = cache_dir
+    return Execute(args).start()
+
+
+class TestPreprocessingCache:
+    @pytest.mark.parametrize("backend", ["pandas", "polars"])
+    @pytest.mark.filterwarnings('ignore::UserWarning')
+    def test_reuse_preprocessed_kg(self, tmp_path, monkeypatch, backend):
+        dataset_dir = str(tmp_path / "UMLS")
+        shutil.copytree("KGs/UMLS", dataset_dir)
+        cache_dir = str(tmp_path / "cache")
+        first = run(dataset_dir, cache_dir, backend)
+        assert len(os.listdir(cache_dir)) == 1
+
+        def fail_on_read(self):
+            raise AssertionError("Cached knowledge graph must not be read")
+
+        with monkeypatch.context() as m:
+            m.setattr(ReadFromDisk, "start", fail_on_read)
+            second = run(dataset_dir, cache_dir, backend)
+        assert second['num_entities'] == first['num_entities']
+        assert second['num_relations'] == first['num_relations']
+        for name in ["train_set.npy", "valid_set.npy", "test_set.npy", "entity_to_idx.csv"]:
+            assert os.path.isfile(os.path.join(second['path_experiment_folder'], name))
+        assert np.array_equal(np.load(first['path_experiment_folder'] + '/train_set.npy'),
+                              np.load(second['path_experiment_folder'] + '/train_set.npy'))
+        assert second['Test']['MRR'] > 0.0
+        # A modified input file is preprocessed again.
+        os.utime(os.path.join(dataset_dir, "train.txt"), ns=(0, 0))
+        run(dataset_dir, cache_dir, backend)
+        assert len(os.listdir(cache_dir)) == 2
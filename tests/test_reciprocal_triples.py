@@ -0,0 +1,38 @@
+from dicee.knowledge_graph import KG
+from dicee.static_funcs import create_recipriocal_triples
+from dicee.read_preprocess_save_load_kg.util import add_reciprocal_triples
+import numpy as np
+import pandas as pd
+import polars as pl
+import pytest
+
+
+def names(vocab, column):
+    if isinstance(vocab, pl.DataFrame):
+        return vocab.sort("index")[column].to_list()
+    return vocab[column].tolist()
+
+
+class TestReciprocalTriples:
+    def test_add_reciprocal_triples(self):
+        x = np.array([[0, 0, 1], [1, 1, 2]], dtype=np.uint8)
+        y = add_reciprocal_triples(x, num_relations=2)
+        assert y.dtype == np.uint8
+        assert y.tolist() == [[0, 0, 1], [1, 1, 2], [1, 2, 0], [2, 3, 1]]
+
+    @pytest.mark.parametrize("backend", ["pandas", "polars"])
+    def test_same_triples_as_string_augmentation(self, backend):
+        kg = KG(dataset_dir="KGs/UMLS", add_reciprocal=True, eval_model="train_val_test", backend=backend,
+                separator="\t")
+        relations = names(kg.relation_to_idx, "relation")
+        entities = names(kg.entity_to_idx, "entity")
+        num_relations = len(relations) // 2
+        # Relation p_inverse is indexed by p + |R|.
+        assert kg.num_relations == len(relations) == 2 * num_relations
+        assert relations[num_relations:] == [r + "_inverse" for r in relations[:num_relations]]
+        for split, indexed in [("train", kg.train_set), ("valid", kg.valid_set), ("test", kg.test_set)]:
+            expected = create_recipriocal_triples(pd.read_csv(f"KGs/UMLS/{split}.txt", sep="\t", header=None,
+                                                              names=["subject", "relation", "object"]))
+            assert len(indexed) == len(expected)
+            assert sorted((entities[h], relations[r], entities[t]) for h, r, t in indexed.tolist()) == sorted(
+                expected.itertuples(index=False, name=None))
@@ -0,0 +1,50 @@
+from dicee.executer import Execute
+from dicee.config import Namespace
+from dicee.knowledge_graph_embeddings import KGE, ResultCache
+import torch
+import pytest
+
+
+class TestResultCache:
+    def test_lru_eviction(self):
+        cache = ResultCache(max_size=2)
+        assert cache.get_or_compute("a", 0, lambda: 1) == 1
+        assert cache.get_or_compute("b", 0, lambda: 2) == 2
+        # "a" becomes the most recently used one.
+        assert cache.get_or_compute("a", 0, lambda: -1) == 1
+        assert cache.get_or_compute("c", 0, lambda: 3) == 3
+        assert "b" not in cache.results and "a" in cache.results
+        # A new fingerprint invalidates results.
+        assert cache.get_or_compute("a", 1, lambda: 4) == 4
+        assert cache.info() == {"hits": 1, "misses": 4, "invalidations": 1, "size": 1, "max_size": 2}
+
+    @pytest.mark.filterwarnings('ignore::UserWarning')
+    def test_kge_cache(self):
+        args = Namespace()
+        args.model = 'DistMult'
+        args.scoring_technique = 'KvsAll'
+        args.dataset_dir = 'KGs/UMLS'
+        args.num_epochs = 1
+        args.batch_size = 1024
+        args.embedding_dim = 32
+        args.trainer = 'torchCPUTrainer'
+        args.eval_model = None
+        result = Execute(args).start()
+        pre_trained_kge = KGE(path=result['path_experiment_folder'], cache_size=128)
+        h, r, t = ["acquired_abnormality"], ["location_of"], ["experimental_model_of_disease"]
+        first = pre_trained_kge.predict_topk(h=h, r=r, topk=5)
+        assert pre_trained_kge.predict_topk(h=h, r=r, topk=5) == first
+        assert pre_trained_kge.cache_info()["hits"] == 1
+        # Different directions and topk are different keys.
+        pre_trained_kge.predict_topk(r=r, t=t, topk=5)
+        pre_trained_kge.predict_topk(h=h, r=r, topk=3)
+        assert pre_trained_kge.cache_info()["misses"] == 3
+        score = pre_trained_kge.triple_score(h=h, r=r, t=t)
+        score += 1
+        assert torch.allclose(pre_trained_kge.triple_score(h=h, r=r, t=t), score - 1)
+        # Training invalidates cached results.
+        pre_trained_kge.train_triples(h=h, r=r, t=t, labels=[1.0], iteration=1)
+        assert not torch.allclose(pre_trained_kge.triple_score(h=h, r=r, t=t), score - 1)
+        assert pre_trained_kge.cache_info()["invalidations"] == 1
+        pre_trained_kge.add_new_entity_embeddings("new_entity", torch.rand(32))
+        assert pre_trained_kge.predict_topk(h=h, r=r, topk=5) != [] and pre_trained_kge.cache_info()["invalidations"] == 2
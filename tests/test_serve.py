@@ -0,0 +1,100 @@
+from dicee.executer import Execute
+from dicee.config import Namespace
+from dicee.knowledge_graph_embeddings import KGE
+import asyncio
+import numpy as np
+import pytest
+
+pytest.importorskip("fastapi")
+from dicee.scripts.serve import KGEServer, MicroBatcher, create_app  # noqa: E402
+from concurrent.futures import ThreadPoolExecutor  # noqa: E402
+
+
+class TestServe:
+    @pytest.mark.filterwarnings('ignore::UserWarning')
+    def test_micro_batching(self):
+        args = Namespace()
+        args.model = 'DistMult'
+        args.scoring_technique = 'KvsAll'
+        args.dataset_dir = 'KGs/UMLS'
+        args.num_epochs = 1
+        args.batch_size = 1024
+        args.embedding_dim = 32
+        args.trainer = 'torchCPUTrainer'
+        args.eval_model = None
+        result = Execute(args).start()
+        pre_trained_kge = KGE(path=result['path_experiment_folder'])
+        server = KGEServer(pre_trained_kge, max_batch_size=64, max_latency_ms=50)
+        train_set = np.load(result['path_experiment_folder'] + '/train_set.npy')[:20]
+        h = [pre_trained_kge.idx_to_entity[i] for i in train_set[:, 0].tolist()]
+        r = [pre_trained_kge.idx_to_relations[i] for i in train_set[:, 1].tolist()]
+        t = [pre_trained_kge.idx_to_entity[i] for i in train_set[:, 2].tolist()]
+
+        async def run():
+            server.start()
+            tails = await asyncio.gather(*[server.predict_tail(i, j, 3) for i, j in zip(h, r)])
+            heads = await asyncio.gather(*[server.predict_head(j, k, 3) for j, k in zip(r, t)])
+            relations = await asyncio.gather(*[server.predict_relation(i, k, 2) for i, k in zip(h, t)])
+            scores = await asyncio.gather(*[server.triple_score(i, j, k) for i, j, k in zip(h, r, t)])
+            await server.stop()
+            return tails, heads, relations, scores
+
+        tails, heads, relations, scores = asyncio.run(run())
+        # Same predictions as the unbatched methods
+        for i in range(len(h)):
+            assert [e for e, _ in tails[i]] == [e for e, _ in pre_trained_kge.predict_topk(h=[h[i]], r=[r[i]], topk=3)]
+            assert [e for e, _ in heads[i]] == [e for e, _ in pre_trained_kge.predict_topk(r=[r[i]], t=[t[i]], topk=3)]
+            assert [e for e, _ in relations[i]] == [e for e, _ in pre_trained_kge.predict_topk(h=[h[i]], t=[t[i]], topk=2)]
+            assert np.isclose(scores[i], pre_trained_kge.triple_score(h=[h[i]], r=[r[i]], t=[t[i]]).item(), atol=1e-5)
+        # Head and relation predictions scored in chunks of at most 50 triples.
+        chunked_server = KGEServer(pre_trained_kge, max_batch_size=64, max_latency_ms=50, max_triples_per_forward=50)
+
+        async def run_chunked():
+            chunked_server.start()
+            chunked_heads = await asyncio.gather(*[chunked_server.predict_head(j, k, 3) for j, k in zip(r, t)])
+            chunked_relations = await asyncio.gather(*[chunked_server.predict_relation(i, k, 30)
+                                                       for i, k in zip(h, t)])
+            with pytest.raises(ValueError):
+                await chunked_server.predict_tail(h[0], r[0], 0)
+            await chunked_server.stop()
+            return chunked_heads, chunked_relations
+
+        chunked_heads, chunked_relations = asyncio.run(run_chunked())
+        for i in range(len(h)):
+            assert [e for e, _ in chunked_heads[i]] == [e for e, _ in heads[i]]
+            assert [e for e, _ in chunked_relations[i]] == [e for e, _ in pre_trained_kge.predict_topk(
+                h=[h[i]], t=[t[i]], topk=30)]
+        metrics = server.metrics()
+        for name in ["triple_score", "predict_tail", "predict_head", "predict_relation"]:
+            assert metrics[name]["num_requests"] == len(h)
+            # Concurrent requests are coalesced.
+            assert metrics[name]["num_batches"] < len(h)
+            assert metrics[name]["p50_latency_ms"] <= metrics[name]["p99_latency_ms"]
+
+        pytest.importorskip("httpx")
+        from fastapi.testclient import TestClient
+        with TestClient(create_app(KGEServer(pre_trained_kge))) as client:
+            response = client.post("/api/predict_tail", json={"h": h[0], "r": r[0], "topk": 3})
+            assert response.status_code == 200 and len(response.json()["result"]) == 3
+            assert client.post("/api/predict_tail", json={"h": "unknown_entity", "r": r[0]}).status_code == 404
+            assert client.post("/api/predict_head", json={"r": r[0], "t": t[0], "topk": 0}).status_code == 422
+            assert len(client.get("/api/entity_embedding", params={"q": h[0]}).json()["result"]) == 32
+            assert client.get("/metrics").json()["predict_tail"]["num_requests"] == 1
+
+    def test_failing_item_of_a_batch(self):
+        def batch_fn(items):
+            if any(i < 0 for i in items):
+                raise ValueError("Negative item")
+            return [2 * i for i in items]
+
+        async def run():
+            batcher = MicroBatcher(batch_fn, ThreadPoolExecutor(max_workers=1), max_batch_size=8, max_latency_ms=50)
+            batcher.start()
+            results = await asyncio.gather(*[batcher.submit(i) for i in [1, -1, 2]], return_exceptions=True)
+            await batcher.stop()
+            return results
+
+        results = asyncio.run(run())
+        # Only the bad request fails.
+        assert results[0] == 2 and results[2] == 4
+        assert isinstance(results[1], ValueError)
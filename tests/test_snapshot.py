@@ -0,0 +1,65 @@
+from dicee.executer import Execute
+from dicee.config import Namespace
+import os
+import torch
+import pytest
+
+
+class TestSnapshot:
+    @pytest.mark.filterwarnings('ignore::UserWarning')
+    @pytest.mark.parametrize("num_prefetch_batches", [0, 2])
+    def test_resume_from_snapshot(self, num_prefetch_batches):
+        args = Namespace()
+        args.model = 'Keci'
+        args.p = 0
+        args.q = 1
+        args.scoring_technique = 'NegSample'
+        args.neg_ratio = 1
+        args.dataset_dir = 'KGs/UMLS'
+        args.num_epochs = 2
+        args.batch_size = 1024
+        args.lr = 0.1
+        args.embedding_dim = 32
+        args.trainer = 'torchCPUTrainer'
+        args.eval_model = None
+        args.snapshot_every_n_batches = 4
+        # Negative examples of prefetched mini-batches are drawn on another thread.
+        args.num_prefetch_batches = num_prefetch_batches
+        uninterrupted = Execute(args).start()
+        path = uninterrupted['path_experiment_folder']
+        assert os.path.isfile(path + '/snapshot.pt')
+        snapshot = torch.load(path + '/snapshot.pt', weights_only=False)
+        assert snapshot['epoch'] == 1 and snapshot['batch'] > 0
+        assert len(snapshot['loss_history']) == 1
+        # Resuming from the last snapshot trains over the remaining mini-batches of the uninterrupted run.
+        args.snapshot_every_n_batches = None
+        args.resume_from = path
+        resumed = Execute(args).start()
+        uninterrupted_weights = torch.load(path + '/model.pt', weights_only=False)
+        resumed_weights = torch.load(resumed['path_experiment_folder'] + '/model.pt', weights_only=False)
+        for k, v in uninterrupted_weights.items():
+            assert torch.allclose(v, resumed_weights[k])
+
+    @pytest.mark.filterwarnings('ignore::UserWarning')
+    def test_reproducible_with_prefetching(self):
+        def train():
+            args = Namespace()
+            args.model = 'Keci'
+            args.p = 0
+            args.q = 1
+            args.scoring_technique = 'NegSample'
+            args.neg_ratio = 4
+            args.dataset_dir = 'KGs/UMLS'
+            args.num_epochs = 2
+            args.batch_size = 256
+            args.embedding_dim = 32
+            args.input_dropout_rate = 0.1
+            args.trainer = 'torchCPUTrainer'
+            args.eval_model = None
+            args.num_prefetch_batches = 4
+            result = Execute(args).start()
+            return torch.load(result['path_experiment_folder'] + '/model.pt', weights_only=False)
+
+        first, second = train(), train()
+        for k, v in first.items():
+            assert torch.equal(v, second[k])
@@ -0,0 +1,30 @@
+from dicee.executer import Execute
+import pytest
+from dicee.config import Namespace
+
+
+class TestSparseEmbeddings:
+    @pytest.mark.filterwarnings('ignore::UserWarning')
+    @pytest.mark.parametrize("scoring_technique", ["NegSample", "1vsSample"])
+    @pytest.mark.parametrize("optim", ["Adam", "Adagrad"])
+    def test_distmult(self, scoring_technique, optim):
+        args = Namespace()
+        args.model = 'DistMult'
+        args.dataset_dir = 'KGs/UMLS'
+        args.optim = optim
+        args.num_epochs = 10
+        args.batch_size = 1024
+        args.lr = 0.1
+        args.embedding_dim = 32
+        args.scoring_technique = scoring_technique
+        args.neg_ratio = 10
+        args.eval_model = 'train_val_test'
+        args.trainer = 'torchCPUTrainer'
+        args.sparse_embeddings = True
+        executor = Execute(args)
+        result = executor.start()
+        assert result['Train']['H@10'] >= result['Train']['H@3'] >= result['Train']['H@1']
+        # Sparse updates train the model. A hard-coded MRR would depend on the optimizer and its learning rate.
+        loss_history = executor.trained_model.loss_history
+        assert len(loss_history) == args.num_epochs
+        assert loss_history[-1] < loss_history[0]
@@ -0,0 +1,46 @@
+from dicee.executer import Execute
+from dicee.config import Namespace
+from dicee.knowledge_graph_embeddings import KGE
+from dicee.static_funcs import StringIndex
+import pandas as pd
+import pytest
+
+
+class TestStringIndex:
+    def test_string_index_lookups(self, tmp_path):
+        entity_to_idx = {"b": 0, "a": 1, "ç": 2, "ab": 3}
+        StringIndex.from_mapping(entity_to_idx).save(str(tmp_path), "entity_to_idx")
+        assert StringIndex.exists(str(tmp_path), "entity_to_idx")
+        string_index = StringIndex.load(str(tmp_path), "entity_to_idx")
+        assert len(string_index) == 4
+        assert dict(string_index.items()) == entity_to_idx
+        assert list(string_index.keys()) == list(entity_to_idx.keys())
+        assert "c" not in string_index
+        with pytest.raises(KeyError):
+            string_index["c"]
+        assert [string_index.inverse[i] for i in range(4)] == ["b", "a", "ç", "ab"]
+        with pytest.raises(KeyError):
+            string_index.inverse[4]
+        # The same index from the dataframe representation of the pandas backend.
+        df = pd.DataFrame({"entity": ["b", "a", "ç", "ab"]})
+        assert dict(StringIndex.from_mapping(df).items()) == entity_to_idx
+
+    @pytest.mark.filterwarnings('ignore::UserWarning')
+    def test_kge_with_string_index(self):
+        args = Namespace()
+        args.model = 'DistMult'
+        args.scoring_technique = 'KvsAll'
+        args.dataset_dir = 'KGs/UMLS'
+        args.num_epochs = 1
+        args.batch_size = 1024
+        args.embedding_dim = 32
+        args.backend = 'pandas'
+        args.trainer = 'torchCPUTrainer'
+        args.eval_model = None
+        result = Execute(args).start()
+        pre_trained_kge = KGE(path=result['path_experiment_folder'])
+        assert isinstance(pre_trained_kge.entity_to_idx, StringIndex)
+        assert pre_trained_kge.num_entities == result['num_entities']
+        entity = pre_trained_kge.idx_to_entity[0]
+        assert pre_trained_kge.entity_to_idx[entity] == 0
+        assert len(pre_trained_kge.predict_topk(h=[entity], r=[pre_trained_kge.idx_to_relations[0]], topk=3)) == 3
@@ -1,5 +1,7 @@
 from dicee.executer import Execute
 from dicee.config import Namespace
+from dicee.trainer.torch_trainer import BatchPrefetcher
+import multiprocessing
 import pytest
 
 class TestCallback:
@@ -30,3 +32,90 @@ class TestCallback:
         args.embedding_dim = 32
         args.trainer = 'PL'
         Execute(args).start()
+
+    @pytest.mark.filterwarnings('ignore::UserWarning')
+    def test_aconex_hogwild_trainer(self):
+        args = Namespace()
+        args.model = 'AConEx'
+        args.scoring_technique = 'KvsAll'
+        args.dataset_dir = 'KGs/UMLS'
+        args.num_epochs = 10
+        args.batch_size = 1024
+        args.lr = 0.01
+        args.embedding_dim = 32
+        args.num_core = 2
+        args.trainer = 'torchHogwild'
+        result = Execute(args).start()
+        assert result['Train']['H@10'] >= result['Train']['H@3'] >= result['Train']['H@1']
+
+    @pytest.mark.filterwarnings('ignore::UserWarning')
+    def test_hogwild_workers_terminate_on_error(self, monkeypatch):
+        from dicee.trainer.torch_trainer_hogwild import TorchHogwildTrainer
+
+        def failing_callback(*args, **kwargs):
+            raise RuntimeError("Failing callback")
+
+        monkeypatch.setattr(TorchHogwildTrainer, "on_train_epoch_end", failing_callback)
+        args = Namespace()
+        args.model = 'DistMult'
+        args.scoring_technique = 'KvsAll'
+        args.dataset_dir = 'KGs/UMLS'
+        args.num_epochs = 3
+        args.batch_size = 1024
+        args.embedding_dim = 16
+        args.num_core = 2
+        args.trainer = 'torchHogwild'
+        with pytest.raises(RuntimeError, match="Failing callback"):
+            Execute(args).start()
+        assert multiprocessing.active_children() == []
+
+    @pytest.mark.filterwarnings('ignore::UserWarning')
+    def test_aconex_ddp_gloo_trainer(self, monkeypatch):
+        # Single process group as torchrun would set it up.
+        monkeypatch.setenv("RANK", "0")
+        monkeypatch.setenv("LOCAL_RANK", "0")
+        monkeypatch.setenv("WORLD_SIZE", "1")
+        monkeypatch.setenv("MASTER_ADDR", "127.0.0.1")
+        monkeypatch.setenv("MASTER_PORT", "29511")
+        args = Namespace()
+        args.model = 'AConEx'
+        args.scoring_technique = 'KvsAll'
+        args.dataset_dir = 'KGs/UMLS'
+        args.num_epochs = 2
+        args.batch_size = 1024
+        args.lr = 0.01
+        args.embedding_dim = 32
+        args.trainer = 'torchDDP'
+        args.ddp_backend = 'gloo'
+        args.autocast_dtype = 'bfloat16'
+        result = Execute(args).start()
+        assert result['Train']['H@10'] >= result['Train']['H@3'] >= result['Train']['H@1']
+
+    @pytest.mark.filterwarnings('ignore::UserWarning')
+    def test_aconex_torch_cpu_trainer_with_prefetching(self):
+        args = Namespace()
+        args.model = 'AConEx'
+        args.scoring_technique = 'KvsAll'
+        args.dataset_dir = 'KGs/UMLS'
+        args.num_epochs = 3
+        args.batch_size = 1024
+        args.lr = 0.01
+        args.embedding_dim = 32
+        args.trainer = 'torchCPUTrainer'
+        args.num_prefetch_batches = 2
+        result = Execute(args).start()
+        assert len(result['epoch_timings']) == 3
+        assert 'form_of_labelling' not in result
+        for timing in result['epoch_timings']:
+            assert timing['data_wait_time'] >= 0 and timing['compute_time'] > 0 and timing['triples_per_second'] > 0
+
+    def test_batch_prefetcher(self):
+        assert list(BatchPrefetcher(iter(range(10)), num_prefetch=3)) == list(range(10))
+
+        def failing_iterator():
+            yield 0
+            raise ValueError
+        prefetcher = BatchPrefetcher(failing_iterator(), num_prefetch=1)
+        assert next(prefetcher) == 0
+        with pytest.raises(ValueError):
+            next(prefetcher)